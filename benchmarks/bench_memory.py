@@ -0,0 +1,93 @@
+"""Memory and construction benchmark for FixedPoint scalars
+
+Compares the slotted FixedPoint with the former layout, which kept the
+format string, m, n and value in a per instance __dict__.
+
+    python benchmarks/bench_memory.py --count 100000
+"""
+from __future__ import annotations
+import argparse
+import gc
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from fixedpoint import FixedPoint  # pylint: disable=wrong-import-position
+from fixedpoint.format import parse_fmt  # pylint: disable=wrong-import-position
+
+
+class DictFixedPoint:  # pylint: disable=too-few-public-methods
+    """Former FixedPoint layout with a __dict__ per instance"""
+
+    def __init__(self, value: float, fmt: str):
+        self.fmt = fmt
+        self.m, self.n = parse_fmt(fmt)
+        if not -(2 ** (self.m - 1)) <= value <= 2 ** (self.m - 1) - 2 ** (-self.n):
+            raise ValueError(f'A value of {value} does not fit in the given format {fmt}')
+        self.value = int(value * 2 ** self.n)
+
+
+def bytes_per_instance(cls, count: int, fmt: str = 'Q16.16') -> float:
+    """Measure memory allocated per instance with tracemalloc
+
+    Parameters
+    ----------
+    cls
+        Class to instantiate as cls(value, fmt)
+    count
+        Number of instances
+    fmt
+        Format string
+
+    Returns
+    -------
+        Allocated bytes per instance, including the value integer
+    """
+    values = [1000 + i / 1024 for i in range(count)]
+    objs: list = [None] * count
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i, value in enumerate(values):
+        objs[i] = cls(value, fmt)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def constructions_per_second(cls, count: int, fmt: str = 'Q16.16') -> float:
+    """Measure construction throughput
+
+    Parameters
+    ----------
+    cls
+        Class to instantiate as cls(value, fmt)
+    count
+        Number of instances per timing run
+    fmt
+        Format string
+
+    Returns
+    -------
+        Constructions per second, best of three runs
+    """
+    timer = timeit.Timer(lambda: cls(1000.5, fmt))
+    return count / min(timer.repeat(repeat=3, number=count))
+
+
+def main(argv=None):
+    """Print bytes per instance and construction throughput"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000, help='number of instances')
+    args = parser.parse_args(argv)
+    print(f"{'class':<16}{'bytes/instance':>16}{'constructions/s':>18}")
+    for cls in (FixedPoint, DictFixedPoint):
+        size = bytes_per_instance(cls, args.count)
+        rate = constructions_per_second(cls, args.count)
+        print(f'{cls.__name__:<16}{size:>16.1f}{rate:>18.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""Benchmark suite for FixedPoint and FixedPointArray hot paths
+
+Times construction, arithmetic, requantization and comparisons over a matrix
+of formats and array sizes. Results are written as JSON and can be compared
+against a stored baseline:
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json --threshold 1.25
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import operator
+import os
+import platform
+import sys
+import timeit
+from functools import partial
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=wrong-import-position
+from fixedpoint import FFT, FIRFilter, FixedPoint, FixedPointArray, ParallelExecutor, QFormat, dot
+from fixedpoint import atan2, compare_vectors, divide, error_statistics, reciprocal, sin, sqrt
+from fixedpoint import trace, write_vectors
+
+FORMATS = ('Q4.4', 'Q16.16', 'Q32.32', 'Q64.64')
+SIZES = (1000, 100000)
+
+Case = Tuple[str, Callable[[], object], int]
+
+SCALAR_OPS = {
+    'add': operator.add,
+    'sub': operator.sub,
+    'mul': operator.mul,
+    'truediv': operator.truediv,
+}
+
+COMPARE_OPS = {
+    'eq': operator.eq,
+    'lt': operator.lt,
+}
+
+ARRAY_OPS = {
+    'add': operator.add,
+    'sub': operator.sub,
+    'mul': operator.mul,
+}
+
+
+def _values(fmt: str, size: int) -> np.ndarray:
+    """Random values covering half the range of the format"""
+    qformat = QFormat(*map(int, fmt[1:].split('.')))
+    rng = np.random.default_rng(0)
+    return rng.uniform(qformat.minval / 2, qformat.maxval / 2, size)
+
+
+def _targets(fmt: str) -> Iterator[Tuple[str, str]]:
+    """Policy and target format for each requantization case"""
+    m, n = map(int, fmt[1:].split('.'))
+    yield 'exact', f'Q{m + 1}.{n + 4}'
+    yield 'round', f'Q{m}.{n // 2}'
+    yield 'fit', f'Q{max(m // 2, 2)}.{n // 2}'
+
+
+def scalar_cases(fmt: str) -> Iterator[Case]:
+    """Benchmark cases for FixedPoint scalars"""
+    x, y = _values(fmt, 2).tolist()
+    a = FixedPoint(x, fmt)
+    b = FixedPoint(y, fmt)
+    c = FixedPoint(0.5, 'Q2.2')
+    yield f'scalar/{fmt}/init', lambda: FixedPoint(x, fmt), 1
+    yield f'scalar/{fmt}/from_raw', lambda: FixedPoint.from_raw(a.value, a.qformat), 1
+    yield f'scalar/{fmt}/intern', lambda: FixedPoint.intern(x, fmt), 1
+    yield f'scalar/{fmt}/hash', lambda: hash(a), 1
+    for name, func in SCALAR_OPS.items():
+        yield f'scalar/{fmt}/{name}', partial(func, a, b), 1
+        yield f'scalar/{fmt}/{name}_int', partial(func, a, 1), 1
+        yield f'scalar/{fmt}/r{name}_float', partial(func, 0.75, a), 1
+    yield f'scalar/{fmt}/neg', lambda: -a, 1
+    yield f'scalar/{fmt}/pos', lambda: +a, 1
+    yield f'scalar/{fmt}/abs', lambda: abs(a), 1
+    yield f'scalar/{fmt}/pow', lambda: a ** 2, 1
+    yield f'scalar/{fmt}/lshift', lambda: (a >> 2) << 1, 1
+    yield f'scalar/{fmt}/rshift', lambda: a >> 1, 1
+    for policy, target in _targets(fmt):
+        yield f'scalar/{fmt}/to_{policy}', partial(a.to, target, policy), 1
+    narrow = dict(_targets(fmt))['fit']
+    for rounding in ('floor', 'half_even', 'stochastic'):
+        yield f'scalar/{fmt}/to_{rounding}', partial(a.to, narrow, 'fit', rounding=rounding), 1
+    yield f'scalar/{fmt}/to_wrap', partial(a.to, narrow, 'round', overflow='wrap'), 1
+    for name, func in COMPARE_OPS.items():
+        yield f'scalar/{fmt}/{name}_same', partial(func, a, b), 1
+        yield f'scalar/{fmt}/{name}_mixed', partial(func, a, c), 1
+        yield f'scalar/{fmt}/{name}_int', partial(func, a, 1), 1
+        yield f'scalar/{fmt}/{name}_float', partial(func, a, 0.3), 1
+
+
+def array_cases(fmt: str, size: int) -> Iterator[Case]:
+    """Benchmark cases for FixedPointArray"""
+    x = _values(fmt, size)
+    a = FixedPointArray(x, fmt)
+    b = FixedPointArray(x[::-1].copy(), fmt)
+    yield f'array/{fmt}/{size}/init', lambda: FixedPointArray(x, fmt), size
+    yield f'array/{fmt}/{size}/from_raw', lambda: FixedPointArray.from_raw(a.raw, fmt), size
+    for name, func in ARRAY_OPS.items():
+        yield f'array/{fmt}/{size}/{name}', partial(func, a, b), size
+        yield f'array/{fmt}/{size}/{name}_float', partial(func, a, 0.5), size
+    yield f'array/{fmt}/{size}/sum', a.sum, size
+    for policy, target in _targets(fmt):
+        yield f'array/{fmt}/{size}/to_{policy}', partial(a.to, target, policy), size
+    narrow = dict(_targets(fmt))['fit']
+    for rounding in ('floor', 'half_even', 'stochastic'):
+        yield (f'array/{fmt}/{size}/to_{rounding}',
+               partial(a.to, narrow, 'fit', rounding=rounding), size)
+    yield f'array/{fmt}/{size}/to_wrap', partial(a.to, narrow, 'round', overflow='wrap'), size
+    out = FixedPointArray.from_raw(np.zeros_like(a.raw), narrow, check=False)
+    yield (f'array/{fmt}/{size}/to_out', partial(a.to, narrow, 'fit', out=out), size)
+    product = FixedPointArray(np.zeros(size), f'Q{2 * a.m}.{a.n}')
+    yield f'array/{fmt}/{size}/mul_out', partial(np.multiply, a, b, out=product), size
+    yield f'array/{fmt}/{size}/lt', lambda: a < b, size
+    yield f'array/{fmt}/{size}/index', lambda: a[size // 2], 1
+
+
+def fir_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for FIRFilter with Q1.15 samples"""
+    for taps in (16, 64):
+        coeffs = FixedPointArray(_values('Q1.15', taps), 'Q1.15')
+        x = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+        fir = FIRFilter(coeffs, 'Q1.15', out_fmt='Q1.15')
+        yield f'fir/{taps}/{size}', partial(fir.process, x), size * taps
+
+
+def dot_cases(fmt: str, size: int) -> Iterator[Case]:
+    """Benchmark cases for dot products"""
+    a = FixedPointArray(_values(fmt, size), fmt)
+    b = FixedPointArray(_values(fmt, size)[::-1], fmt)
+    yield f'dot/{fmt}/{size}', partial(dot, a, b), size
+
+
+def function_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for elementary functions on Q4.12 values"""
+    x = FixedPointArray(np.abs(_values('Q4.12', size)) + 0.25, 'Q4.12')
+    yield f'sin/lut/{size}', partial(sin, x), size
+    yield f'sin/cordic/{size}', partial(sin, x, method='cordic'), size
+    yield f'atan2/{size}', partial(atan2, x, x[::-1]), size
+    yield f'sqrt/{size}', partial(sqrt, x), size
+    yield f'reciprocal/{size}', partial(reciprocal, x), size
+    yield f'reciprocal/newton/{size}', partial(reciprocal, x, method='newton'), size
+    yield f'divide/exact/{size}', partial(divide, x, x[::-1], 'Q8.16'), size
+    yield f'divide/newton/{size}', partial(divide, x, x[::-1], 'Q8.16', method='newton'), size
+    yield f'divide/operator/{size}', partial(operator.truediv, x, x[::-1]), size
+
+
+def vector_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for HDL test vector export into memory"""
+    x = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+    for radix in ('hex', 'bin'):
+        yield (f'vectors/{radix}/{size}',
+               lambda radix=radix: write_vectors(io.BytesIO(), x, x, radix=radix), size)
+        dump = io.BytesIO()
+        write_vectors(dump, x, x, radix=radix)
+        yield (f'vectors/{radix}/{size}/compare',
+               lambda radix=radix, dump=dump: compare_vectors(io.BytesIO(dump.getvalue()), x, x,
+                                                              radix=radix), size)
+
+
+def fft_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for a batch of 1024 point FFTs on Q1.15 frames"""
+    frames = max(size // 1024, 1)
+    x = FixedPointArray(np.clip(_values('Q4.12', frames * 1024), -1, 0.99).reshape(frames, 1024),
+                        'Q1.15')
+    for radix in (2, 4):
+        for scaling in ('shift', 'bfp'):
+            fft = FFT(1024, 'Q1.15', scaling=scaling, radix=radix)
+            yield f'fft/radix{radix}/{scaling}/{size}', partial(fft.process, x), frames * 1024
+
+
+def parallel_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for ParallelExecutor with eight chunks"""
+    executor = ParallelExecutor(chunk=max(size // 8, 1))
+    x = FixedPointArray(_values('Q16.16', size), 'Q16.16')
+    yield f'parallel/to/{size}', partial(executor.to, x, 'Q16.4', 'fit'), size
+    coeffs = FixedPointArray(_values('Q1.15', 16), 'Q1.15')
+    fir = FIRFilter(coeffs, 'Q1.15', out_fmt='Q1.15')
+    samples = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+    yield f'parallel/fir/16/{size}', partial(executor.fir, fir, samples), size * 16
+
+
+def _mix(x, y):
+    """Small model of products, a shift and requantizations"""
+    return ((x * y + (x >> 2)).to('Q2.20', rounding='floor') * 0.5).to('Q1.15', 'fit')
+
+
+def trace_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for a traced model against the same array operations"""
+    x = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+    y = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+    kernel = trace(_mix, 'Q1.15', 'Q1.15').compile()
+    yield f'trace/ops/{size}', partial(_mix, x, y), size
+    yield f'trace/kernel/{size}', partial(kernel, x, y), size
+
+
+def statistics_cases(size: int) -> Iterator[Case]:
+    """Benchmark cases for error statistics of Q1.15 results"""
+    x = FixedPointArray(_values('Q1.15', size), 'Q1.15')
+    y = x.to('Q1.11', rounding='half_even')
+    yield f'statistics/float/{size}', partial(error_statistics, y, x.to_float()), size
+    yield f'statistics/fixed/{size}', partial(error_statistics, y, x), size
+
+
+def all_cases() -> Iterator[Case]:
+    """All benchmark cases of the suite"""
+    for fmt in FORMATS:
+        yield from scalar_cases(fmt)
+        for size in SIZES:
+            yield from array_cases(fmt, size)
+    for size in SIZES:
+        yield from fir_cases(size)
+        for fmt in FORMATS:
+            yield from dot_cases(fmt, size)
+        yield from function_cases(size)
+        yield from vector_cases(size)
+        yield from fft_cases(size)
+        yield from parallel_cases(size)
+        yield from trace_cases(size)
+        yield from statistics_cases(size)
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> float:
+    """Best time per call in seconds
+
+    Parameters
+    ----------
+    func
+        Function to call without arguments
+    repeat
+        Number of timing runs, the fastest one is reported
+    min_time
+        Minimum duration of a timing run in seconds
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(pattern: str = '', repeat: int = 5, min_time: float = 0.05) -> dict:
+    """Run the suite
+
+    Parameters
+    ----------
+    pattern
+        Only run cases whose name contains pattern
+    repeat
+        Number of timing runs per case
+    min_time
+        Minimum duration of a timing run in seconds
+
+    Returns
+    -------
+        Dictionary with environment info and results per case, giving
+        seconds per call and per element
+    """
+    results = {}
+    for name, func, elements in all_cases():
+        if pattern not in name:
+            continue
+        seconds = measure(func, repeat, min_time)
+        results[name] = {'seconds': seconds, 'per_element': seconds / elements}
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Compare results against a baseline
+
+    Parameters
+    ----------
+    results
+        Output of run()
+    baseline
+        Output of run() stored earlier
+    threshold
+        Ratio of new to baseline time above which a case counts as regression
+
+    Returns
+    -------
+        List of (name, baseline seconds, new seconds, ratio) for regressions
+    """
+    regressions = []
+    for name, new in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = new['seconds'] / old['seconds']
+        if ratio > threshold:
+            regressions.append((name, old['seconds'], new['seconds'], ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Run the suite from the command line, returns 1 on regressions"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default='', help='only run cases containing this string')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per case')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum seconds per timing run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--save-baseline', help='write results as new baseline to this file')
+    parser.add_argument('--baseline', help='compare results against this baseline file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio counted as regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat, args.min_time)
+    for name, result in results['results'].items():
+        seconds, per_element = result['seconds'], result['per_element']
+        print(f'{name:<40}{seconds * 1e6:>14.3f} us{per_element * 1e9:>12.2f} ns/el')
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, ratio in regressions:
+            print(f'REGRESSION {name}: {old * 1e6:.3f} us -> {new * 1e6:.3f} us ({ratio:.2f}x)')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
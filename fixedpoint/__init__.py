@@ -5,4 +5,21 @@
 
 __version__ = '0.01'
 
+from .format import QFormat
 from .fixedpoint import FixedPoint
+from .array import FixedPointArray, qarray
+from .dtype import qdtype
+from .requantize import requantize
+from .context import Context, getcontext, setcontext, localcontext
+from .fir import FIRFilter
+from .linalg import dot, mac
+from .capture import load_capture, iter_chunks
+from .packing import pack, unpack, packed_size
+from .hdl import write_vectors, iter_vectors, read_vectors, compare_vectors, Comparator
+from .elementary import sin, cos, atan2, sqrt, reciprocal, divide
+from .transform import FFT, fft, ifft
+from .parallel import ParallelExecutor
+from .analysis import RangeAnalyzer, recommend_format
+from .statistics import ErrorStatistics, error_statistics
+from .trace import trace, fuse
+from . import instrument
@@ -0,0 +1,338 @@
+"""Streaming range analysis and fixed point format selection
+
+RangeAnalyzer watches a signal in one pass with constant memory. Besides
+the running minimum, maximum and power it keeps two histograms:
+
+    magnitude: number of samples per power of two of the magnitude
+    LSB activity: number of samples per number of fractional bits needed
+        to represent them exactly
+
+From the histograms it estimates the overflow probability of a number of
+integer bits and the quantization SNR of a number of fractional bits and
+recommends the smallest format meeting both:
+
+    >>> import numpy as np
+    >>> from fixedpoint import RangeAnalyzer
+    >>> analyzer = RangeAnalyzer()
+    >>> for chunk in np.array_split(0.9 * np.sin(0.01 * np.arange(1000000)), 10):
+    ...     analyzer.update(chunk)
+    >>> analyzer.recommend(sqnr=60)
+    QFormat(1, 10)
+    >>> analyzer.recommend(sqnr=60, rounding='half_even')
+    QFormat(1, 9)
+"""
+from __future__ import annotations
+import math
+from typing import Iterable
+import numpy as np
+from .array import FixedPointArray
+from .format import QFormat
+
+# histogram bins cover the exponents of all float64 values, including subnormals
+_OFFSET = 1100
+_BINS = 2 * _OFFSET
+
+# mean square error in LSB squared of a value uniformly distributed between two steps
+_NOISE = {'floor': 1 / 3, 'ceil': 1 / 3, 'trunc': 1 / 3, 'half_up': 1 / 12, 'half_even': 1 / 12,
+          'stochastic': 1 / 6}
+
+
+def _bit_length(u: np.ndarray) -> np.ndarray:
+    """Bit length of unsigned 64 bit integers"""
+    # the conversion to float may round up to the next power of two
+    bits = np.minimum(np.frexp(u.astype(np.float64))[1], 64).astype(np.uint64)
+    bits[u == 0] = 1
+    return np.where(u >> (bits - np.uint64(1)) == 0, bits - np.uint64(1), bits).astype(np.int64)
+
+
+def _float_bins(x: np.ndarray):
+    """Magnitude exponents and needed fractional bits of finite non-zero floats
+
+    Returns
+    -------
+    exponent
+        floor(log2(x)) for positive values and ceil(log2(-x)) - 1 for
+        negative values, i.e. the smallest e with |x| < 2**(e+1) resp. |x| <= 2**(e+1)
+    frac_bits
+        Smallest number of fractional bits representing x exactly, at least zero
+    """
+    mant, exp = np.frexp(np.abs(x))
+    exponent = exp - 1 - ((x < 0) & (mant == 0.5))
+    # |x| = integer * 2**(exp-53) with a 53 bit integer
+    integer = np.ldexp(mant, 53).astype(np.int64)
+    trailing = np.frexp((integer & -integer).astype(np.float64))[1] - 1
+    return exponent, np.maximum(53 - exp - trailing, 0)
+
+
+def _raw_bins(raw: np.ndarray, n: int):
+    """Magnitude exponents and needed fractional bits of non-zero scaled integers
+
+    See _float_bins, n is the number of fractional bits of the format.
+    """
+    if raw.dtype == object:
+        bit_length = np.frompyfunc(int.bit_length, 1, 1)
+        # ~raw is |raw| - 1 for negative raw
+        length = np.asarray(bit_length(np.where(raw > 0, raw, ~raw)), dtype=np.int64)
+        trailing = np.asarray(bit_length(raw & -raw), dtype=np.int64) - 1
+    else:
+        raw = raw.astype(np.int64)
+        length = _bit_length(np.where(raw > 0, raw, ~raw).view(np.uint64))
+        trailing = _bit_length((raw & -raw).view(np.uint64)) - 1
+    return length - 1 - n, np.maximum(n - trailing, 0)
+
+
+class RangeAnalyzer:  # pylint: disable=too-many-instance-attributes
+    """Range and resolution statistics of a stream of samples
+
+    Samples are passed piece by piece to update, only the statistics are
+    kept. NaN and infinite values are counted as invalid and otherwise
+    ignored.
+
+    Attributes
+    ----------
+    count
+        Number of valid samples
+    invalid
+        Number of NaN and infinite samples
+    zeros
+        Number of samples equal to zero
+    min, max
+        Smallest and largest valid sample
+    """
+
+    def __init__(self, chunk: int = 1 << 20):
+        """RangeAnalyzer
+
+        Parameters
+        ----------
+        chunk
+            Number of samples processed at once, bounds the temporary memory
+        """
+        self.chunk = chunk
+        self.count = 0
+        self.invalid = 0
+        self.zeros = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._positive = np.zeros(_BINS, dtype=np.int64)
+        self._negative = np.zeros(_BINS, dtype=np.int64)
+        self._frac_bits = np.zeros(_BINS, dtype=np.int64)
+
+    def update(self, x) -> RangeAnalyzer:
+        """Add samples to the statistics
+
+        Parameters
+        ----------
+        x
+            FixedPointArray or array-like of numbers. The histograms of
+            FixedPointArray are computed from the scaled integers.
+
+        Returns
+        -------
+            The analyzer itself
+        """
+        if isinstance(x, FixedPointArray):
+            raw = np.ravel(x.raw)
+            for start in range(0, raw.size, self.chunk):
+                self._update_raw(raw[start:start + self.chunk], x.qformat)
+        else:
+            values = np.ravel(np.asarray(x, dtype=np.float64))
+            for start in range(0, values.size, self.chunk):
+                self._update_float(values[start:start + self.chunk])
+        return self
+
+    def _update_float(self, values: np.ndarray):
+        """Add a piece of floats"""
+        finite = np.isfinite(values)
+        self.invalid += int(values.size - np.count_nonzero(finite))
+        values = values[finite]
+        self._update_moments(values)
+        nonzero = values[values != 0]
+        self._update_bins(nonzero > 0, *_float_bins(nonzero))
+
+    def _update_raw(self, raw: np.ndarray, qformat: QFormat):
+        """Add a piece of scaled integers"""
+        values = raw.astype(np.float64) / qformat.scale
+        self._update_moments(values)
+        nonzero = raw[raw != 0]
+        self._update_bins(nonzero > 0, *_raw_bins(nonzero, qformat.n))
+
+    def _update_moments(self, values: np.ndarray):
+        """Add count, extrema and power of valid samples"""
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.zeros += int(values.size - np.count_nonzero(values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._sum += float(values.sum())
+        self._sum_squares += float(np.dot(values, values))
+
+    def _update_bins(self, positive: np.ndarray, exponent: np.ndarray, frac_bits: np.ndarray):
+        """Add non-zero samples to the histograms"""
+        index = np.clip(exponent + _OFFSET, 0, _BINS - 1)
+        self._positive += np.bincount(index[positive], minlength=_BINS)
+        self._negative += np.bincount(index[~positive], minlength=_BINS)
+        self._frac_bits += np.bincount(np.minimum(frac_bits, _BINS - 1), minlength=_BINS)
+
+    def merge(self, other: RangeAnalyzer) -> RangeAnalyzer:
+        """Add the statistics of another analyzer, e.g. of a parallel stream
+
+        Returns
+        -------
+            The analyzer itself
+        """
+        self.count += other.count
+        self.invalid += other.invalid
+        self.zeros += other.zeros
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._sum += other._sum  # pylint: disable=protected-access
+        self._sum_squares += other._sum_squares  # pylint: disable=protected-access
+        self._positive += other._positive  # pylint: disable=protected-access
+        self._negative += other._negative  # pylint: disable=protected-access
+        self._frac_bits += other._frac_bits  # pylint: disable=protected-access
+        return self
+
+    @property
+    def mean(self) -> float:
+        """Mean of the valid samples"""
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def rms(self) -> float:
+        """Root mean square of the valid samples"""
+        return math.sqrt(self._sum_squares / self.count) if self.count else 0.0
+
+    def histogram(self):
+        """Magnitude histogram
+
+        Returns
+        -------
+        exponents
+            Exponents e of the non-empty bins. A bin holds the positive
+            samples in [2**e, 2**(e+1)) and the negative ones in [-2**(e+1), -2**e)
+        positive, negative
+            Number of positive and negative samples per bin
+        """
+        index = np.flatnonzero(self._positive + self._negative)
+        return index - _OFFSET, self._positive[index], self._negative[index]
+
+    def frac_bits(self) -> int:
+        """Number of fractional bits representing all samples exactly"""
+        index = np.flatnonzero(self._frac_bits)
+        return int(index[-1]) if index.size else 0
+
+    def overflow_probability(self, m: int) -> float:
+        """Fraction of samples out of the range of m integer bits
+
+        Samples are out of range if they are at least 2**(m-1) or smaller
+        than -2**(m-1), i.e. if they overflow after rounding toward minus infinity.
+        """
+        if not self.count:
+            return 0.0
+        start = min(max(m - 1 + _OFFSET, 0), _BINS)
+        out = self._positive[start:].sum() + self._negative[start:].sum()
+        return float(out) / self.count
+
+    def sqnr(self, n: int, rounding: str = 'trunc') -> float:
+        """Estimated signal to quantization noise ratio in dB with n fractional bits
+
+        Samples which need more than n fractional bits are assumed to be
+        uniformly distributed between two steps, the noise power is 2**(-2n) / 3
+        when truncating and 2**(-2n) / 12 when rounding to nearest. Exactly
+        represented samples have no error.
+
+        Parameters
+        ----------
+        n
+            Number of fractional bits
+        rounding
+            Rounding mode, see requantize
+        """
+        if rounding not in _NOISE:
+            raise ValueError(f'Invalid rounding mode {rounding} given.')
+        inexact = self._frac_bits[max(n + 1, 0):].sum()
+        if not inexact:
+            return math.inf
+        noise = float(inexact) / self.count * 2.0 ** (-2 * n) * _NOISE[rounding]
+        power = self._sum_squares / self.count
+        return 10 * math.log10(power / noise) if power else -math.inf
+
+    def recommend(self, overflow: float = 0.0, sqnr: float | None = None, *,
+                  rounding: str = 'trunc', max_bits: int = 64) -> QFormat:
+        """Smallest format meeting an overflow probability and a quantization SNR
+
+        Parameters
+        ----------
+        overflow
+            Largest allowed fraction of samples out of range. Zero keeps all
+            samples at most the largest value of the format, so they can be
+            converted to it with any rounding mode.
+        sqnr
+            Smallest allowed SNR in dB, see sqnr. Default is to represent all samples exactly.
+        rounding
+            Rounding mode of the quantization, see requantize, except exact
+        max_bits
+            Raise ValueError if the format needs more bits
+
+        Returns
+        -------
+            QFormat with n >= 0 fractional bits
+        """
+        if rounding not in _NOISE:
+            raise ValueError(f'Invalid rounding mode {rounding} given.')
+        if not self.count:
+            raise ValueError('No samples were analyzed')
+        n = self.frac_bits()
+        if sqnr is not None:
+            n = next(k for k in range(n + 1) if self.sqnr(k, rounding) >= sqnr)
+        # samples out of range for m integer bits are counted in the bins from m-1 on
+        tail = np.cumsum((self._positive + self._negative)[::-1])[::-1]
+        tail = np.append(tail, 0)
+        m = int(np.argmax(tail <= overflow * self.count)) - _OFFSET + 1
+        m = max(m, 1 - n)
+        # the conversion rejects values above the largest value of the format
+        # before rounding, this also keeps rounded values in range
+        if overflow == 0 and self.max > QFormat(m, n).maxval:
+            m += 1
+        if m + n > max_bits:
+            raise ValueError(f'The format Q{m}.{n} needs more than {max_bits} bits')
+        return QFormat(m, n)
+
+    def report(self) -> str:
+        """Statistics and magnitude histogram formatted as text"""
+        lines = [f'samples {self.count}, invalid {self.invalid}, zeros {self.zeros}',
+                 f'min {self.min:.6g}, max {self.max:.6g}, mean {self.mean:.6g}, '
+                 f'rms {self.rms:.6g}, fractional bits {self.frac_bits()}',
+                 f"{'magnitude':<12}{'positive':>12}{'negative':>12}"]
+        for exponent, positive, negative in zip(*self.histogram()):
+            lines.append(f"{'2^' + str(exponent):<12}{positive:>12}{negative:>12}")
+        return '\n'.join(lines)
+
+
+def recommend_format(chunks: Iterable, overflow: float = 0.0, sqnr: float | None = None,
+                     **kwargs) -> QFormat:
+    """Analyze a stream of pieces and recommend a format, see RangeAnalyzer.recommend
+
+    Parameters
+    ----------
+    chunks
+        Iterable of FixedPointArray or array-like pieces, e.g. iter_chunks
+    overflow
+        Largest allowed fraction of samples out of range
+    sqnr
+        Smallest allowed quantization SNR in dB
+    kwargs
+        rounding and max_bits, see RangeAnalyzer.recommend
+
+    Returns
+    -------
+        QFormat
+    """
+    analyzer = RangeAnalyzer()
+    for chunk in chunks:
+        analyzer.update(chunk)
+    return analyzer.recommend(overflow, sqnr, **kwargs)
@@ -0,0 +1,923 @@
+"""Fixed point arrays backed by a NumPy integer buffer
+
+
+"""
+from __future__ import annotations
+from math import ceil, log2
+from numbers import Real
+import operator
+import numpy as np
+from . import instrument
+from .dtype import fmt_from_dtype, qdtype, storage_dtype
+from .format import QFormat, as_qformat, product_format, quotient_format, sum_format
+from .context import getcontext
+from .fixedpoint import FixedPoint
+from .requantize import _block, _blocks, _broadcast, _overflow, policy_modes, requantize, \
+    round_ratio
+
+_BINARY_UFUNCS = {
+    np.add: ('__add__', '__radd__'),
+    np.subtract: ('__sub__', '__rsub__'),
+    np.multiply: ('__mul__', '__rmul__'),
+    np.true_divide: ('__truediv__', '__rtruediv__'),
+    np.floor_divide: ('__floordiv__', '__rfloordiv__'),
+    np.remainder: ('__mod__', '__rmod__'),
+    np.divmod: ('__divmod__', '__rdivmod__'),
+    np.equal: ('__eq__', '__eq__'),
+    np.not_equal: ('__ne__', '__ne__'),
+    np.less: ('__lt__', '__gt__'),
+    np.less_equal: ('__le__', '__ge__'),
+    np.greater: ('__gt__', '__lt__'),
+    np.greater_equal: ('__ge__', '__le__'),
+    np.left_shift: ('__lshift__', None),
+    np.right_shift: ('__rshift__', None),
+}
+
+_UNARY_UFUNCS = {
+    np.negative: operator.neg,
+    np.positive: operator.pos,
+    np.absolute: operator.abs,
+}
+
+# operators with a fixed point result stored into out, see FixedPointArray._store
+_STORE_UFUNCS: dict = {
+    np.add: operator.add,
+    np.subtract: operator.sub,
+    np.multiply: operator.mul,
+    np.left_shift: operator.lshift,
+    np.right_shift: operator.rshift,
+    **_UNARY_UFUNCS,
+}
+
+_MIRRORED = {
+    np.equal: np.equal,
+    np.not_equal: np.not_equal,
+    np.less: np.greater,
+    np.less_equal: np.greater_equal,
+    np.greater: np.less,
+    np.greater_equal: np.less_equal,
+}
+
+
+def _trunc_shift(x, shift):
+    """Divide integers by 2**shift and truncate toward zero
+
+    Parameters
+    ----------
+    x
+        integer array, integer or object dtype
+    shift
+        number of bits to shift right, negative values shift left
+    """
+    left = np.maximum(-shift, 0)
+    right = np.maximum(shift, 0)
+    if x.dtype == object:
+        left = np.asarray(left).astype(object)
+        right = np.asarray(right).astype(object)
+    x = x << left
+    return np.where(x < 0, -((-x) >> right), x >> right)
+
+
+def _trunc_shift_scalar(x: np.ndarray, shift: int) -> np.ndarray:
+    """Divide integers by 2**shift truncating toward zero, shift >= 0 is an integer
+
+    Works in place for int64 arrays.
+    """
+    if shift <= 0:
+        return x
+    if x.dtype == object:
+        return np.where(x < 0, -((-x) >> shift), x >> shift)
+    # add 2**shift-1 to negative values so that the floor of the shift truncates toward zero
+    bias = x >> 63
+    bias &= (1 << shift) - 1
+    x += bias
+    x >>= shift
+    return x
+
+
+def _widen(raw: np.ndarray, bits: int) -> np.ndarray:
+    """Cast scaled integers to the storage type for the given width"""
+    return raw.astype(storage_dtype(bits), copy=False)
+
+
+def _fits_dtype(dtype: np.dtype, bits: int) -> bool:
+    """Check if integers with the given width can be stored with dtype"""
+    if dtype == object:
+        return True
+    return dtype.kind == 'i' and dtype.itemsize * 8 >= bits
+
+
+def _check_raw(raw: np.ndarray, qformat: QFormat):
+    """Raise ValueError if any scaled integer does not fit into the format"""
+    if raw.size == 0:
+        return
+    if raw.min() < qformat.min_raw or raw.max() > qformat.max_raw:
+        raise ValueError(f'Values do not fit in the given format {qformat}')
+
+
+def _exact(op, raw: np.ndarray, qformat: QFormat, other) -> tuple:
+    """Exact result of an operator as scaled integers and their format
+
+    other is the scaled integers and format of the fixed point operand of
+    add, sub and mul or the shift count, a right shift floors like the
+    operator
+    """
+    bits = qformat.bits
+    if op in (operator.neg, operator.abs):
+        return op(_widen(raw, bits + 1)), QFormat(qformat.m + 1, qformat.n)
+    if op is operator.pos:
+        return raw, qformat
+    if op is operator.lshift:
+        return _widen(raw, bits + other) << other, QFormat(qformat.m + other, qformat.n)
+    if op is operator.rshift:
+        return raw >> other, qformat
+    other, qfmt = other
+    if op is operator.mul:
+        bits += qfmt.bits
+        return (_widen(raw, bits) * _widen(other, bits),
+                QFormat(qformat.m + qfmt.m, qformat.n + qfmt.n))
+    newfmt = sum_format(qformat, qfmt)
+    return op(_widen(raw, newfmt.bits) << (newfmt.n - qformat.n),
+              _widen(other, newfmt.bits) << (newfmt.n - qfmt.n)), newfmt
+
+
+def _scalar_op(raw: np.ndarray, other, qformat: QFormat, op) -> np.ndarray:
+    """Apply a FixedPoint operation with numbers elementwise on Python integers"""
+    func = np.frompyfunc(lambda value, number: op(FixedPoint.from_raw(value, qformat),
+                                                  number).value, 2, 1)
+    return np.asarray(func(raw.astype(object), np.asarray(other).astype(object)), dtype=object)
+
+
+def _add_number(raw: np.ndarray, other, qformat: QFormat) -> np.ndarray:
+    """Add numbers to scaled integers, truncating the exact sum toward zero"""
+    other = np.asarray(other)
+    # raw takes at most 61 bits, leaving headroom for an addend below 2**61 in int64
+    if raw.dtype != object and qformat.bits <= 61:
+        if other.dtype.kind in 'iub' and qformat.n >= 0:
+            numbits = max(int(other.max(initial=0)), -int(other.min(initial=0))).bit_length()
+            if numbits + qformat.n <= 61:
+                return raw.astype(np.int64) + (other.astype(np.int64) << qformat.n)
+        elif other.dtype.kind == 'f' and qformat.n <= 52:
+            scaled = other.astype(np.float64) * 2.0 ** qformat.n
+            if np.all(np.abs(scaled) < 2.0 ** 61):
+                raw = raw.astype(np.int64)
+                low = raw + np.floor(scaled).astype(np.int64)
+                high = raw + np.ceil(scaled).astype(np.int64)
+                # raw + scaled >= 0 exactly when raw + floor(scaled) >= 0, as raw is an integer
+                return np.where(low >= 0, low, high)
+    return _scalar_op(raw, other, qformat, operator.add)
+
+
+def _dyadic(other: np.ndarray):
+    """Numbers as num * 2**-shift with int64 num and shift, None if they are not finite reals"""
+    if other.dtype.kind not in 'iubf' or not np.all(np.isfinite(other)):
+        return None
+    if other.dtype.kind == 'f':
+        mant, exp = np.frexp(other.astype(np.float64))
+        num = (mant * 2.0 ** 53).astype(np.int64)
+        shift = 53 - exp.astype(np.int64)
+        # strip trailing zero bits to keep the numerator as short as possible
+        trailing = np.log2((num & -num) | (num == 0)).astype(np.int64)
+        return num >> trailing, shift - trailing
+    num = other.astype(np.int64)
+    return num, np.zeros_like(num)
+
+
+def _mul_number(raw: np.ndarray, other, qformat: QFormat) -> np.ndarray:
+    """Multiply scaled integers by numbers, truncating the exact product toward zero"""
+    other = np.asarray(other)
+    parts = _dyadic(other)
+    if raw.dtype != object and parts is not None:
+        num, shift = parts
+        # a negative shift scales the product up by 2**-shift
+        left = int(np.max(-shift, initial=0))
+        numbits = int(np.max(np.abs(num), initial=0)).bit_length()
+        if numbits + qformat.bits + left <= 62:
+            return _trunc_shift(raw.astype(np.int64) * num, shift)
+    return _scalar_op(raw, other, qformat, operator.mul)
+
+
+def _div_number(raw: np.ndarray, other, qformat: QFormat) -> np.ndarray:
+    """Divide scaled integers by numbers, truncating the exact quotient toward zero"""
+    other = np.asarray(other)
+    parts = _dyadic(other)
+    if raw.dtype != object and parts is not None:
+        num, shift = parts
+        # raw / (num * 2**-shift) = raw * 2**shift / num
+        left, right = np.maximum(shift, 0), np.maximum(-shift, 0)
+        numbits = int(np.max(np.abs(num), initial=0)).bit_length()
+        if qformat.bits + int(np.max(left, initial=0)) <= 62 and \
+                numbits + int(np.max(right, initial=0)) <= 62:
+            return round_ratio(raw.astype(np.int64) << left, num << right)
+    return _scalar_op(raw, other, qformat, operator.truediv)
+
+
+def _quotient(raw: np.ndarray, qformat: QFormat, other, n: int,
+              rounding: str = 'trunc') -> np.ndarray:
+    """Quotient of scaled integers rounded to n fractional bits
+
+    other is the scaled integers and format of the divisor. The quotient is
+    returned in int64 or object arrays without range check.
+    """
+    other, qfmt = other
+    # raw / 2**qformat.n / (other / 2**qfmt.n) * 2**n
+    shift = qfmt.n + n - qformat.n
+    dtype = np.int64 if max(qformat.bits + shift, qfmt.bits - shift) <= 62 else object
+    num, den = raw.astype(dtype), other.astype(dtype)
+    if shift >= 0:
+        num = num << shift
+    else:
+        den = den << -shift
+    return round_ratio(num, den, rounding)
+
+
+class FixedPointArray:
+    """Class to perform fixed point operations on arrays of values
+
+    All elements share a single Qm.n format. The values are stored as
+    integers scaled by the n fractional bits in one contiguous NumPy buffer,
+    using the smallest integer type holding m+n bits. Formats wider than
+    64 bits are stored as Python integers in an object array.
+
+    In-place operators and the out argument of ufuncs, to and sum write
+    into an existing array and keep its format: the exact result is
+    rounded once into it with the rounding and overflow modes of the
+    context, so by default the result must fit the target. Operations with
+    numbers round their usual result instead.
+
+    """
+    fmt: str
+    qformat: QFormat
+    raw: np.ndarray
+
+    def __init__(self, values, fmt: str | QFormat | np.dtype | None = None):
+        """FixedPointArray
+        The values are stored as integers scaled by the n fractional bits
+
+        Parameters
+        ----------
+        values
+            Array-like of numerical values, FixedPointArray or NumPy array
+            with a qdtype
+        fmt
+            Format string in the form 'Qm.n', where
+                m is the number of integer bits
+                n is the number of fractional bits
+            or QFormat or a dtype created by qdtype. Can be omitted if values
+            is a FixedPointArray or has a qdtype.
+
+        """
+        valuefmt: str | QFormat | None
+        if isinstance(values, FixedPointArray):
+            valuefmt = values.qformat
+        elif isinstance(values, np.ndarray):
+            valuefmt = fmt_from_dtype(values.dtype)
+        else:
+            valuefmt = None
+        if fmt is None:
+            fmt = valuefmt
+        elif isinstance(fmt, np.dtype):
+            fmt = fmt_from_dtype(fmt)
+        if fmt is None:
+            raise ValueError('No fixed point format given')
+        self._set_format(fmt)
+        if isinstance(values, FixedPointArray):
+            # requantize the scaled integers, the float values may lose bits
+            self.raw = values.to(fmt, 'round').raw
+        elif valuefmt is not None:
+            self.raw = self.from_raw(values, valuefmt).to(fmt, 'round').raw
+        else:
+            self.raw = self.to_fixedpoint(values)
+
+    @classmethod
+    def from_raw(cls, raw, fmt: str | QFormat, check: bool = True) -> FixedPointArray:
+        """Create array from integers already scaled by the n fractional bits
+
+        Parameters
+        ----------
+        raw
+            Array-like of scaled integer values. Integer arrays wide enough
+            for the format are used without copy.
+        fmt
+            Qm.n format string or QFormat
+        check
+            Raise ValueError if a value does not fit into the format, this
+            reads all values
+
+        Returns
+        -------
+            FixedPointArray class
+        """
+        fpa = cls.__new__(cls)
+        fpa._set_format(fmt)
+        if fpa.qformat.bits > 64 and not isinstance(raw, np.ndarray):
+            raw = np.array(raw, dtype=object)
+        raw = np.asarray(raw)
+        if check:
+            _check_raw(raw, fpa.qformat)
+        if not _fits_dtype(raw.dtype, fpa.qformat.bits):
+            raw = _widen(raw, fpa.qformat.bits)
+        fpa.raw = raw
+        return fpa
+
+    @classmethod
+    def _new(cls, raw, fmt: str | QFormat) -> FixedPointArray:
+        """Create array from scaled integers without range check"""
+        fpa = cls.__new__(cls)
+        fpa._set_format(fmt)
+        fpa.raw = _widen(np.asarray(raw), fpa.qformat.bits)
+        return fpa
+
+    @classmethod
+    def _checked(cls, raw, fmt: str | QFormat) -> FixedPointArray:
+        """Create array from scaled integers, raise if they do not fit"""
+        qformat = as_qformat(fmt)
+        try:
+            _check_raw(np.asarray(raw), qformat)
+        except ValueError:
+            if instrument.ENABLED:
+                instrument.observe_requantize(raw, raw, qformat, qformat, 'error')
+            raise
+        return cls._new(raw, qformat)
+
+    def _set_format(self, fmt: str | QFormat):
+        self.qformat = as_qformat(fmt)
+        self.fmt = self.qformat.fmt
+        self.m = self.qformat.m
+        self.n = self.qformat.n
+
+    def to_fixedpoint(self, values) -> np.ndarray:
+        """Convert floating point values to integers with the array format
+
+        Parameters
+        ----------
+        values
+            array-like of numeric values
+
+        Returns
+        -------
+            Integer values scaled up by the number of fractional bits
+        """
+        values = np.asarray(values)
+        qformat = self.qformat
+        if qformat.bits > 53 or values.dtype.kind not in 'iubf':
+            # exact conversion of each value with Python integers
+            proto = FixedPoint.from_raw(0, qformat)
+            raw = np.frompyfunc(proto.to_fixedpoint, 1, 1)(values.astype(object))
+            return _widen(np.asarray(raw, dtype=object), qformat.bits)
+        if not np.all((qformat.minval <= values) & (values <= qformat.maxval)):
+            if instrument.ENABLED:
+                instrument.observe_conversion(values, None, qformat)
+            raise ValueError(f'Values do not fit in the given format {self.fmt}')
+        if values.dtype.kind == 'f':
+            raw = _widen(np.trunc(values * float(qformat.scale)), qformat.bits)
+        else:
+            raw = _widen(values, qformat.bits) << self.n
+        if instrument.ENABLED:
+            instrument.observe_conversion(values, raw, qformat)
+        return raw
+
+    def check_range(self):
+        """Raise ValueError if any value does not fit into the format"""
+        _check_raw(self.raw, self.qformat)
+
+    def to(self, fmt: str | QFormat, policy: str = 'exact',  # pylint: disable=too-many-arguments
+           rounding: str | None = None, overflow: str | None = None, *,
+           rng: np.random.Generator | None = None, out: FixedPointArray | None = None
+           ) -> FixedPointArray:
+        """Coerce to new format according to policy
+
+        Parameters
+        ----------
+        fmt
+            New Format
+        policy
+            Rounding policy
+                exact: values must fit into new format without loss
+                round: fractional part is truncated to fit
+                fit: like round, but saturates if larger than value range
+        rounding
+            Rounding mode overriding the policy, see requantize
+        overflow
+            Overflow mode overriding the policy, see requantize
+        rng
+            NumPy random generator for stochastic rounding
+        out
+            FixedPointArray with the new format receiving the result, may be self
+
+        Returns
+        -------
+            FixedPointArray class, out if given
+
+        """
+        qformat = as_qformat(fmt)
+        rounding, overflow = policy_modes(policy, rounding, overflow)
+        if out is not None:
+            if not isinstance(out, FixedPointArray) or out.qformat != qformat:
+                raise ValueError(f'out must be a FixedPointArray with the format {qformat}')
+            requantize(self.raw, self.qformat, qformat, rounding, overflow, rng=rng, out=out.raw)
+            return out
+        return self._new(requantize(self.raw, self.qformat, qformat, rounding, overflow, rng=rng),
+                         qformat)
+
+    @property
+    def minval(self) -> float:
+        """Minimum value for FixedPointArray elements"""
+        return self.qformat.minval
+
+    @property
+    def maxval(self) -> float:
+        """Maximum value for FixedPointArray elements"""
+        return self.qformat.maxval
+
+    @property
+    def resolution(self) -> float:
+        """Resolution of FixedPointArray elements"""
+        return self.qformat.resolution
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the array"""
+        return self.raw.shape
+
+    @property
+    def ndim(self) -> int:
+        """Number of array dimensions"""
+        return self.raw.ndim
+
+    @property
+    def size(self) -> int:
+        """Number of elements in the array"""
+        return self.raw.size
+
+    def to_float(self) -> np.ndarray:
+        """Return values as float64 array"""
+        return np.ldexp(self.raw.astype(np.float64), -self.n)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """NumPy dtype of the array, see qdtype"""
+        return qdtype(self.qformat)
+
+    def astype(self, dtype, policy: str = 'round'):
+        """Cast to a fixed point format or a NumPy dtype
+
+        Parameters
+        ----------
+        dtype
+            dtype created by qdtype or any other NumPy dtype
+        policy
+            Rounding policy when casting to a fixed point format, see to()
+
+        Returns
+        -------
+            FixedPointArray for a qdtype, otherwise a NumPy array of the values
+        """
+        fmt = fmt_from_dtype(np.dtype(dtype))
+        if fmt is not None:
+            return self.to(fmt, policy)
+        return self.to_float().astype(dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError('FixedPointArray can not be converted without copy')
+        fmt = fmt_from_dtype(np.dtype(dtype)) if dtype is not None else None
+        if fmt is not None:
+            return self.to(fmt, 'round').raw.view(qdtype(fmt))
+        return self.to_float().astype(dtype, copy=False) if dtype else self.to_float()
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        out = kwargs.get('out')
+        if method not in ('__call__', 'reduce') or out is not None and (
+                method == 'reduce' or len(out) != 1 or len(kwargs) != 1):
+            return NotImplemented
+        inputs = tuple(self.__class__(x) if isinstance(x, np.ndarray) and fmt_from_dtype(x.dtype)
+                       else x for x in inputs)
+        if out is not None:
+            return self._ufunc_out(ufunc, inputs, out[0])
+        if method == 'reduce':
+            if ufunc is not np.add:
+                return NotImplemented
+            return inputs[0].sum(axis=kwargs.get('axis', 0), keepdims=kwargs.get('keepdims', False))
+        if ufunc in _UNARY_UFUNCS:
+            return _UNARY_UFUNCS[ufunc](inputs[0])
+        name, rname = _BINARY_UFUNCS.get(ufunc, (None, None))
+        if not isinstance(inputs[0], FixedPointArray):
+            name, inputs = rname, inputs[::-1]
+        return NotImplemented if name is None else getattr(inputs[0], name)(inputs[1])
+
+    @staticmethod
+    def _ufunc_out(ufunc, inputs: tuple, out):
+        """Apply a ufunc with an out argument to fixed point inputs"""
+        inputs = tuple(FixedPointArray._new(x.value, x.qformat) if isinstance(x, FixedPoint)
+                       else x for x in inputs)
+        if ufunc in _MIRRORED:
+            if not isinstance(inputs[0], FixedPointArray):
+                ufunc, inputs = _MIRRORED[ufunc], inputs[::-1]
+            return ufunc(*FixedPointArray._compare(*inputs), out=out)
+        op = _STORE_UFUNCS.get(ufunc)
+        if op is None or len(inputs) == 2 and not isinstance(inputs[0], FixedPointArray) and \
+                op in (operator.lshift, operator.rshift):
+            return NotImplemented
+        if len(inputs) == 1:
+            return FixedPointArray._store(inputs[0], op, None, out)
+        if isinstance(inputs[0], FixedPointArray):
+            return FixedPointArray._store(inputs[0], op, inputs[1], out)
+        return FixedPointArray._store(inputs[1], op, inputs[0], out, reverse=True)
+
+    def sum(self, axis=None, dtype=None, out=None, keepdims=False):
+        """Sum of array elements over a given axis
+        Summing N values grows the number of int bits like a tree of additions,
+        Q4.2 values -> Q(4+ceil(log2(N))).2
+
+        Parameters
+        ----------
+        axis
+            Axis or axes along which to sum, None sums all elements
+        dtype
+            Optional qdtype to cast the result to
+        out
+            FixedPointArray receiving the sum rounded into its format with
+            the rounding and overflow modes of the context, can not be
+            combined with dtype
+        keepdims
+            Keep reduced axes with size one
+
+        Returns
+        -------
+            FixedPointArray class, or FixedPoint for a sum over all elements
+        """
+        if out is not None and dtype is not None:
+            raise TypeError('FixedPointArray.sum takes either dtype or out')
+        axes = range(self.ndim) if axis is None else np.atleast_1d(axis)
+        count = int(np.prod([self.shape[i] for i in axes]))
+        m = self.m + ceil(log2(count)) if count > 1 else self.m
+        qformat = QFormat(m, self.n)
+        raw = np.sum(_widen(self.raw, qformat.bits), axis=axis, keepdims=keepdims)
+        if out is not None:
+            if not isinstance(out, FixedPointArray):
+                raise TypeError(f'out must be a FixedPointArray, not {type(out).__name__}')
+            ctx = getcontext()
+            requantize(raw, qformat, out.qformat, ctx.rounding, ctx.overflow, out=out.raw)
+            return out
+        result = self._new(raw, qformat)
+        if dtype is not None:
+            result = result.astype(dtype)
+        if result.ndim == 0:
+            return result[()]
+        return result
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        raw = self.raw[key]
+        if np.ndim(raw) == 0:
+            return FixedPoint.from_raw(int(raw), self.qformat)
+        return self._new(raw, self.qformat)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, (FixedPoint, FixedPointArray)):
+            value = value.to(self.qformat)
+            self.raw[key] = value.value if isinstance(value, FixedPoint) else value.raw
+        else:
+            self.raw[key] = self.to_fixedpoint(value)
+
+    def __repr__(self):
+        return f"FixedPointArray({self.to_float().tolist()}, '{self.fmt}')"
+
+    def _operand(self, other):
+        """Return scaled integers and format of a fixed point operand"""
+        if isinstance(other, FixedPointArray):
+            return other.raw, other.qformat
+        return np.asarray(other.value, dtype=storage_dtype(other.qformat.bits)), other.qformat
+
+    def _store(self, op, other, out: FixedPointArray, reverse: bool = False) -> FixedPointArray:
+        """Round the exact result of an operator into the format of out
+
+        The operands are broadcast to the shape of out and processed block
+        by block, out may be one of them. The rounding and overflow modes
+        are those of the context, trunc and error by default. With numbers
+        the result of the operator is rounded, which keeps the operand
+        format in the default context.
+
+        Parameters
+        ----------
+        op
+            Function of the operator module
+        other
+            Fixed point operand, numbers, shift count or None for unary operators
+        out
+            FixedPointArray receiving the result
+        reverse
+            Apply op to the numbers and self
+
+        Returns
+        -------
+            out
+        """
+        if not isinstance(out, FixedPointArray):
+            raise TypeError(f'out must be a FixedPointArray, not {type(out).__name__}')
+        ctx = getcontext()
+        raw = _broadcast(self.raw, out.raw)
+        operand: np.ndarray | None = None
+        qfmt: QFormat | None = None
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            other_raw, qfmt = self._operand(other)
+            operand = _broadcast(other_raw, out.raw)
+        elif op in (operator.add, operator.sub, operator.mul):
+            operand = _broadcast(other, out.raw)
+        for block in _blocks(out.shape):
+            x = _block(raw, block)
+            if operand is None:
+                x, exact = _exact(op, x, self.qformat, other)
+            elif qfmt is None:
+                x = self._new(x, self.qformat)
+                x = op(_block(operand, block), x) if reverse else op(x, _block(operand, block))
+                x, exact = x.raw, x.qformat
+            else:
+                x, exact = _exact(op, x, self.qformat, (_block(operand, block), qfmt))
+            out.raw[block] = requantize(x, exact, out.qformat, ctx.rounding, ctx.overflow)
+        return out
+
+    def _pair(self, ctx, raw, exact: QFormat, grown: QFormat, other: QFormat) -> FixedPointArray:
+        """Requantize the exact result of an operation with a fixed point operand"""
+        operand = QFormat(max(self.m, other.m), max(self.n, other.n))
+        qformat = ctx.result_format(grown, operand)
+        return self._new(requantize(raw, exact, qformat, ctx.rounding, ctx.overflow), qformat)
+
+    def _unary(self, raw, exact: QFormat) -> FixedPointArray:
+        """Result of an operation on self, raw is the exact result in the exact format"""
+        ctx = getcontext()
+        qformat = ctx.result_format(self.qformat, self.qformat)
+        if ctx.default:
+            return self._checked(raw, qformat)
+        return self._new(requantize(raw, exact, qformat, ctx.rounding, ctx.overflow), qformat)
+
+    def _number(self, other, op) -> FixedPointArray | None:
+        """Apply a FixedPoint operation with numbers elementwise if the context is not default"""
+        ctx = getcontext()
+        if ctx.default:
+            return None
+        qformat = ctx.result_format(self.qformat, self.qformat)
+        return self._new(_scalar_op(self.raw, other, self.qformat, op), qformat)
+
+    def __add__(self, other) -> FixedPointArray:
+        """Add two values elementwise
+        Adding two FixedPoint values means Q4.2 + Q4.2 -> Q5.2
+
+        Parameters
+        ----------
+        other
+            other value to add, can be FixedPointArray, FixedPoint or numbers
+            if type is FixedPointArray or FixedPoint, the number of int bits (m) -> (m+1)
+        """
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            newval, newfmt = _exact(operator.add, self.raw, self.qformat, self._operand(other))
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(newval, newfmt)
+            return self._pair(ctx, newval, newfmt, newfmt, other.qformat)
+        result = self._number(other, FixedPoint.__add__)
+        if result is not None:
+            return result
+        return self._checked(_add_number(self.raw, other, self.qformat), self.qformat)
+
+    def __sub__(self, other) -> FixedPointArray:
+        """Subtract two values elementwise
+        Subtracting two FixedPoint values means Q4.2 - Q4.2 -> Q5.2
+
+        Parameters
+        ----------
+        other
+            other value to subtract, can be FixedPointArray, FixedPoint or numbers
+            if type is FixedPointArray or FixedPoint, the number of int bits (m) -> (m+1)
+        """
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            newval, newfmt = _exact(operator.sub, self.raw, self.qformat, self._operand(other))
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(newval, newfmt)
+            return self._pair(ctx, newval, newfmt, newfmt, other.qformat)
+        result = self._number(other, FixedPoint.__sub__)
+        if result is not None:
+            return result
+        return self._checked(_add_number(self.raw, -np.asarray(other), self.qformat),
+                             self.qformat)
+
+    def __mul__(self, other) -> FixedPointArray:
+        """Multiply two values elementwise
+        Multiplying two FixedPoint values means Q4.2 * Q4.2 -> Q8.2
+
+        Parameters
+        ----------
+        other
+            other value to multiply, can be FixedPointArray, FixedPoint or numbers
+            if type is FixedPointArray or FixedPoint, the number of int bits (m) -> (m+m_other)
+        """
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            newval, exact = _exact(operator.mul, self.raw, self.qformat, self._operand(other))
+            newfmt = product_format(self.qformat, other.qformat)
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(_trunc_shift(newval, exact.n - newfmt.n), newfmt)
+            return self._pair(ctx, newval, exact, newfmt, other.qformat)
+        result = self._number(other, FixedPoint.__mul__)
+        if result is not None:
+            return result
+        return self._checked(_mul_number(self.raw, other, self.qformat), self.qformat)
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __rsub__(self, other):
+        if isinstance(other, FixedPoint):
+            return self._new(other.value, other.qformat) - self
+        result = self._number(other, FixedPoint.__rsub__)
+        if result is not None:
+            return result
+        return self._checked(-_add_number(self.raw, -np.asarray(other), self.qformat),
+                             self.qformat)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def _elementwise(self, other, op) -> FixedPointArray:
+        """Apply a FixedPoint operation with numbers elementwise in the format of self"""
+        result = self._number(other, op)
+        if result is not None:
+            return result
+        return self._new(_scalar_op(self.raw, other, self.qformat, op), self.qformat)
+
+    def __truediv__(self, other) -> FixedPointArray:
+        """Divide two values elementwise
+        Dividing two FixedPoint values means Q4.2 / Q4.2 -> Q6.6, see quotient_format
+
+        Parameters
+        ----------
+        other
+            divisor, can be FixedPointArray, FixedPoint or numbers
+            if type is FixedPointArray or FixedPoint, (m, n) -> (m+n_other, n+m_other)
+        """
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            newfmt = quotient_format(self.qformat, other.qformat)
+            ctx = getcontext()
+            if ctx.default:
+                return self._checked(_quotient(self.raw, self.qformat, self._operand(other),
+                                               newfmt.n), newfmt)
+            qformat = ctx.result_format(newfmt, QFormat(max(self.m, other.m),
+                                                        max(self.n, other.n)))
+            raw = _quotient(self.raw, self.qformat, self._operand(other), qformat.n,
+                            ctx.rounding)
+            return self._new(_overflow(raw, qformat, ctx.overflow), qformat)
+        result = self._number(other, FixedPoint.__truediv__)
+        if result is not None:
+            return result
+        return self._checked(_div_number(self.raw, other, self.qformat), self.qformat)
+
+    def __rtruediv__(self, other):
+        if isinstance(other, FixedPoint):
+            return self._new(other.value, other.qformat) / self
+        return self._elementwise(other, FixedPoint.__rtruediv__)
+
+    def __divmod__(self, other):
+        """Floor division and remainder elementwise, see FixedPoint.__floordiv__ and __mod__"""
+        if not isinstance(other, (FixedPointArray, FixedPoint)):
+            return (self._elementwise(other, FixedPoint.__floordiv__),
+                    self._elementwise(other, FixedPoint.__mod__))
+        raw, qfmt = self._operand(other)
+        n = max(self.n, qfmt.n)
+        bits = max(self.qformat.bits + n - self.n, qfmt.bits + n - qfmt.n) + 1
+        a, b = _widen(self.raw, bits) << (n - self.n), _widen(raw, bits) << (n - qfmt.n)
+        if np.any(b == 0):
+            raise ZeroDivisionError('Division by zero')
+        quot = a // b
+        rem = a - quot * b
+        newfmt = quotient_format(self.qformat, qfmt)
+        remfmt = QFormat(qfmt.m, n)
+        quot = _widen(quot, newfmt.bits + 1) << newfmt.n
+        ctx = getcontext()
+        if ctx.default:
+            return self._checked(quot, newfmt), self._new(rem, remfmt)
+        return (self._pair(ctx, quot, QFormat(newfmt.m + 1, newfmt.n), newfmt, qfmt),
+                self._pair(ctx, rem, remfmt, remfmt, qfmt))
+
+    def __floordiv__(self, other):
+        if not isinstance(other, (FixedPointArray, FixedPoint)):
+            return self._elementwise(other, FixedPoint.__floordiv__)
+        return self.__divmod__(other)[0]
+
+    def __mod__(self, other):
+        if not isinstance(other, (FixedPointArray, FixedPoint)):
+            return self._elementwise(other, FixedPoint.__mod__)
+        return self.__divmod__(other)[1]
+
+    def __rfloordiv__(self, other):
+        if isinstance(other, FixedPoint):
+            return self._new(other.value, other.qformat) // self
+        return self._elementwise(other, FixedPoint.__rfloordiv__)
+
+    def __rmod__(self, other):
+        if isinstance(other, FixedPoint):
+            return self._new(other.value, other.qformat) % self
+        return self._elementwise(other, FixedPoint.__rmod__)
+
+    def __rdivmod__(self, other):
+        return self.__rfloordiv__(other), self.__rmod__(other)
+
+    def __neg__(self):
+        return self._unary(*_exact(operator.neg, self.raw, self.qformat, None))
+
+    def __pos__(self):
+        return self._new(self.raw.copy(), self.qformat)
+
+    def __abs__(self):
+        return self._unary(*_exact(operator.abs, self.raw, self.qformat, None))
+
+    def __lshift__(self, other):
+        return self._unary(*_exact(operator.lshift, self.raw, self.qformat, other))
+
+    def __rshift__(self, other):
+        return self._new(self.raw >> other, self.qformat)
+
+    def __iadd__(self, other):
+        return self._store(operator.add, other, self)
+
+    def __isub__(self, other):
+        return self._store(operator.sub, other, self)
+
+    def __imul__(self, other):
+        return self._store(operator.mul, other, self)
+
+    def __ilshift__(self, other):
+        return self._store(operator.lshift, other, self)
+
+    def __irshift__(self, other):
+        return self._store(operator.rshift, other, self)
+
+    def _compare(self, other):
+        """Return both operands scaled to a common number of fractional bits"""
+        if isinstance(other, (FixedPointArray, FixedPoint)):
+            raw, qfmt = self._operand(other)
+            newn = max(self.n, qfmt.n)
+            bits = max(self.qformat.bits + newn - self.n, qfmt.bits + newn - qfmt.n)
+            return (_widen(self.raw, bits) << (newn - self.n),
+                    _widen(raw, bits) << (newn - qfmt.n))
+        if not isinstance(other, (Real, np.ndarray, list, tuple)):
+            raise TypeError(f'Can not compare FixedPointArray with {type(other).__name__}')
+        return self.to_float(), np.asarray(other)
+
+    def __eq__(self, other):
+        a, b = self._compare(other)
+        return a == b
+
+    def __ne__(self, other):
+        a, b = self._compare(other)
+        return a != b
+
+    def __gt__(self, other):
+        a, b = self._compare(other)
+        return a > b
+
+    def __ge__(self, other):
+        a, b = self._compare(other)
+        return a >= b
+
+    def __le__(self, other):
+        a, b = self._compare(other)
+        return a <= b
+
+    def __lt__(self, other):
+        a, b = self._compare(other)
+        return a < b
+
+
+def qarray(values, fmt: str | QFormat | np.dtype) -> np.ndarray:
+    """NumPy array with a qdtype holding the scaled integers of numerical values
+
+    np.array(values, dtype=qdtype(fmt)) casts numbers to the integer dtype
+    without scaling, use this function for values that are not scaled yet.
+
+    Parameters
+    ----------
+    values
+        Array-like of numerical values, or FixedPointArray, which is
+        requantized on the scaled integers with policy round
+    fmt
+        Qm.n format string, QFormat or a dtype created by qdtype
+
+    Returns
+    -------
+        Integer array with the dtype qdtype(fmt)
+
+    Raises
+    ------
+    ValueError
+        If a value does not fit into the format
+    """
+    fpa = FixedPointArray(values, fmt)
+    return fpa.raw.astype(fpa.dtype, copy=False).view(fpa.dtype)
@@ -0,0 +1,108 @@
+"""Memory-mapped capture files of raw two's complement samples
+
+A capture file holds packed int8, int16, int32 or int64 samples, already
+scaled by the fractional bits of a known Qm.n format. load_capture maps
+the file into memory and wraps it as FixedPointArray without copying, the
+operating system reads the pages on first access. Captures larger than
+the memory are processed in pieces with iter_chunks:
+
+    >>> from fixedpoint import load_capture, iter_chunks
+    >>> x = load_capture('adc.bin', 'Q1.11', 'int16', byteorder='>')
+    >>> for chunk in iter_chunks(x, 1 << 20):
+    ...     y = fir.process(chunk)
+"""
+from __future__ import annotations
+import os
+from typing import Iterator
+import numpy as np
+from .array import FixedPointArray, _check_raw
+from .dtype import storage_dtype
+from .format import QFormat, as_qformat
+
+
+def load_capture(path: str | os.PathLike,  # pylint: disable=too-many-arguments
+                 fmt: str | QFormat, dtype=None, *, byteorder: str = '<', offset: int = 0,
+                 stride: int | None = None, count: int | None = None,
+                 mode: str = 'r') -> FixedPointArray:
+    """Map a file of scaled integers as FixedPointArray without copy
+
+    Parameters
+    ----------
+    path
+        File name
+    fmt
+        Qm.n format string or QFormat of the samples
+    dtype
+        Signed integer type of one sample, default is the smallest type
+        holding the format
+    byteorder
+        '<' little endian, '>' big endian or '=' native
+    offset
+        Number of bytes before the first sample, e.g. a file header
+    stride
+        Number of bytes from one sample to the next, default is the sample
+        size. Selects one channel of interleaved samples together with offset.
+    count
+        Number of samples, default is all samples up to the end of the file
+    mode
+        'r' read only, 'r+' to write changed samples back to the file, or
+        'c' copy on write, see numpy.memmap
+
+    Returns
+    -------
+        FixedPointArray backed by the file. The samples are not range checked
+        if the format is narrower than dtype, see iter_chunks.
+    """
+    qformat = as_qformat(fmt)
+    dtype = np.dtype(storage_dtype(qformat.bits) if dtype is None else dtype)
+    if dtype.kind != 'i' or dtype.itemsize * 8 < qformat.bits:
+        raise ValueError(f'{dtype} can not hold samples of format {qformat}')
+    if byteorder not in ('<', '>', '='):
+        raise ValueError(f'Invalid byte order {byteorder} given.')
+    dtype = dtype.newbyteorder(byteorder)
+    stride = dtype.itemsize if stride is None else stride
+    if stride < dtype.itemsize:
+        raise ValueError(f'Stride {stride} is smaller than the sample size {dtype.itemsize}')
+    available = os.path.getsize(path) - offset
+    available = (available - dtype.itemsize) // stride + 1 if available >= dtype.itemsize else 0
+    if count is None:
+        count = available
+    elif count > available:
+        raise ValueError(f'File holds {available} samples, {count} requested')
+    if count == 0:
+        return FixedPointArray.from_raw(np.zeros(0, dtype=dtype), qformat)
+    length = (count - 1) * stride + dtype.itemsize
+    buffer = np.memmap(path, dtype=np.uint8, mode=mode,  # type: ignore[call-overload]
+                       offset=offset, shape=(length,))
+    raw = np.ndarray((count,), dtype=dtype, buffer=buffer, strides=(stride,))
+    return FixedPointArray.from_raw(raw, qformat, check=False)
+
+
+def iter_chunks(array: FixedPointArray, size: int = 1 << 20,
+                check: bool = True) -> Iterator[FixedPointArray]:
+    """Iterate over consecutive pieces of an array along the first axis
+
+    The pieces are views, for a mapped capture only the samples of the
+    current piece are read.
+
+    Parameters
+    ----------
+    array
+        FixedPointArray, e.g. from load_capture
+    size
+        Number of samples per piece, the last piece may be shorter
+    check
+        Raise ValueError if a sample of a piece does not fit into the format
+
+    Returns
+    -------
+        Iterator of FixedPointArray
+    """
+    # samples stored in a type of the format width always fit
+    dtype = array.raw.dtype
+    check = check and (dtype == object or dtype.itemsize * 8 > array.qformat.bits)
+    for start in range(0, len(array), size):
+        raw = array.raw[start:start + size]
+        if check:
+            _check_raw(raw, array.qformat)
+        yield FixedPointArray.from_raw(raw, array.qformat, check=False)
@@ -0,0 +1,131 @@
+"""Arithmetic context for fixed point operators
+
+The context decides the result format, rounding and overflow handling of
+the arithmetic operators of FixedPoint and FixedPointArray, similar to the
+decimal module. It is stored in a context variable, so it is local to the
+current thread and to the current asyncio task.
+
+    >>> from fixedpoint import FixedPoint, localcontext
+    >>> with localcontext(growth='keep', rounding='half_even', overflow='saturate'):
+    ...     FixedPoint(1.5, 'Q2.2') + FixedPoint(1.5, 'Q2.2')
+    FixedPoint(1.75, 'Q2.2')
+"""
+from __future__ import annotations
+import contextlib
+import contextvars
+from typing import Iterator
+from .format import QFormat, as_qformat
+from .requantize import OVERFLOW_MODES, ROUNDING_MODES
+
+
+class Context:
+    """Immutable arithmetic context
+
+    Attributes
+    ----------
+    growth
+        Result format of operators
+            grow: the format grows to hold the exact result, Q4.2 + Q4.2 -> Q5.2,
+                operations with numbers keep the format
+            keep: the format of the operand, the wider one for two fixed point operands
+            QFormat: all results have this format
+    rounding
+        Rounding mode for dropped fractional bits, see requantize
+    overflow
+        Overflow mode for results out of range, see requantize
+    """
+    __slots__ = ('growth', 'rounding', 'overflow', 'default')
+    growth: str | QFormat
+    rounding: str
+    overflow: str
+    default: bool
+
+    def __init__(self, growth: str | QFormat = 'grow', rounding: str = 'trunc',
+                 overflow: str = 'error'):
+        if growth not in ('grow', 'keep'):
+            growth = as_qformat(growth)
+        if rounding not in ROUNDING_MODES:
+            raise ValueError(f'Invalid rounding mode {rounding} given.')
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f'Invalid overflow mode {overflow} given.')
+        object.__setattr__(self, 'growth', growth)
+        object.__setattr__(self, 'rounding', rounding)
+        object.__setattr__(self, 'overflow', overflow)
+        # the built-in behaviour, operators take their fast paths
+        object.__setattr__(self, 'default',
+                           growth == 'grow' and rounding == 'trunc' and overflow == 'error')
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Context is immutable')
+
+    def __reduce__(self):
+        return Context, (self.growth, self.rounding, self.overflow)
+
+    def __repr__(self):
+        return (f'Context(growth={str(self.growth)!r}, rounding={self.rounding!r}, '
+                f'overflow={self.overflow!r})')
+
+    def replace(self, growth: str | QFormat | None = None, rounding: str | None = None,
+                overflow: str | None = None) -> Context:
+        """Return a copy with the given attributes changed"""
+        return Context(self.growth if growth is None else growth, rounding or self.rounding,
+                       overflow or self.overflow)
+
+    def result_format(self, grown: QFormat, operand: QFormat) -> QFormat:
+        """Format of an operator result
+
+        Parameters
+        ----------
+        grown
+            Format with growth
+        operand
+            Format of the operands
+
+        Returns
+        -------
+            QFormat according to the growth setting
+        """
+        if self.growth == 'grow':
+            return grown
+        if self.growth == 'keep':
+            return operand
+        return self.growth  # type: ignore[return-value]
+
+
+DEFAULT_CONTEXT = Context()
+
+_CONTEXT: contextvars.ContextVar[Context] = contextvars.ContextVar('fixedpoint_context',
+                                                                  default=DEFAULT_CONTEXT)
+
+
+def getcontext() -> Context:
+    """Return the current context"""
+    return _CONTEXT.get()
+
+
+def setcontext(ctx: Context):
+    """Set the current context"""
+    _CONTEXT.set(ctx)
+
+
+@contextlib.contextmanager
+def localcontext(ctx: Context | None = None, **kwargs) -> Iterator[Context]:
+    """Context manager setting a context for the enclosed block
+
+    Parameters
+    ----------
+    ctx
+        Context to use, default is the current context
+    kwargs
+        Attributes growth, rounding and overflow to change
+
+    Returns
+    -------
+        The active context
+    """
+    ctx = (ctx or getcontext()).replace(**kwargs)
+    token = _CONTEXT.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _CONTEXT.reset(token)
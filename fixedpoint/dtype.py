@@ -0,0 +1,81 @@
+"""NumPy dtype for fixed point values
+
+A qdtype is a plain integer dtype with the format attached as metadata.
+Arrays of this dtype hold the raw scaled integers, NumPy knows nothing
+about the scaling:
+
+- np.array([1.5], dtype=qdtype('Q6.4')) stores 1, not the scaled 24. Take
+  the integers from FixedPointArray.raw, np.array(fixed_point_array, dtype)
+  or qarray, which scale and range check the values.
+- Ufuncs on the bare arrays compute with the integers and ignore the
+  format rules. Wrap them with FixedPointArray for fixed point arithmetic.
+"""
+from __future__ import annotations
+import numpy as np
+from .format import QFormat, as_qformat
+
+
+_STORAGE = ((8, np.int8), (16, np.int16), (32, np.int32), (64, np.int64))
+
+
+def storage_dtype(bits: int) -> np.dtype:
+    """Smallest NumPy dtype holding two's complement integers of the given width
+
+    Parameters
+    ----------
+    bits
+        Number of bits including the sign bit
+
+    Returns
+    -------
+        int8, int16, int32 or int64, or object for Python integers if wider than 64 bits
+    """
+    for width, dtype in _STORAGE:
+        if bits <= width:
+            return np.dtype(dtype)
+    return np.dtype(object)
+
+
+def qdtype(fmt: str | QFormat) -> np.dtype:
+    """NumPy dtype for fixed point values with the given format
+
+    The dtype stores the scaled integer values using the smallest integer
+    type for the format width, the Qm.n format is attached as dtype metadata.
+    Numbers are cast to it without scaling, create arrays from
+    FixedPointArray or with qarray. NumPy ufuncs on arrays with this dtype
+    operate on the raw integers; wrap them with FixedPointArray to get fixed
+    point semantics.
+
+    Parameters
+    ----------
+    fmt
+        Format string in the form 'Qm.n', where
+            m is the number of integer bits
+            n is the number of fractional bits
+        or QFormat
+
+    Returns
+    -------
+        Integer dtype tagged with the format
+    """
+    qformat = as_qformat(fmt)
+    return np.dtype(storage_dtype(qformat.bits), metadata={'qformat': qformat.fmt})
+
+
+def fmt_from_dtype(dtype) -> str | None:
+    """Return format string of a dtype created by qdtype
+
+    Parameters
+    ----------
+    dtype
+        NumPy dtype
+
+    Returns
+    -------
+        Qm.n format string or None if the dtype is no fixed point dtype
+    """
+    if not isinstance(dtype, np.dtype):
+        return None
+    if dtype.metadata is None:
+        return None
+    return dtype.metadata.get('qformat')
@@ -0,0 +1,539 @@
+"""Bit-true elementary functions on fixed point values
+
+The functions work on FixedPoint and FixedPointArray values with integer
+arithmetic only, so the results match a hardware implementation of the
+same algorithm bit by bit:
+
+    sin, cos
+        Table lookup with linear interpolation, or CORDIC in rotation mode
+    atan2
+        CORDIC in vectoring mode
+    sqrt
+        Digit by digit square root, the result is truncated toward zero
+    reciprocal
+        Table lookup with linear interpolation on the normalized mantissa,
+        or Newton-Raphson iterations from a small seed table
+    divide
+        Exact quotient with a rounding mode, or multiplication by the
+        Newton-Raphson reciprocal
+
+Angles are given and returned in radians. Internally an angle is a phase
+of 32 bits per turn. The tables are generated once per function, format
+and size and kept in a bounded cache.
+
+    >>> from fixedpoint import FixedPoint, sin
+    >>> sin(FixedPoint(0.5, 'Q3.13'))
+    FixedPoint(0.4793701171875, 'Q2.13')
+"""
+from __future__ import annotations
+from functools import lru_cache
+import math
+from typing import Tuple
+import numpy as np
+from .array import FixedPointArray, _quotient, _widen
+from .fixedpoint import FixedPoint
+from .format import QFormat, as_qformat, quotient_format
+from .requantize import _overflow, _round
+
+METHODS = ('lut', 'cordic')
+RECIPROCAL_METHODS = ('lut', 'newton')
+DIVIDE_METHODS = ('exact', 'newton')
+
+# phase resolution, 2**32 units per turn
+_PHASE_BITS = 32
+# interpolation uses at most this many bits below the table index
+_FRAC_BITS = 16
+_HALF_TURN = 1 << (_PHASE_BITS - 1)
+# extra fractional bits of the CORDIC registers
+_GUARD = 4
+# fractional bits of the normalized mantissa and the reciprocal table
+_RECIP_BITS = 32
+# fractional bits of the Newton-Raphson registers if the products fit in int64
+_NEWTON_BITS = 30
+
+
+@lru_cache(maxsize=8)
+def _pi(bits: int) -> int:
+    """pi scaled by 2**bits and truncated, with Machin's formula"""
+    one = 1 << (bits + 16)
+
+    def arctan_inv(x: int) -> int:
+        total = term = one // x
+        k, sign = 3, -1
+        while term:
+            term //= x * x
+            total += sign * (term // k)
+            k, sign = k + 2, -sign
+        return total
+
+    return (4 * (4 * arctan_inv(5) - arctan_inv(239))) >> 16
+
+
+def _work_dtype(bits: int) -> np.dtype:
+    """int64 if intermediate values of the given width fit, otherwise object"""
+    return np.dtype(np.int64) if bits <= 62 else np.dtype(object)
+
+
+def _operand(x) -> Tuple[np.ndarray, QFormat]:
+    """Raw integers of a FixedPoint or FixedPointArray as one dimensional array"""
+    if isinstance(x, FixedPoint):
+        return np.array([x.value], dtype=_work_dtype(x.qformat.bits)), x.qformat
+    if isinstance(x, FixedPointArray):
+        return x.raw.ravel().astype(_work_dtype(x.qformat.bits)), x.qformat
+    raise TypeError(f'Expected FixedPoint or FixedPointArray, got {type(x).__name__}')
+
+
+def _shape(x) -> tuple:
+    return () if isinstance(x, FixedPoint) else x.shape
+
+
+def _result(x, raw: np.ndarray, qformat: QFormat) -> FixedPoint | FixedPointArray:
+    """Saturate to the format and wrap like the operand x"""
+    raw = np.clip(raw, qformat.min_raw, qformat.max_raw)
+    if isinstance(x, FixedPoint):
+        return FixedPoint.from_raw(int(raw[0]), qformat)
+    return FixedPointArray.from_raw(_widen(raw.reshape(x.shape), qformat.bits), qformat,
+                                    check=False)
+
+
+def _round_shift(x: np.ndarray, shift: int) -> np.ndarray:
+    """Shift right rounding half up, or left for a negative shift"""
+    if shift <= 0:
+        return x << -shift
+    return (x + (1 << (shift - 1))) >> shift
+
+
+def _phase(x) -> np.ndarray:
+    """Angle in radians as phase of 2**32 units per turn, int64 in [0, 2**32)
+
+    The phase is the integer part of raw * 2**32 / (2 * pi * 2**n), with
+    1 / (2 * pi) rounded to 64 - n bits. Only the low 64 bits of the product
+    matter, so the product is computed modulo 2**64.
+    """
+    raw, qformat = _operand(x)
+    n = qformat.n
+    if n > _PHASE_BITS:
+        raw = raw >> (n - _PHASE_BITS)
+        n = _PHASE_BITS
+    pi = _pi(96)
+    factor = ((1 << (160 - n)) + pi) // (2 * pi)
+    if raw.dtype == object:
+        raw = (raw & ((1 << 64) - 1)).astype(np.uint64)
+    else:
+        raw = raw.view(np.uint64)
+    return ((raw * np.uint64(factor)) >> np.uint64(64 - _PHASE_BITS)).astype(np.int64)
+
+
+def _check_args(method: str, table_bits: int, methods: tuple = METHODS):
+    if method not in methods:
+        raise ValueError(f'Invalid method {method} given.')
+    if not 1 <= table_bits <= 24:
+        raise ValueError(f'Table size of {table_bits} bits is not supported')
+
+
+@lru_cache(maxsize=64)
+def _sin_table(qformat: QFormat, table_bits: int) -> np.ndarray:
+    """sin over one turn in 2**table_bits steps plus the first entry repeated"""
+    size = 1 << table_bits
+    if qformat.n <= 52:
+        table = np.round(np.sin(np.arange(size + 1) * (2 * math.pi / size)) * qformat.scale)
+    else:
+        table = np.array([round(math.sin(2 * math.pi * i / size) * qformat.scale)
+                          for i in range(size + 1)], dtype=object)
+    table = np.clip(table.astype(_work_dtype(qformat.bits + _FRAC_BITS)),
+                    qformat.min_raw, qformat.max_raw)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=64)
+def _atan_table(iterations: int) -> Tuple[np.ndarray, float]:
+    """CORDIC angles atan(2**-i) as phase and the inverse of the CORDIC gain"""
+    angles = np.array([round(math.atan(2.0 ** -i) / (2 * math.pi) * (1 << _PHASE_BITS))
+                       for i in range(iterations)], dtype=np.int64)
+    angles.flags.writeable = False
+    gain = math.prod(1 / math.sqrt(1 + 2.0 ** (-2 * i)) for i in range(iterations))
+    return angles, gain
+
+
+@lru_cache(maxsize=64)
+def _reciprocal_table(table_bits: int) -> np.ndarray:
+    """1 / (1 + i / 2**table_bits) for i up to 2**table_bits, rounded to _RECIP_BITS bits"""
+    size = 1 << table_bits
+    num = 1 << (_RECIP_BITS + table_bits + 1)
+    den = 2 * (size + np.arange(size + 1, dtype=np.int64))
+    table = (num + den // 2) // den
+    table.flags.writeable = False
+    return table
+
+
+def _interpolate(table: np.ndarray, value: np.ndarray, bits: int,
+                 table_bits: int) -> np.ndarray:
+    """Linear interpolation in a table indexed by the top bits of value, rounding half up
+
+    The low bits of value below the index select the position between
+    table[index] and table[index + 1], only _FRAC_BITS of them are used.
+    """
+    frac_bits = min(_FRAC_BITS, bits - table_bits)
+    index = ((value >> (bits - table_bits)) & ((1 << table_bits) - 1)).astype(np.int64)
+    frac = (value >> (bits - table_bits - frac_bits)) & ((1 << frac_bits) - 1)
+    low = table[index]
+    step = (table[index + 1] - low) * frac.astype(table.dtype)
+    return low + ((step + (1 << (frac_bits - 1))) >> frac_bits)
+
+
+def _cordic(x: np.ndarray, y: np.ndarray, z: np.ndarray, angles: np.ndarray,
+            vectoring: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CORDIC iterations in place
+
+    Rotation mode turns (x, y) by the phase z, vectoring mode turns (x, y)
+    onto the x axis and accumulates the angle in z. The vector grows by the
+    CORDIC gain.
+    """
+    for i, angle in enumerate(angles.tolist()):
+        # 0 for a counterclockwise and -1 for a clockwise step, (v ^ s) - s negates v for -1
+        s = -(y >= 0).astype(np.int64) if vectoring else z >> 63
+        xs, ys = x >> i, y >> i
+        x -= (ys ^ s) - s
+        y += (xs ^ s) - s
+        z -= (angle ^ s) - s
+    return x, y, z
+
+
+def _sin_cordic(phase: np.ndarray, qformat: QFormat, iterations: int) -> np.ndarray:
+    """CORDIC rotation of the unit vector, pre-scaled by the inverse gain"""
+    angles, gain = _atan_table(iterations)
+    # signed phase, turned by half a turn into [-pi/2, pi/2] where CORDIC converges
+    z = np.where(phase >= _HALF_TURN, phase - 2 * _HALF_TURN, phase)
+    flip = np.abs(z) > _HALF_TURN // 2
+    z = np.where(flip, z - np.where(z > 0, _HALF_TURN, -_HALF_TURN), z)
+    work = qformat.n + _GUARD
+    dtype = _work_dtype(work + 3)
+    x = np.full(phase.shape, round(gain * (1 << work)), dtype=dtype)
+    _, y, _ = _cordic(x, np.zeros(phase.shape, dtype=dtype), z, angles, False)
+    return _round_shift(np.where(flip, -y, y), _GUARD)
+
+
+def _default_iterations(qformat: QFormat, iterations: int | None) -> int:
+    if iterations is None:
+        return min(qformat.n + _GUARD, _PHASE_BITS - 2)
+    return iterations
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def _sin(x, offset: int, out_fmt, method: str, table_bits: int,
+         iterations: int | None) -> FixedPoint | FixedPointArray:
+    """sin of x plus offset in phase units"""
+    _check_args(method, table_bits)
+    qformat = QFormat(2, x.qformat.n) if out_fmt is None else as_qformat(out_fmt)
+    phase = (_phase(x) + offset) & ((1 << _PHASE_BITS) - 1)
+    if method == 'lut':
+        result = _interpolate(_sin_table(qformat, table_bits), phase, _PHASE_BITS, table_bits)
+    else:
+        result = _sin_cordic(phase, qformat, _default_iterations(qformat, iterations))
+    return _result(x, result, qformat)
+
+
+def sin(x, out_fmt: str | QFormat | None = None, method: str = 'lut', *,
+        table_bits: int = 10, iterations: int | None = None) -> FixedPoint | FixedPointArray:
+    """Sine of an angle in radians
+
+    Parameters
+    ----------
+    x
+        FixedPoint or FixedPointArray
+    out_fmt
+        Format of the result, default is Q2.n with the fractional bits of x
+    method
+        'lut' for a table with 2**table_bits entries per turn and linear
+        interpolation, 'cordic' for CORDIC rotation
+    table_bits
+        Number of bits of the table index
+    iterations
+        Number of CORDIC iterations, default is the fractional bits of the
+        result plus guard bits
+
+    Returns
+    -------
+        FixedPoint or FixedPointArray like x, saturated to out_fmt
+    """
+    return _sin(x, 0, out_fmt, method, table_bits, iterations)
+
+
+def cos(x, out_fmt: str | QFormat | None = None, method: str = 'lut', *,
+        table_bits: int = 10, iterations: int | None = None) -> FixedPoint | FixedPointArray:
+    """Cosine of an angle in radians, see sin for the parameters"""
+    # cos is sin a quarter turn ahead
+    return _sin(x, 1 << (_PHASE_BITS - 2), out_fmt, method, table_bits, iterations)
+
+
+def atan2(y, x, out_fmt: str | QFormat | None = None, *,
+          iterations: int | None = None) -> FixedPoint | FixedPointArray:
+    """Angle of the vector (x, y) in radians with CORDIC vectoring
+
+    Parameters
+    ----------
+    y, x
+        FixedPoint or FixedPointArray of the same shape
+    out_fmt
+        Format of the result, default is Q3.n with the larger number of
+        fractional bits of x and y
+    iterations
+        Number of CORDIC iterations, default is the fractional bits of the
+        result plus guard bits
+
+    Returns
+    -------
+        Angle in [-pi, pi], FixedPoint or FixedPointArray like y
+    """
+    yraw, yfmt = _operand(y)
+    xraw, xfmt = _operand(x)
+    if _shape(y) != _shape(x):
+        raise ValueError(f'Shapes {_shape(y)} and {_shape(x)} do not match')
+    n = max(xfmt.n, yfmt.n)
+    qformat = QFormat(3, n) if out_fmt is None else as_qformat(out_fmt)
+    # align the fractional bits and add guard bits, CORDIC grows the vector by 1.65
+    dtype = _work_dtype(max(xfmt.m, yfmt.m) + n + _GUARD + 2)
+    vx = xraw.astype(dtype) << (n - xfmt.n + _GUARD)
+    vy = yraw.astype(dtype) << (n - yfmt.n + _GUARD)
+    # turn vectors in the left half plane by half a turn
+    left = vx < 0
+    z = np.where(left, np.where(vy >= 0, _HALF_TURN, -_HALF_TURN), 0).astype(np.int64)
+    _, _, z = _cordic(np.where(left, -vx, vx), np.where(left, -vy, vy), z,
+                      _atan_table(_default_iterations(qformat, iterations))[0], True)
+    # the angle of the zero vector is 0 like math.atan2
+    z = np.where((xraw == 0) & (yraw == 0), 0, z)
+    return _result(y, _radians(z, qformat), qformat)
+
+
+def _radians(phase: np.ndarray, qformat: QFormat) -> np.ndarray:
+    """Phase to radians in the format, rounding half up"""
+    # 2 * pi with 28 fractional bits keeps the product in int64
+    two_pi = (_pi(30) + 1) >> 1
+    shift = _PHASE_BITS + 28 - qformat.n
+    if shift < 1:
+        raise ValueError(f'Format {qformat} has more fractional bits than the phase')
+    return _round_shift(phase * two_pi, shift)
+
+
+def _bit_length(a: np.ndarray) -> np.ndarray:
+    """Number of bits of positive integers"""
+    if a.dtype == object:
+        return np.frompyfunc(int.bit_length, 1, 1)(a).astype(np.int64)
+    _, exp = np.frexp(a.astype(np.float64))
+    exp = exp.astype(np.int64)
+    # the conversion to float may round up to the next power of two
+    return exp - ((a >> (exp - 1)) == 0)
+
+
+def sqrt(x, out_fmt: str | QFormat | None = None) -> FixedPoint | FixedPointArray:
+    """Square root, truncated toward zero like a digit by digit implementation
+
+    Parameters
+    ----------
+    x
+        FixedPoint or FixedPointArray with non-negative values
+    out_fmt
+        Format of the result, default is Q(m//2+1).n which holds the root
+        of all values of Qm.n
+
+    Returns
+    -------
+        FixedPoint or FixedPointArray like x, saturated to out_fmt
+    """
+    raw, src = _operand(x)
+    if np.any(raw < 0):
+        raise ValueError('Square root of a negative value')
+    qformat = QFormat(src.m // 2 + 1, src.n) if out_fmt is None else as_qformat(out_fmt)
+    # root of raw * 2**(2 * out.n - n), truncating the operand does not change the result
+    shift = 2 * qformat.n - src.n
+    bits = src.bits + max(shift, 0)
+    if bits > 62:
+        raw = raw.astype(object)
+    raw = raw << shift if shift >= 0 else raw >> -shift
+    if raw.dtype == object:
+        return _result(x, np.frompyfunc(math.isqrt, 1, 1)(raw), qformat)
+    root = np.sqrt(raw.astype(np.float64)).astype(np.int64)
+    # the float estimate is at most one off
+    root -= root * root > raw
+    root += (root + 1) * (root + 1) <= raw
+    return _result(x, root, qformat)
+
+
+@lru_cache(maxsize=64)
+def _seed_table(table_bits: int, bits: int) -> np.ndarray:
+    """1 / m at the midpoints of 2**table_bits intervals of m in [1, 2), rounded to bits bits"""
+    size = 1 << table_bits
+    # 1 / (1 + (i + 0.5) / size) = 2 * size / (2 * size + 2 * i + 1)
+    table = np.array([((4 * size << bits) + den) // (2 * den)
+                      for den in range(2 * size + 1, 4 * size, 2)], dtype=_work_dtype(bits + 2))
+    table.flags.writeable = False
+    return table
+
+
+def _newton(mag: np.ndarray, qformat: QFormat, table_bits: int,
+            iterations: int | None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Reciprocal of the normalized mantissa with Newton-Raphson iterations
+
+    mag = m * 2**exp with m in [1, 2), m is truncated to the working
+    precision. The seed is read from a table of 2**table_bits entries, each
+    iteration y = y + y * (1 - m * y) doubles its correct bits. The default
+    number of iterations covers the bits of qformat.
+
+    Returns
+    -------
+    y
+        1/m with bits fractional bits, truncated
+    exp
+        Exponent of mag
+    bits
+        Working precision, _NEWTON_BITS or more for wide formats
+    """
+    bits = max(_NEWTON_BITS, qformat.bits + _GUARD)
+    if iterations is None:
+        iterations = max(math.ceil(math.log2((qformat.bits + _GUARD) / (table_bits + 1))), 0)
+    # y * (1 - m * y) has less than 2 * bits - table_bits bits
+    dtype = _work_dtype(2 * bits - table_bits)
+    one = 1 << (2 * bits)
+    if dtype == object:
+        mag = mag.astype(object)
+    else:
+        # m * y may wrap around in int64, the small difference to one is still exact
+        one = (one + (1 << 63)) % (1 << 64) - (1 << 63)
+    exp = _bit_length(mag) - 1
+    mant = ((mag << np.maximum(bits - exp, 0)) >> np.maximum(exp - bits, 0)).astype(dtype)
+    index = ((mant >> (bits - table_bits)) - (1 << table_bits)).astype(np.int64)
+    y = _seed_table(table_bits, bits).astype(dtype)[index]
+    for _ in range(iterations):
+        y += (y * ((one - mant * y) >> bits)) >> bits
+    return y, exp, bits
+
+
+def reciprocal(x, out_fmt: str | QFormat | None = None, method: str = 'lut', *,
+               table_bits: int | None = None,
+               iterations: int | None = None) -> FixedPoint | FixedPointArray:
+    """Reciprocal 1/x on the normalized mantissa
+
+    The magnitude of x is normalized to m * 2**p with m in [1, 2). 1/m is
+    computed with 32 or more fractional bits and shifted back by p,
+    rounding half up. The sign is applied to the result.
+
+    Parameters
+    ----------
+    x
+        FixedPoint or FixedPointArray with non-zero values
+    out_fmt
+        Format of the result, default is Q(n+2).(m+n) which holds the
+        reciprocal of all values of Qm.n
+    method
+        'lut' interpolates 1/m linearly in a table, 'newton' refines a seed
+        from a small table with Newton-Raphson iterations
+    table_bits
+        Number of bits of the table index, default is 10 for lut and 6 for
+        the seed table of newton
+    iterations
+        Number of Newton-Raphson iterations, default doubles the correct
+        bits of the seed until they cover the result format
+
+    Returns
+    -------
+        FixedPoint or FixedPointArray like x, saturated to out_fmt
+    """
+    if table_bits is None:
+        table_bits = 10 if method == 'lut' else 6
+    _check_args(method, table_bits, RECIPROCAL_METHODS)
+    raw, src = _operand(x)
+    if np.any(raw == 0):
+        raise ZeroDivisionError('Reciprocal of zero')
+    qformat = QFormat(src.n + 2, src.bits) if out_fmt is None else as_qformat(out_fmt)
+    if method == 'newton':
+        inv, exp, bits = _newton(np.abs(raw), qformat, table_bits, iterations)
+        result = _scale(inv, bits + exp - src.n - qformat.n, qformat, bits)
+        return _result(x, np.where(raw < 0, -result, result), qformat)
+    if qformat.bits > 60:
+        raw = raw.astype(object)
+    mag = np.abs(raw)
+    exp = _bit_length(mag) - 1
+    # mantissa with _RECIP_BITS fractional bits, truncated
+    mant = (mag << np.maximum(_RECIP_BITS - exp, 0)) >> np.maximum(exp - _RECIP_BITS, 0)
+    table = _reciprocal_table(table_bits)
+    inv = _interpolate(table.astype(mant.dtype), mant, _RECIP_BITS, table_bits)
+    # 1/x = 2**n / mag = inv * 2**(n - exp - _RECIP_BITS)
+    result = _scale(inv, _RECIP_BITS + exp - src.n - qformat.n, qformat)
+    return _result(x, np.where(raw < 0, -result, result), qformat)
+
+
+def _scale(inv: np.ndarray, shift: np.ndarray, qformat: QFormat,
+           bits: int = _RECIP_BITS) -> np.ndarray:
+    """Shift by elementwise amounts rounding half up, saturating to the format
+
+    inv has bits fractional bits and a value in (0.5, 1].
+    """
+    right = np.clip(shift, 0, bits + 8)
+    left = -np.minimum(shift, 0)
+    if inv.dtype == object:
+        return ((inv + ((1 << right) >> 1)) >> right) << left
+    # larger left shifts saturate in int64
+    limit = 62 - (bits + 2)
+    result = ((inv + ((1 << right) >> 1)) >> right) << np.minimum(left, limit)
+    return np.where(left > limit, qformat.max_raw, result)
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def divide(a, b, out_fmt: str | QFormat | None = None, rounding: str = 'trunc',
+           overflow: str = 'error', *, method: str = 'exact', iterations: int | None = None,
+           table_bits: int = 6) -> FixedPoint | FixedPointArray:
+    """Quotient a / b in a given format with explicit rounding and overflow
+
+    Parameters
+    ----------
+    a, b
+        FixedPoint or FixedPointArray, the shapes are broadcast
+    out_fmt
+        Format of the result, default is the format of the / operator,
+        see quotient_format
+    rounding
+        Rounding mode, see requantize
+    overflow
+        Overflow mode, see requantize
+    method
+        'exact' rounds the exact quotient of the scaled integers like the
+        / operator. 'newton' multiplies a with the reciprocal of b from
+        Newton-Raphson iterations and rounds the product, the error is
+        below two LSB of the result with the default iterations.
+    iterations
+        Number of Newton-Raphson iterations, default doubles the correct
+        bits of the seed until they cover the result format
+    table_bits
+        Number of bits of the seed table index of newton
+
+    Returns
+    -------
+        FixedPoint if a and b are FixedPoint, FixedPointArray otherwise
+    """
+    _check_args(method, table_bits, DIVIDE_METHODS)
+    araw, afmt = _operand(a)
+    braw, bfmt = _operand(b)
+    shape = np.broadcast_shapes(_shape(a), _shape(b))
+    araw = np.broadcast_to(araw.reshape(_shape(a)), shape).ravel()
+    braw = np.broadcast_to(braw.reshape(_shape(b)), shape).ravel()
+    if np.any(braw == 0):
+        raise ZeroDivisionError('Division by zero')
+    qformat = quotient_format(afmt, bfmt) if out_fmt is None else as_qformat(out_fmt)
+    if method == 'exact':
+        raw = _quotient(araw, afmt, (braw, bfmt), qformat.n, rounding)
+    else:
+        inv, exp, bits = _newton(np.abs(braw), qformat, table_bits, iterations)
+        # a / b = a * inv * 2**(b.n - a.n - bits - exp), scaled by 2**qformat.n
+        shift = bits + exp + afmt.n - bfmt.n - qformat.n
+        dtype = _work_dtype(max(afmt.bits + bits + 2 + max(1 - int(shift.min(initial=1)), 0),
+                                int(shift.max(initial=0)) + 1))
+        num = araw.astype(dtype) * np.where(braw < 0, -inv, inv).astype(dtype)
+        # round by a right shift of at least one bit
+        shift = shift.astype(dtype)
+        raw = _round(num << np.maximum(1 - shift, 0), np.maximum(shift, 1), rounding, None)
+    raw = _overflow(raw, qformat, overflow)
+    if isinstance(a, FixedPoint) and isinstance(b, FixedPoint):
+        return FixedPoint.from_raw(int(raw[0]), qformat)
+    return FixedPointArray.from_raw(_widen(raw.reshape(shape), qformat.bits), qformat,
+                                    check=False)
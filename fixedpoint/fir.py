@@ -0,0 +1,134 @@
+"""Bit-true streaming FIR filter
+
+
+"""
+from __future__ import annotations
+from math import ceil, log2
+import numpy as np
+from .array import FixedPointArray, _trunc_shift_scalar
+from .format import QFormat, as_qformat, product_format
+from .requantize import policy_modes, requantize
+
+
+class FIRFilter:  # pylint: disable=too-many-instance-attributes
+    """Streaming FIR filter on scaled integers
+
+    Each output is the sum over the taps of coefficient times delayed input.
+    Every product follows FixedPoint multiplication, Qa.b * Qc.d -> Q(a+c).max(b,d)
+    truncated toward zero, and is aligned to the fractional bits of the
+    accumulator, again truncating toward zero. The accumulator adds the
+    products exactly and wraps around like a two's complement register if
+    its format is narrower than the sum. The accumulator is finally
+    requantized to the output format.
+
+    The results are bit-exact with the same computation on FixedPoint values.
+    The delay line is carried over between calls of process, so a long
+    signal can be filtered in pieces.
+    """
+
+    def __init__(self, coeffs: FixedPointArray,  # pylint: disable=too-many-arguments
+                 input_fmt: str | QFormat, acc_fmt: str | QFormat | None = None,
+                 out_fmt: str | QFormat | None = None, *, policy: str = 'fit',
+                 rounding: str | None = None, overflow: str | None = None,
+                 chunk: int = 1 << 16):
+        """FIRFilter
+
+        Parameters
+        ----------
+        coeffs
+            Filter coefficients as FixedPointArray, coeffs[0] weights the newest sample
+        input_fmt
+            Qm.n format string or QFormat of the input samples
+        acc_fmt
+            Format of the accumulator, default is the full precision format
+            Q(m+ceil(log2(taps))).n of the products, which never overflows
+        out_fmt
+            Format of the output samples, default is acc_fmt
+        policy
+            Policy for the output requantization, see FixedPointArray.to
+        rounding
+            Rounding mode overriding the policy, see requantize
+        overflow
+            Overflow mode overriding the policy, see requantize
+        chunk
+            Number of samples processed at once, bounds the temporary memory
+        """
+        self.coeffs = coeffs
+        self.input_fmt = as_qformat(input_fmt)
+        self.taps = coeffs.size
+        if coeffs.ndim != 1 or self.taps == 0:
+            raise ValueError('Coefficients must be a non-empty one dimensional array')
+        self.product_fmt = product_format(coeffs.qformat, self.input_fmt)
+        growth = ceil(log2(self.taps)) if self.taps > 1 else 0
+        if acc_fmt is None:
+            acc_fmt = QFormat(self.product_fmt.m + growth, self.product_fmt.n)
+        self.acc_fmt = as_qformat(acc_fmt)
+        self.out_fmt = self.acc_fmt if out_fmt is None else as_qformat(out_fmt)
+        self.rounding, self.overflow = policy_modes(policy, rounding, overflow)
+        self.chunk = chunk
+        # exact sum of aligned products before the accumulator wraps
+        self._sum_fmt = QFormat(max(self.product_fmt.m + growth, self.acc_fmt.m), self.acc_fmt.n)
+        product_bits = coeffs.qformat.bits + self.input_fmt.bits
+        self._dtype: np.dtype = np.dtype(np.int64)
+        if max(product_bits, self._sum_fmt.bits) > 63:
+            self._dtype = np.dtype(object)
+        self._coeffs = [int(c) for c in coeffs.raw.tolist()]
+        self._state = np.zeros(self.taps - 1, dtype=self._dtype)
+
+    def reset(self):
+        """Clear the delay line"""
+        self._state = np.zeros(self.taps - 1, dtype=self._dtype)
+
+    @property
+    def state(self) -> FixedPointArray:
+        """The last taps-1 input samples, oldest first"""
+        return FixedPointArray.from_raw(self._state, self.input_fmt)
+
+    def process(self, x) -> FixedPointArray:
+        """Filter the next samples of the signal
+
+        Parameters
+        ----------
+        x
+            FixedPointArray or array-like of numerical values, converted to
+            the input format if needed
+
+        Returns
+        -------
+            FixedPointArray with one output sample per input sample
+        """
+        if not isinstance(x, FixedPointArray):
+            x = FixedPointArray(x, self.input_fmt)
+        elif x.qformat != self.input_fmt:
+            x = x.to(self.input_fmt)
+        raw = np.ravel(x.raw).astype(self._dtype)
+        out = [self._process_chunk(raw[i:i + self.chunk])
+               for i in range(0, raw.size, self.chunk)]
+        if out:
+            result = np.concatenate(out)
+        else:
+            result = np.zeros(0, dtype=self._dtype)
+        return FixedPointArray.from_raw(result, self.out_fmt)
+
+    def _process_chunk(self, raw: np.ndarray) -> np.ndarray:
+        """Filter one chunk of raw input samples and update the delay line"""
+        ext = np.concatenate((self._state, raw))
+        length = raw.size
+        prod_shift = self.coeffs.n + self.input_fmt.n - self.product_fmt.n
+        align_shift = self.product_fmt.n - self.acc_fmt.n
+        # two truncations toward zero in a row are one truncation by the combined shift
+        shift = prod_shift + max(align_shift, 0)
+        acc = np.zeros(length, dtype=self._dtype)
+        term = np.empty(length, dtype=self._dtype)
+        for k, c in enumerate(self._coeffs):
+            if c == 0:
+                continue
+            start = self.taps - 1 - k
+            np.multiply(ext[start:start + length], c, out=term)
+            acc += _trunc_shift_scalar(term, shift)
+        if align_shift < 0:
+            acc <<= -align_shift
+        if self.taps > 1:
+            self._state = ext[-(self.taps - 1):].copy()
+        acc = requantize(acc, self._sum_fmt, self.acc_fmt, overflow='wrap')
+        return requantize(acc, self.acc_fmt, self.out_fmt, self.rounding, self.overflow)
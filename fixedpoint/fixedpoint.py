@@ -3,18 +3,52 @@
 
 """
 from __future__ import annotations
+import sys
+from fractions import Fraction
+from functools import lru_cache
 from math import floor
-from .format import parse_fmt
+from numbers import Rational, Real
+from . import instrument
+from .format import QFormat, as_qformat, product_format, quotient_format, sum_format
+from .context import getcontext
+from .requantize import policy_modes, requantize_int, round_ratio
+
+# Python hashes numbers as rationals modulo the prime 2**k - 1
+_HASH_MODULUS = sys.hash_info.modulus
+_HASH_BITS = _HASH_MODULUS.bit_length()
+
+
+def _ratio(value) -> tuple[int, int]:
+    """Return numerator and positive denominator of a real number"""
+    if isinstance(value, int):
+        return value, 1
+    if isinstance(value, float):
+        return value.as_integer_ratio()
+    if isinstance(value, Real) and not isinstance(value, Rational):
+        # e.g. NumPy floats other than float64, Fraction does not take them
+        return float(value).as_integer_ratio()
+    return Fraction(value).as_integer_ratio()
+
+
+def _trunc_div(num: int, den: int) -> int:
+    """Integer division truncating toward zero"""
+    quot = num // den
+    if quot < 0 and quot * den != num:
+        quot += 1
+    return quot
 
 
 class FixedPoint:
     """Class to perform fixed point operations on single values
 
+    Instances are immutable and only hold the scaled integer value and a
+    reference to the shared QFormat.
     """
-    fmt: str
+    __slots__ = ('qformat', 'value')
+    qformat: QFormat
     value: int
 
-    def __init__(self, value: float, fmt: str):
+    def __init__(self, value: float, fmt: str | QFormat):
         """FixedPoint number
         The value is stored as integer scaled by the n fractional bits
 
@@ -26,15 +60,88 @@ class FixedPoint:
             Format string in the form 'Qm.n', where
                 m is the number of integer bits
                 n is the number of fractional bits
+            or QFormat
 
         Notes
         -----
             Q number format: https://en.wikipedia.org/wiki/Q_(number_format)
 
         """
-        self.fmt = fmt
-        self.m, self.n = parse_fmt(fmt)
-        self.value = self.to_fixedpoint(value)
+        object.__setattr__(self, 'qformat', as_qformat(fmt))
+        object.__setattr__(self, 'value', self.to_fixedpoint(value))
+
+    @classmethod
+    def from_raw(cls, value: int, fmt: str | QFormat) -> FixedPoint:
+        """Create FixedPoint from an integer already scaled by the n fractional bits
+
+        Parameters
+        ----------
+        value
+            Scaled integer value
+        fmt
+            Qm.n format string or QFormat
+
+        Returns
+        -------
+            FixedPoint class
+        """
+        qformat = as_qformat(fmt)
+        if not qformat.min_raw <= value <= qformat.max_raw:
+            raise ValueError(f'A raw value of {value} does not fit in the given format {qformat}')
+        return cls._new(int(value), qformat)
+
+    @classmethod
+    def _new(cls, value: int, qformat: QFormat) -> FixedPoint:
+        """Create FixedPoint from a scaled integer without range check"""
+        fp = cls.__new__(cls)
+        object.__setattr__(fp, 'qformat', qformat)
+        object.__setattr__(fp, 'value', value)
+        return fp
+
+    @classmethod
+    def intern(cls, value: float, fmt: str | QFormat) -> FixedPoint:
+        """Shared FixedPoint for recurring values like coefficients and constants
+
+        Equal values in the same format return the same instance from a
+        bounded cache, the value is converted only once. Instrumentation
+        counts the conversion on the first call only.
+
+        Parameters
+        ----------
+        value
+            Numerical value, must be hashable
+        fmt
+            Qm.n format string or QFormat
+
+        Returns
+        -------
+            FixedPoint class
+        """
+        return _interned(cls, value, as_qformat(fmt))  # type: ignore[arg-type]
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __reduce__(self):
+        return self.__class__.from_raw, (self.value, self.qformat)
+
+    @property
+    def fmt(self) -> str:
+        """Format string 'Qm.n'"""
+        return self.qformat.fmt
+
+    @property
+    def m(self) -> int:
+        """Number of integer bits"""
+        return self.qformat.m
+
+    @property
+    def n(self) -> int:
+        """Number of fractional bits"""
+        return self.qformat.n
 
     def to_fixedpoint(self, value: float, fmt: str | None = None) -> int:
         """Convert floating point value to and integer with given format
@@ -52,15 +159,64 @@ class FixedPoint:
         """
         if fmt is None:
             fmt = self.fmt
-        if not self.minval <= value <= self.maxval:
+        qformat = self.qformat
+        raw: int | None = None
+        if isinstance(value, float) and qformat.bits <= 53:
+            # range limits are exact floats, the scaling is exact
+            if qformat.minval <= value <= qformat.maxval:
+                raw = int(value * qformat.scale)
+        else:
+            try:
+                num, den = _ratio(value)
+            except (ValueError, OverflowError):
+                pass
+            else:
+                num <<= qformat.n
+                if qformat.min_raw * den <= num <= qformat.max_raw * den:
+                    raw = _trunc_div(num, den)
+        if instrument.ENABLED:
+            instrument.observe_conversion(value, raw, qformat)
+        if raw is None:
             raise ValueError(f'A value of {value} does not fit in the given format {fmt}')
-        numbits = self.m + self.n
-        if numbits > 32:
-            raise ValueError(f'Implementation only allows 32 Bits for now, '
-                             f'{numbits} Bits were requested.')
-        return int(value * 2 ** self.n)
-
-    def to(self, fmt: str, policy: str = 'exact') -> FixedPoint:
+        return raw
+
+    def _check(self, value: int, qformat: QFormat | None = None) -> FixedPoint:
+        """Return FixedPoint with the format of self, raise if value does not fit"""
+        if qformat is None:
+            qformat = self.qformat
+        if not qformat.min_raw <= value <= qformat.max_raw:
+            if instrument.ENABLED:
+                instrument.observe_requantize(value, value, qformat, qformat, 'error')
+            raise ValueError(f'A value of {value / qformat.scale} does not fit '
+                             f'in the given format {qformat}')
+        return self._new(value, qformat)
+
+    def _result(self, ctx, num: int, den: int, n: int, qformat: QFormat) -> FixedPoint:
+        """Round the exact result num / den, scaled by 2**n, to qformat with the context modes"""
+        shift = qformat.n - n
+        if shift >= 0:
+            num <<= shift
+        else:
+            den <<= -shift
+        value = round_ratio(num, den, ctx.rounding)
+        return self._new(requantize_int(value, qformat, qformat, overflow=ctx.overflow), qformat)
+
+    def _number(self, num: int, den: int) -> FixedPoint:
+        """Result of an operation with a number, num / den is the exact scaled value, den > 0"""
+        ctx = getcontext()
+        if ctx.default:
+            return self._check(_trunc_div(num, den))
+        return self._result(ctx, num, den, self.qformat.n,
+                            ctx.result_format(self.qformat, self.qformat))
+
+    def _pair(self, ctx, num: int, n: int, grown: QFormat, other: FixedPoint) -> FixedPoint:
+        """Result of an operation with a FixedPoint, num is the exact value scaled by 2**n"""
+        operand = QFormat(max(self.qformat.m, other.qformat.m),
+                          max(self.qformat.n, other.qformat.n))
+        return self._result(ctx, num, 1, n, ctx.result_format(grown, operand))
+
+    def to(self, fmt: str | QFormat, policy: str = 'exact', rounding: str | None = None,
+           overflow: str | None = None, *, rng=None) -> FixedPoint:
         """Coerce to new format according to policy
 
         Parameters
@@ -70,59 +226,52 @@ class FixedPoint:
         policy
             Rounding policy
                 exact: value must fit into new format without loss
-                round: fractional part is rounded to fit
-                fit: value is rounded to nearest value and saturates if larger than value range
+                round: fractional part is truncated to fit
+                fit: like round, but saturates if larger than value range
+        rounding
+            Rounding mode overriding the policy, see requantize
+        overflow
+            Overflow mode overriding the policy, see requantize
+        rng
+            NumPy random generator for stochastic rounding
 
         Returns
         -------
             FixedPoint class
 
         """
-        fp = self.__class__(0, fmt)
-        val = float(self)
-        if policy == 'fit':
-            if val > 0:
-                val = min(fp.maxval, val)
-            else:
-                val = max(fp.minval, val)
-            fp.value = fp.to_fixedpoint(val)
-        elif policy == 'round':
-            fp.value = fp.to_fixedpoint(val)
-        elif policy == 'exact':
-            fp.value = fp.to_fixedpoint(val)
-            if float(fp) != val and policy == 'exact':
-                raise ValueError(f'Rounding error not allowed with policy {policy} set.')
-        else:
-            raise ValueError(f'Invalid policy {policy} given.')
-        return fp
+        qformat = as_qformat(fmt)
+        rounding, overflow = policy_modes(policy, rounding, overflow)
+        value = requantize_int(self.value, self.qformat, qformat, rounding, overflow, rng=rng)
+        return self._new(value, qformat)
 
     @property
     def minval(self) -> float:
         """Minimum value for FixedPoint number"""
-        return -(2 ** (self.m - 1))
+        return self.qformat.minval
 
     @property
     def maxval(self) -> float:
         """Maximum value for FixedPoint number"""
-        return 2 ** (self.m - 1) - 2 ** (-self.n)
+        return self.qformat.maxval
 
     @property
     def resolution(self) -> float:
         """Resolution of FixedPoint number"""
-        return 2 ** (-self.n)
+        return self.qformat.resolution
 
     @property
     def integer(self) -> int:
         """Return integer part of value"""
-        return self.value >> self.n
+        return self.value >> self.qformat.n
 
     def __round__(self, n=None):
-        return self.__class__(round(float(self), n), self.fmt)
+        return self.__class__(round(Fraction(self.value, self.qformat.scale), n), self.qformat)
 
     @property
     def fract(self) -> float:
         """Return fractional part"""
-        return floor(self.value & (2 ** self.n - 1)) / 2 ** self.n
+        return floor(self.value & (2 ** self.qformat.n - 1)) / 2 ** self.qformat.n
 
     def __add__(self, other) -> FixedPoint:
         """Add two values
@@ -135,13 +284,17 @@ class FixedPoint:
             if type is FixedPoint, the number of int bits (m) -> (m+1)
         """
         if isinstance(other, FixedPoint):
-            m = max(self.m, other.m) + 1
-            n = max(self.n, other.n)
+            newfmt = sum_format(self.qformat, other.qformat)
+            n = newfmt.n
             newval = (self.value << (n - self.n)) + (other.value << (n - other.n))
-            newfmt = f'Q{m}.{n}'
-            return self.__class__(newval * 2 ** -n, newfmt)
-        newval = self.value * 2 ** -self.n + other
-        return self.__class__(newval, self.fmt)
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(newval, newfmt)
+            return self._pair(ctx, newval, n, newfmt, other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number(self.value * den + (num << self.qformat.n), den)
 
     def __sub__(self, other):
         """Subtract two values
@@ -155,29 +308,30 @@ class FixedPoint:
             if type is FixedPoint, the number of int bits (m) -> (m+1)
         """
         if isinstance(other, FixedPoint):
-            m = max(self.m, other.m) + 1
-            n = max(self.n, other.n)
+            newfmt = sum_format(self.qformat, other.qformat)
+            n = newfmt.n
             newval = (self.value << (n - self.n)) - (other.value << (n - other.n))
-            newfmt = f'Q{m}.{n}'
-            return self.__class__(newval * 2 ** -n, newfmt)
-        newval = self.value * 2 ** -self.n - other
-        return self.__class__(newval, self.fmt)
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(newval, newfmt)
+            return self._pair(ctx, newval, n, newfmt, other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number(self.value * den - (num << self.qformat.n), den)
 
     def __repr__(self):
         return f"FixedPoint({self.__float__()}, '{self.fmt}')"
 
     def __float__(self):
-        return self.value * 2 ** -self.n
+        return self.value / self.qformat.scale
 
     def __int__(self):
         return self.integer
 
-    def __divmod__(self, other):
-        return 0
-
     def __mul__(self, other):
         """Multiply two values
-         Multiplying two FixedPoint values means Q4.2 + Q4.2 -> Q8.2
+         Multiplying two FixedPoint values means Q4.2 * Q4.2 -> Q8.2
 
          Parameters
          ----------
@@ -185,85 +339,185 @@ class FixedPoint:
              other value to multiply
              if type is FixedPoint, the number of int bits (m) -> (m+m_other)
          """
-        newval = float(self) * float(other)
         if isinstance(other, FixedPoint):
-            m = self.m + other.m
-            n = max(self.n, self.n)
-            newfmt = f'Q{m}.{n}'
-            return self.__class__(newval, newfmt)
-        return self.__class__(newval, self.fmt)
+            newfmt = product_format(self.qformat, other.qformat)
+            n = self.qformat.n + other.qformat.n
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(_trunc_div(self.value * other.value, 1 << (n - newfmt.n)), newfmt)
+            return self._pair(ctx, self.value * other.value, n, newfmt, other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number(self.value * num, den)
 
     def __rmul__(self, other):
         return self.__mul__(other)
 
     def __floor__(self):
-        return self.value >> self.n
-
-    def __floordiv__(self, other):
-        return 0
+        return self.value >> self.qformat.n
 
-    def __div__(self, other):
+    def __truediv__(self, other) -> FixedPoint:
         """Divide two values
-         **TODO** Multiplying two FixedPoint values means Q4.2 + Q4.2 -> Q8.2
+        Dividing two FixedPoint values means Q4.2 / Q4.2 -> Q6.6, see quotient_format
 
-         Parameters
-         ----------
-         other
-             other value to multiply
-             **TODO**if type is FixedPoint, the number of int bits (m) -> (m+m_other)
-         """
-        newval = float(self) / float(other)
+        The exact quotient of the scaled integers is truncated toward zero,
+        other contexts round it with their modes.
+
+        Parameters
+        ----------
+        other
+            divisor, FixedPoint or number
+            if type is FixedPoint, (m, n) -> (m+n_other, n+m_other)
+        """
+        if isinstance(other, FixedPoint):
+            newfmt = quotient_format(self.qformat, other.qformat)
+            num = self.value << other.qformat.n
+            den = other.value << self.qformat.n
+            if den < 0:
+                num, den = -num, -den
+            ctx = getcontext()
+            if ctx.default:
+                return self._check(_trunc_div(num << newfmt.n, den), newfmt)
+            operand = QFormat(max(self.m, other.m), max(self.n, other.n))
+            return self._result(ctx, num, den, 0, ctx.result_format(newfmt, operand))
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        if num < 0:
+            num, den = -num, -den
+        return self._number(self.value * den, num)
+
+    def __rtruediv__(self, other):
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        num <<= 2 * self.qformat.n
+        den *= self.value
+        if den < 0:
+            num, den = -num, -den
+        return self._number(num, den)
+
+    def __floordiv__(self, other) -> FixedPoint:
+        """Divide two values and round the quotient toward minus infinity
+
+        The result has the format of the true division, the remainder is
+        returned by the % operator, a == b * (a // b) + a % b.
+        """
         if isinstance(other, FixedPoint):
-            m = self.m + other.n
-            n = max(self.n, self.m)
-            newfmt = f'Q{m}.{n}'
-            return self.__class__(newval, newfmt)
-        return self.__class__(newval, self.fmt)
+            a, b = self._align(other)
+            newfmt = quotient_format(self.qformat, other.qformat)
+            ctx = getcontext()
+            if ctx.default:
+                return self._check((a // b) << newfmt.n, newfmt)
+            return self._pair(ctx, a // b, 0, newfmt, other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number((self.value * den // (num << self.qformat.n)) << self.qformat.n, 1)
+
+    def __mod__(self, other) -> FixedPoint:
+        """Remainder of the floor division with the sign of the divisor
+
+        With a FixedPoint divisor the remainder is exact in the integer bits
+        of the divisor and the larger number of fractional bits.
+        """
+        if isinstance(other, FixedPoint):
+            a, b = self._align(other)
+            n = max(self.qformat.n, other.qformat.n)
+            newfmt = QFormat(other.qformat.m, n)
+            ctx = getcontext()
+            if ctx.default:
+                return self._new(a % b, newfmt)
+            return self._pair(ctx, a % b, n, newfmt, other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number(self.value * den % (num << self.qformat.n), den)
 
-    def __rdiv__(self, other):
-        return self.__div__(other)
+    def __divmod__(self, other):
+        return self // other, self % other
 
-    def __truediv__(self, other):
-        return self.__div__(other)
+    def __rfloordiv__(self, other):
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number(((num << self.qformat.n) // (den * self.value)) << self.qformat.n, 1)
 
     def __rmod__(self, other):
-        return 0
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number((num << self.qformat.n) % (den * self.value), den)
+
+    def __rdivmod__(self, other):
+        return other // self, other % self
+
+    def _align(self, other: FixedPoint) -> tuple[int, int]:
+        """Return both scaled integers with the larger number of fractional bits"""
+        n = max(self.qformat.n, other.qformat.n)
+        return self.value << (n - self.qformat.n), other.value << (n - other.qformat.n)
+
+    def _compare(self, other) -> tuple[int, int | float]:
+        """Return both operands as integers with a common scaling"""
+        if isinstance(other, FixedPoint):
+            return self._align(other)
+        try:
+            num, den = _ratio(other)
+        except (ValueError, OverflowError):
+            # nan and inf compare the same with any finite value
+            return 0, other
+        return self.value * den, num << self.qformat.n
 
     def __eq__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value == other.value
-        return float(self) == float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a == b
+
+    def __hash__(self) -> int:
+        # same hash as int, float and Fraction of the value: dividing by 2**n
+        # modulo 2**k - 1 is a multiplication by 2**(-n mod k)
+        h = ((abs(self.value) % _HASH_MODULUS) << (-self.qformat.n % _HASH_BITS)) % _HASH_MODULUS
+        if self.value < 0:
+            h = -h
+        return -2 if h == -1 else h
 
     def __ne__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value != other.value
-        return float(self) != float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a != b
 
     def __gt__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value > other.value
-        return float(self) > float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a > b
 
     def __ge__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value >= other.value
-        return float(self) >= float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a >= b
 
     def __le__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value <= other.value
-        return float(self) <= float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a <= b
 
     def __lt__(self, other):
-        if isinstance(other, FixedPoint) and self.fmt == other.fmt:
-            return self.value < other.value
-        return float(self) < float(other)
+        if not isinstance(other, (FixedPoint, Real)):
+            return NotImplemented
+        a, b = self._compare(other)
+        return a < b
 
     def __neg__(self):
-        return self.__class__(self.to_fixedpoint(-float(self.value)), self.fmt)
+        return self._number(-self.value, 1)
 
     def __pos__(self):
-        return self.__class__(self.to_fixedpoint(abs(float(self.value))), self.fmt)
+        return self._new(self.value, self.qformat)
 
     def __pow__(self, power: int) -> FixedPoint:
         """Calculate power of FixedPoint value
@@ -274,38 +528,34 @@ class FixedPoint:
             power to take
             number of int bits increase (m) -> (m*power)
          """
-        newval = float(self) ** power
-        m = self.m * power
-        n = self.n
-        newfmt = f'Q{m}.{n}'
-        return self.__class__(newval, newfmt)
+        if not isinstance(power, int) or power < 1:
+            raise ValueError(f'Only positive integer powers are supported, got {power}')
+        newval = _trunc_div(self.value ** power, 1 << (self.qformat.n * (power - 1)))
+        return self._new(newval, QFormat(self.qformat.m * power, self.qformat.n))
 
     def __abs__(self):
-        return self.__class__(self.to_fixedpoint(abs(float(self.value))), self.fmt)
-
-    def __mod__(self, other):
-        return 0
+        return self._number(abs(self.value), 1)
 
     def __radd__(self, other):
         return self.__add__(other)
 
     def __rsub__(self, other):
-        return self.__sub__(other)
-
-    def __rtruediv__(self, other):
-        return self.__div__(other)
-
-    def __rfloordiv__(self, other):
-        return self.__floordiv__(other)
+        if not isinstance(other, Real):
+            return NotImplemented
+        num, den = _ratio(other)
+        return self._number((num << self.qformat.n) - self.value * den, den)
 
     def __rpow__(self, other):
         return self.__pow__(other)
 
-    def __rdivmod__(self, other):
-        return self.__divmod__(other)
-
     def __lshift__(self, other):
-        return self.__class__(self.value << other, self.fmt)
+        return self._number(self.value << other, 1)
 
     def __rshift__(self, other):
-        return self.__class__(self.value >> other, self.fmt)
+        return self._new(self.value >> other, self.qformat)
+
+
+@lru_cache(maxsize=4096)
+def _interned(cls: type[FixedPoint], value: float, qformat: QFormat) -> FixedPoint:
+    """Create FixedPoint, the cache works as bounded intern table"""
+    return cls(value, qformat)
@@ -2,6 +2,7 @@
 Fixed-point format parsing
 """
 from __future__ import annotations
+from functools import lru_cache
 from typing import Tuple
 
 
@@ -34,3 +35,133 @@ def parse_fmt(fmt: str) -> Tuple[int, int]:
         raise ValueError(f'Invalid format specification {fmt}') from exc
 
     return m, n
+
+
+class QFormat:
+    """Immutable fixed point format with precomputed limits
+
+    Instances are interned, QFormat(m, n) returns a shared object for
+    recently used formats. Use as_qformat to convert format strings.
+
+    Attributes
+    ----------
+    m
+        Number of integer bits, including the sign bit
+    n
+        Number of fractional bits
+    bits
+        Total number of bits m + n
+    scale
+        Scaling factor 2**n between value and raw integer
+    min_raw, max_raw
+        Range of the raw integer values
+    minval, maxval
+        Range of the values
+    resolution
+        Value of the least significant bit
+    fmt
+        Format string 'Qm.n'
+    """
+    __slots__ = ('m', 'n', 'bits', 'scale', 'min_raw', 'max_raw',
+                 'minval', 'maxval', 'resolution', 'fmt')
+    m: int
+    n: int
+    bits: int
+    scale: int
+    min_raw: int
+    max_raw: int
+    minval: float
+    maxval: float
+    resolution: float
+    fmt: str
+
+    def __new__(cls, m: int, n: int) -> QFormat:
+        return _intern(m, n)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('QFormat is immutable')
+
+    def __reduce__(self):
+        return QFormat, (self.m, self.n)
+
+    def __eq__(self, other):
+        if isinstance(other, QFormat):
+            return self.m == other.m and self.n == other.n
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.m, self.n))
+
+    def __str__(self):
+        return self.fmt
+
+    def __repr__(self):
+        return f"QFormat({self.m}, {self.n})"
+
+
+@lru_cache(maxsize=1024)
+def _intern(m: int, n: int) -> QFormat:
+    """Create QFormat, the cache works as bounded intern table"""
+    bits = m + n
+    if bits < 1:
+        raise ValueError(f'Invalid format specification Q{m}.{n}')
+    qfmt = object.__new__(QFormat)
+    values = {
+        'm': m,
+        'n': n,
+        'bits': bits,
+        'scale': 2 ** n,
+        'min_raw': -(1 << (bits - 1)),
+        'max_raw': (1 << (bits - 1)) - 1,
+        'minval': -(2 ** (m - 1)),
+        'maxval': 2 ** (m - 1) - 2 ** (-n),
+        'resolution': 2 ** (-n),
+        'fmt': f'Q{m}.{n}',
+    }
+    for name, value in values.items():
+        object.__setattr__(qfmt, name, value)
+    return qfmt
+
+
+@lru_cache(maxsize=1024)
+def _parse(fmt: str) -> QFormat:
+    m, n = parse_fmt(fmt)
+    return QFormat(m, n)
+
+
+def as_qformat(fmt: str | QFormat) -> QFormat:
+    """Return QFormat for a format string or QFormat
+
+    Parameters
+    ----------
+    fmt
+        Format string in the form 'Qm.n' or QFormat
+
+    Returns
+    -------
+        Interned QFormat
+    """
+    if isinstance(fmt, QFormat):
+        return fmt
+    return _parse(fmt)
+
+
+def sum_format(a: QFormat, b: QFormat) -> QFormat:
+    """Format of a sum or difference, Q4.2 + Q4.2 -> Q5.2"""
+    return QFormat(max(a.m, b.m) + 1, max(a.n, b.n))
+
+
+def product_format(a: QFormat, b: QFormat) -> QFormat:
+    """Format of a product, Q4.2 * Q4.2 -> Q8.2"""
+    return QFormat(a.m + b.m, max(a.n, b.n))
+
+
+def quotient_format(a: QFormat, b: QFormat) -> QFormat:
+    """Format of a quotient, Q4.2 / Q4.2 -> Q6.6
+
+    The integer bits hold the largest magnitude divided by the smallest
+    step of b, the fractional bits the smallest step divided by the largest
+    magnitude of b. Only the most negative value divided by minus one step
+    does not fit.
+    """
+    return QFormat(a.m + b.n, a.n + b.m)
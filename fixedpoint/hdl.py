@@ -0,0 +1,481 @@
+"""Test vectors for HDL simulators
+
+write_vectors stores arrays as fixed width two's complement text with the
+width of their Qm.n format, hex or binary digits per value and one vector
+per line. The readmem layout separates the columns with spaces and is read
+by $readmemh and $readmemb of Verilog or by textio in VHDL, the csv layout
+separates them with commas. The text is built in blocks of lines with
+NumPy, without formatting every value in Python:
+
+    >>> from fixedpoint import FixedPointArray, write_vectors
+    >>> x = FixedPointArray([0.5, -1.0, -0.125], 'Q2.6')
+    >>> write_vectors('stimulus.hex', x)
+    3
+    >>> open('stimulus.hex').read()
+    '20\\nc0\\nf8\\n'
+
+iter_vectors parses simulator output the same way in blocks and sign
+extends the values from the width of the format. Comparator checks them
+against the golden model on the scaled integers, with constant memory:
+
+    >>> from fixedpoint import compare_vectors
+    >>> result = compare_vectors('response.hex', expected)
+    >>> result.mismatches, result.first
+    (0, None)
+"""
+from __future__ import annotations
+import io
+import itertools
+import math
+import operator
+import os
+from typing import BinaryIO, Iterable, Iterator, List, Sequence, TextIO, Tuple
+import numpy as np
+from .array import FixedPointArray, _exact, _widen
+from .dtype import storage_dtype
+from .format import QFormat, as_qformat
+
+RADIXES = {'hex': 4, 'bin': 1}
+LAYOUTS = {'readmem': b' ', 'csv': b','}
+
+_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_MASK64 = (1 << 64) - 1
+
+# character codes of the parser, digit values, separators and anything else
+_SEPARATOR = 254
+_INVALID = 255
+
+
+def _table(digits: bytes) -> np.ndarray:
+    """Values of the characters of a radix"""
+    table = np.full(256, _INVALID, dtype=np.uint8)
+    for value, digit in enumerate(digits):
+        table[digit] = table[ord(chr(digit).upper())] = value
+    for separator in b' \t\r\n,':
+        table[separator] = _SEPARATOR
+    return table
+
+
+_TABLES = {'hex': _table(b'0123456789abcdef'), 'bin': _table(b'01')}
+
+
+def _digits(raw: np.ndarray, bits: int, step: int) -> np.ndarray:
+    """ASCII digits of the low bits of scaled integers, one row per value
+
+    step is the number of bits per digit, 4 for hex and 1 for binary.
+    """
+    if raw.dtype == object:
+        if bits > 64:
+            # 64 bits are a whole number of digits, the limbs are formatted separately
+            return np.hstack((_digits(raw >> 64, bits - 64, step),
+                              _digits(raw & _MASK64, 64, step)))
+        raw = (raw & ((1 << bits) - 1)).astype(np.uint64)
+    else:
+        raw = raw.astype(np.int64).view(np.uint64)
+        if bits < 64:
+            raw = raw & np.uint64((1 << bits) - 1)
+    count = -(-bits // step)
+    shifts = np.arange(count - 1, -1, -1, dtype=np.uint64) * np.uint64(step)
+    return _DIGITS[(raw[:, None] >> shifts) & np.uint64((1 << step) - 1)]
+
+
+def _columns(arrays: tuple) -> List[Tuple[np.ndarray, QFormat]]:
+    """Scaled integers and format of each column, 2-D arrays give one column per row element"""
+    columns: List[Tuple[np.ndarray, QFormat]] = []
+    for array in arrays:
+        if not isinstance(array, FixedPointArray):
+            raise TypeError(f'Expected FixedPointArray, got {type(array).__name__}')
+        if array.ndim not in (1, 2):
+            raise ValueError(f'Expected 1-D or 2-D arrays, got {array.ndim} dimensions')
+        raw = array.raw.reshape(len(array), -1)
+        columns.extend((raw[:, i], array.qformat) for i in range(raw.shape[1]))
+    if len({len(raw) for raw, _ in columns}) > 1:
+        raise ValueError('All arrays must have the same length')
+    return columns
+
+
+def _lines(columns: List[Tuple[np.ndarray, QFormat]], step: int, separator: bytes,
+           start: int, stop: int) -> bytes:
+    """Text of the vectors start to stop"""
+    widths = [-(-qformat.bits // step) for _, qformat in columns]
+    lines = np.empty((stop - start, sum(widths) + len(widths)), dtype=np.uint8)
+    pos = 0
+    for (raw, qformat), width in zip(columns, widths):
+        lines[:, pos:pos + width] = _digits(raw[start:stop], qformat.bits, step)
+        lines[:, pos + width] = ord(separator)
+        pos += width + 1
+    lines[:, -1] = ord('\n')
+    return lines.tobytes()
+
+
+def _write(f, blocks: Iterable[bytes]):
+    """Write blocks of ASCII text to an open binary or text file"""
+    text = isinstance(f, io.TextIOBase)
+    for block in blocks:
+        f.write(block.decode('ascii') if text else block)
+
+
+def _read(f, size: int) -> Iterator[bytes]:
+    """Blocks of whole lines of about size bytes read from an open binary or text file"""
+    rest = b''
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        data = rest + (data.encode('ascii') if isinstance(data, str) else data)
+        end = data.rfind(b'\n') + 1
+        rest = data[end:]
+        if end:
+            yield data[:end]
+    if rest:
+        yield rest + b'\n'
+
+
+def _uncomment(block: bytes) -> bytes:
+    """Block with the // comments removed, keeping the lines"""
+    return b'\n'.join(line.split(b'//', 1)[0] for line in block.split(b'\n'))
+
+
+def _tokens(block: bytes, table: np.ndarray, columns: int, line: int):
+    """Digit values, start and length of the tokens of a block of lines
+
+    line is the number of the first line of the block for error messages.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    values = table[buf]
+    invalid = np.flatnonzero(values == _INVALID)
+    if invalid.size:
+        line += block.count(b'\n', 0, invalid[0])
+        raise ValueError(f'Invalid digit {chr(buf[invalid[0]])!r} in line {line}')
+    digit = values != _SEPARATOR
+    edges = np.diff(np.concatenate(([False], digit, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+    # tokens per line, empty lines are skipped
+    lines = np.cumsum(buf == ord('\n'))[starts]
+    counts = np.bincount(lines)
+    wrong = np.flatnonzero((counts != 0) & (counts != columns))
+    if wrong.size:
+        raise ValueError(f'Expected {columns} values in line {line + wrong[0]}, '
+                         f'got {counts[wrong[0]]}')
+    return values, starts, lengths
+
+
+def _parse(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray, qformat: QFormat,
+           step: int) -> np.ndarray:
+    """Sign extended scaled integers of tokens of digits with step bits each"""
+    bits = qformat.bits
+    if lengths.size and lengths.max() > -(-bits // step):
+        raise ValueError(f'Values with more than {bits} bits for the format {qformat}')
+    if bits > 64:
+        raw = np.zeros(starts.size, dtype=object)
+        step_: int | np.uint64 = step
+    else:
+        raw = np.zeros(starts.size, dtype=np.uint64)
+        step_ = np.uint64(step)
+    last = max(values.size - 1, 0)
+    for k in range(int(lengths.max(initial=0))):
+        digit = values[np.minimum(starts + k, last)].astype(raw.dtype)
+        raw = np.where(k < lengths, (raw << step_) | digit, raw)
+    if bits > 64:
+        if np.any(raw >> bits):
+            raise ValueError(f'Values with more than {bits} bits for the format {qformat}')
+        sign = 1 << (bits - 1)
+        return (raw ^ sign) - sign
+    if bits < 64 and np.any(raw >> np.uint64(bits)):
+        raise ValueError(f'Values with more than {bits} bits for the format {qformat}')
+    raw = raw.view(np.int64)
+    if bits < 64:
+        raw <<= 64 - bits
+        raw >>= 64 - bits
+    return _widen(raw, bits)
+
+
+def iter_vectors(file: str | os.PathLike | BinaryIO | TextIO, *formats: str | QFormat,
+                 radix: str = 'hex', header: bool = False,
+                 chunk: int = 1 << 22) -> Iterator:
+    """Parse test vectors in blocks, e.g. a simulator output dump
+
+    Values are fixed width two's complement hex or binary text, leading
+    zeros may be omitted. The columns of a line are separated by spaces,
+    tabs or commas, so both layouts of write_vectors are read. Empty lines
+    and // comments are skipped, unknown X or Z digits raise ValueError.
+
+    Parameters
+    ----------
+    file
+        File name or open file, binary or text
+    formats
+        Qm.n format string or QFormat per column, the values are sign
+        extended from its m+n bits
+    radix
+        'hex' or 'bin'
+    header
+        Skip the first line, e.g. the column names of a csv file
+    chunk
+        Number of bytes read and parsed at once
+
+    Returns
+    -------
+        Iterator of FixedPointArray per block, or tuples of FixedPointArray
+        per column if there are several formats
+    """
+    if radix not in RADIXES:
+        raise ValueError(f'Invalid radix {radix} given.')
+    if not formats:
+        raise ValueError('No fixed point format given')
+    qformats = [as_qformat(fmt) for fmt in formats]
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            yield from _iter_vectors(_read(f, chunk), qformats, radix, header)
+    else:
+        yield from _iter_vectors(_read(file, chunk), qformats, radix, header)
+
+
+def _iter_vectors(blocks: Iterator[bytes], qformats: List[QFormat], radix: str, header: bool):
+    """Arrays of the blocks of lines, see iter_vectors"""
+    line = 1
+    for block in blocks:
+        if header:
+            end = block.index(b'\n') + 1
+            block, header, line = block[end:], False, line + 1
+        if b'//' in block:
+            block = _uncomment(block)
+        values, starts, lengths = _tokens(block, _TABLES[radix], len(qformats), line)
+        line += block.count(b'\n')
+        arrays = tuple(FixedPointArray.from_raw(_parse(values, starts[i::len(qformats)],
+                                                       lengths[i::len(qformats)], qformat,
+                                                       RADIXES[radix]), qformat, check=False)
+                       for i, qformat in enumerate(qformats))
+        if arrays[0].size:
+            yield arrays[0] if len(arrays) == 1 else arrays
+
+
+def read_vectors(file: str | os.PathLike | BinaryIO | TextIO, *formats: str | QFormat,
+                 **kwargs):
+    """Parse a whole file of test vectors, see iter_vectors
+
+    Returns
+    -------
+        FixedPointArray, or tuple of FixedPointArray per column if there are
+        several formats
+    """
+    qformats = [as_qformat(fmt) for fmt in formats]
+    parts = list(iter_vectors(file, *qformats, **kwargs))
+    parts = [part if isinstance(part, tuple) else (part,) for part in parts]
+    arrays = tuple(FixedPointArray.from_raw(
+        np.concatenate([part[i].raw for part in parts]) if parts
+        else np.zeros(0, dtype=storage_dtype(qformat.bits)), qformat, check=False)
+                   for i, qformat in enumerate(qformats))
+    return arrays[0] if len(arrays) == 1 else arrays
+
+
+class Comparator:
+    """Streaming comparison of simulation results with a golden model
+
+    The errors are the exact differences of the scaled integers, in LSB of
+    the format with more fractional bits, so values of different formats
+    are compared without rounding. Pieces are compared as they arrive, the
+    memory does not grow with the number of vectors.
+
+    Attributes
+    ----------
+    count
+        Number of compared values
+    mismatches
+        Number of values with an error larger than the tolerance
+    first
+        Index of the first mismatch or None
+    max_error
+        Largest absolute error in LSB
+    """
+
+    def __init__(self, tolerance: int = 0, span: int = 16):
+        """Comparator
+
+        Parameters
+        ----------
+        tolerance
+            Largest absolute error in LSB that is no mismatch
+        span
+            The histogram counts the errors from -span to span LSB, larger
+            errors are counted in the first and last bin
+        """
+        self.tolerance = tolerance
+        self.count = 0
+        self.mismatches = 0
+        self.first: int | None = None
+        self.max_error = 0
+        self.qformat: QFormat | None = None
+        self._counts = np.zeros(2 * span + 3, dtype=np.int64)
+
+    def update(self, actual: FixedPointArray, expected: FixedPointArray) -> Comparator:
+        """Compare the next piece, e.g. a block of iter_vectors
+
+        Parameters
+        ----------
+        actual
+            Values of the simulation
+        expected
+            Values of the model with the same shape, any format
+
+        Returns
+        -------
+            The comparator itself
+        """
+        if not isinstance(actual, FixedPointArray) or not isinstance(expected, FixedPointArray):
+            raise TypeError('Expected FixedPointArray values')
+        if actual.shape != expected.shape:
+            raise ValueError(f'Shapes {actual.shape} and {expected.shape} differ')
+        error, qformat = _exact(operator.sub, actual.raw, actual.qformat,
+                                (expected.raw, expected.qformat))
+        if self.qformat is not None and qformat.n != self.qformat.n:
+            raise ValueError('The formats changed between pieces')
+        self.qformat = qformat
+        error = np.ravel(error)
+        magnitude = np.abs(error)
+        bad = np.flatnonzero(magnitude > self.tolerance)
+        if bad.size and self.first is None:
+            self.first = self.count + int(bad[0])
+        self.mismatches += bad.size
+        self.max_error = max(self.max_error, int(magnitude.max(initial=0)))
+        index = np.clip(error, -self.span - 1, self.span + 1) + (self.span + 1)
+        self._counts += np.bincount(index.astype(np.int64), minlength=self._counts.size)
+        self.count += error.size
+        return self
+
+    @property
+    def span(self) -> int:
+        """Largest absolute error with a bin of its own in the histogram"""
+        return (self._counts.size - 3) // 2
+
+    @property
+    def lsb(self) -> float:
+        """Value of one LSB of the errors"""
+        return self.qformat.resolution if self.qformat is not None else math.nan
+
+    def histogram(self):
+        """Number of values per error
+
+        Returns
+        -------
+        errors
+            Errors in LSB from -span-1 to span+1
+        counts
+            Number of values with this error, the first and last bin count
+            all errors below -span resp. above span
+        """
+        return np.arange(-self.span - 1, self.span + 2), self._counts.copy()
+
+    def report(self) -> str:
+        """Result and non-empty bins of the error histogram formatted as text"""
+        first = '-' if self.first is None else self.first
+        lines = [f'values {self.count}, mismatches {self.mismatches} '
+                 f'(tolerance {self.tolerance} LSB), first mismatch {first}',
+                 f'max error {self.max_error} LSB, LSB {self.lsb:.6g}',
+                 f"{'error':<10}{'count':>12}"]
+        for error, count in zip(*self.histogram()):
+            if count:
+                label = str(error)
+                if abs(error) > self.span:
+                    label = ('<' if error < 0 else '>') + str(error - np.sign(error))
+                lines.append(f'{label:<10}{count:>12}')
+        return '\n'.join(lines)
+
+
+def compare_vectors(file: str | os.PathLike | BinaryIO | TextIO, *expected: FixedPointArray,
+                    formats: Sequence[str | QFormat] | None = None, tolerance: int = 0,
+                    **kwargs):
+    """Compare a file of test vectors with the golden model block by block
+
+    Parameters
+    ----------
+    file
+        File name or open file, e.g. the output dump of a simulation
+    expected
+        FixedPointArray of the model per column, e.g. a mapped capture, see
+        load_capture
+    formats
+        Qm.n format string or QFormat per column of the file, default are
+        the formats of expected
+    tolerance
+        Largest absolute error in LSB that is no mismatch
+    kwargs
+        radix, header and chunk, see iter_vectors
+
+    Returns
+    -------
+        Comparator, or tuple of Comparator per column
+    """
+    comparators = tuple(Comparator(tolerance) for _ in expected)
+    length = len(expected[0]) if expected else 0
+    offset = 0
+    if formats is None:
+        formats = [array.qformat for array in expected]
+    for block in iter_vectors(file, *formats, **kwargs):
+        block = block if isinstance(block, tuple) else (block,)
+        stop = offset + len(block[0])
+        if stop > length:
+            raise ValueError(f'The file has more than the {length} expected vectors')
+        for comparator, actual, array in zip(comparators, block, expected):
+            comparator.update(actual, array[offset:stop])
+        offset = stop
+    if offset != length:
+        raise ValueError(f'The file has {offset} vectors, {length} expected')
+    return comparators[0] if len(comparators) == 1 else comparators
+
+
+def write_vectors(file: str | os.PathLike | BinaryIO | TextIO,
+                  *arrays: FixedPointArray, radix: str = 'hex', layout: str = 'readmem',
+                  names: Sequence[str] | None = None, chunk: int = 1 << 16) -> int:
+    """Write arrays as two's complement test vectors, one vector per line
+
+    Parameters
+    ----------
+    file
+        File name or open file, binary or text
+    arrays
+        FixedPointArray per column, all of the same length. A 2-D array
+        gives one column per element of its rows, e.g. interleaved channels.
+        Each value takes the m+n bits of its format, ceil((m+n)/4) hex
+        digits or m+n binary digits.
+    radix
+        'hex' for $readmemh or 'bin' for $readmemb
+    layout
+        'readmem' separates the columns with spaces, 'csv' with commas
+    names
+        Column names written as header line, a // comment with the formats
+        for readmem and the first row for csv
+    chunk
+        Number of lines formatted and written at once
+
+    Returns
+    -------
+        Number of vectors written
+    """
+    if radix not in RADIXES:
+        raise ValueError(f'Invalid radix {radix} given.')
+    if layout not in LAYOUTS:
+        raise ValueError(f'Invalid layout {layout} given.')
+    columns = _columns(arrays)
+    if not columns:
+        raise ValueError('No arrays given')
+    header = b''
+    if names is not None:
+        if len(names) != len(columns):
+            raise ValueError(f'{len(names)} names given for {len(columns)} columns')
+        if layout == 'csv':
+            header = ','.join(names).encode('ascii') + b'\n'
+        else:
+            formats = [f'{name}:{qformat}' for name, (_, qformat) in zip(names, columns)]
+            header = ('// ' + ' '.join(formats) + '\n').encode('ascii')
+    count = len(columns[0][0])
+    blocks = itertools.chain([header], (
+        _lines(columns, RADIXES[radix], LAYOUTS[layout], start, min(start + chunk, count))
+        for start in range(0, count, chunk)))
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'wb') as f:
+            _write(f, blocks)
+    else:
+        _write(file, blocks)
+    return count
@@ -0,0 +1,242 @@
+"""Opt-in counters for rounding, saturation and overflow events
+
+Instrumentation is disabled by default and costs a single flag check per
+requantization or conversion. When enabled, every requantization and
+float to fixed point conversion is recorded per target format, tag and,
+optionally, the calling line outside this package. Operator results that
+do not fit and raise in the default context are counted as overflowed:
+
+    >>> from fixedpoint import FixedPointArray, instrument
+    >>> instrument.enable()
+    >>> x = FixedPointArray([0.3, 1.7], 'Q2.8')
+    >>> with instrument.tag('stage1'):
+    ...     y = x.to('Q1.7', 'fit')
+    >>> print(instrument.report())
+"""
+from __future__ import annotations
+import contextlib
+import contextvars
+import csv
+import json
+import os
+import sys
+import threading
+from types import FrameType
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from .format import QFormat
+
+ENABLED = False
+
+_CALLSITE = False
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+_TAG: contextvars.ContextVar[str | None] = contextvars.ContextVar('fixedpoint_tag', default=None)
+
+FIELDS = ('fmt', 'tag', 'site', 'values', 'rounded', 'saturated', 'wrapped', 'overflowed',
+          'max_error', 'mean_error')
+
+
+class Counters:  # pylint: disable=too-few-public-methods
+    """Event counts and quantization error of one format, tag and call site
+
+    The error is the absolute difference between the value before and
+    after rounding, saturation and wrap around are only counted.
+    """
+    __slots__ = ('values', 'rounded', 'saturated', 'wrapped', 'overflowed', 'max_error',
+                 'sum_error')
+
+    def __init__(self):
+        self.values = 0
+        self.rounded = 0
+        self.saturated = 0
+        self.wrapped = 0
+        self.overflowed = 0
+        self.max_error = 0.0
+        self.sum_error = 0.0
+
+    @property
+    def mean_error(self) -> float:
+        """Mean absolute quantization error over all recorded values"""
+        return self.sum_error / self.values if self.values else 0.0
+
+
+_COUNTERS: Dict[Tuple[str, str | None, str | None], Counters] = {}
+# updates of the counters from worker threads, see ParallelExecutor
+_LOCK = threading.Lock()
+
+
+def enable(callsite: bool = False):
+    """Start recording events
+
+    Parameters
+    ----------
+    callsite
+        Also key the counters by the first file and line outside this
+        package, which is considerably slower
+    """
+    global ENABLED, _CALLSITE  # pylint: disable=global-statement
+    ENABLED = True
+    _CALLSITE = callsite
+
+
+def disable():
+    """Stop recording events, the counters are kept"""
+    global ENABLED  # pylint: disable=global-statement
+    ENABLED = False
+
+
+def reset():
+    """Clear all counters"""
+    with _LOCK:
+        _COUNTERS.clear()
+
+
+@contextlib.contextmanager
+def tag(name: str) -> Iterator[None]:
+    """Context manager recording events under the given tag"""
+    token = _TAG.set(name)
+    try:
+        yield
+    finally:
+        _TAG.reset(token)
+
+
+def _site() -> str | None:
+    """File and line of the innermost caller outside this package"""
+    if not _CALLSITE:
+        return None
+    frame: FrameType | None = sys._getframe()  # pylint: disable=protected-access
+    while frame is not None and os.path.dirname(frame.f_code.co_filename) == _PACKAGE:
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f'{frame.f_code.co_filename}:{frame.f_lineno}'
+
+
+def _counters(qformat: QFormat) -> Counters:
+    """Counters for the format, the current tag and call site"""
+    key = (qformat.fmt, _TAG.get(), _site())
+    counters = _COUNTERS.get(key)
+    if counters is None:
+        counters = _COUNTERS[key] = Counters()
+    return counters
+
+
+def _count(cond) -> int:
+    """Number of true elements of a comparison on an integer or array"""
+    return int(np.count_nonzero(cond))
+
+
+def observe_requantize(raw, rounded, src: QFormat, dst: QFormat, overflow: str):
+    """Record a requantization before overflow handling
+
+    Parameters
+    ----------
+    raw
+        Integer or array of integers in the source format
+    rounded
+        raw rounded to the fractional bits of dst
+    src
+        Source format
+    dst
+        Target format
+    overflow
+        Overflow mode, decides if values out of range count as saturated,
+        wrapped or overflowed
+    """
+    with _LOCK:
+        _observe_requantize(raw, rounded, src, dst, overflow)
+
+
+def _observe_requantize(raw, rounded, src: QFormat, dst: QFormat, overflow: str):
+    """Record a requantization, called with the lock held"""
+    counters = _counters(dst)
+    counters.values += int(np.size(raw))
+    shift = src.n - dst.n
+    if shift > 0:
+        # difference to the rounded value in units of the source resolution,
+        # the quotient is rounded up by at most one
+        error = (raw & ((1 << shift) - 1)) - ((rounded - (raw >> shift)) << shift)
+        if isinstance(error, np.ndarray) and error.size == 0:
+            error = np.zeros(1, dtype=np.int64)
+        counters.rounded += _count(error != 0)
+        error = np.abs(np.asarray(error).astype(np.float64)) / src.scale
+        counters.max_error = max(counters.max_error, float(error.max()))
+        counters.sum_error += float(error.sum())
+    out = _count((rounded < dst.min_raw) | (rounded > dst.max_raw))
+    if overflow == 'saturate':
+        counters.saturated += out
+    elif overflow == 'wrap':
+        counters.wrapped += out
+    else:
+        counters.overflowed += out
+
+
+def observe_conversion(values, raw, qformat: QFormat):
+    """Record a conversion of numbers to scaled integers
+
+    Parameters
+    ----------
+    values
+        Number or array of numbers
+    raw
+        Converted integers or None if the conversion failed as a value was out of range
+    qformat
+        Target format
+    """
+    with _LOCK:
+        _observe_conversion(values, raw, qformat)
+
+
+def _observe_conversion(values, raw, qformat: QFormat):
+    """Record a conversion, called with the lock held"""
+    counters = _counters(qformat)
+    values = np.asarray(values, dtype=np.float64)
+    counters.values += values.size
+    if raw is None:
+        out = (values < qformat.minval) | (values > qformat.maxval) | np.isnan(values)
+        counters.overflowed += _count(out)
+        return
+    error = np.abs(values - np.asarray(raw).astype(np.float64) / qformat.scale)
+    if error.size:
+        counters.rounded += _count(error != 0)
+        counters.max_error = max(counters.max_error, float(error.max()))
+        counters.sum_error += float(error.sum())
+
+
+def records() -> List[dict]:
+    """All counters as a list of dictionaries with the keys in FIELDS"""
+    result = []
+    with _LOCK:
+        items = sorted(_COUNTERS.items(), key=lambda x: str(x[0]))
+    for (fmt, name, site), counters in items:
+        result.append({
+            'fmt': fmt, 'tag': name, 'site': site, 'values': counters.values,
+            'rounded': counters.rounded, 'saturated': counters.saturated,
+            'wrapped': counters.wrapped, 'overflowed': counters.overflowed,
+            'max_error': counters.max_error, 'mean_error': counters.mean_error,
+        })
+    return result
+
+
+def report() -> str:
+    """Counters formatted as a text table"""
+    lines = [f"{'format':<10}{'tag':<14}{'values':>10}{'rounded':>10}{'saturated':>10}"
+             f"{'wrapped':>10}{'overflowed':>11}{'max error':>12}{'mean error':>12}  site"]
+    for rec in records():
+        lines.append(f"{rec['fmt']:<10}{str(rec['tag'] or ''):<14}{rec['values']:>10}"
+                     f"{rec['rounded']:>10}{rec['saturated']:>10}{rec['wrapped']:>10}"
+                     f"{rec['overflowed']:>11}{rec['max_error']:>12.4g}{rec['mean_error']:>12.4g}"
+                     f"  {rec['site'] or ''}")
+    return '\n'.join(lines)
+
+
+def export(path: str):
+    """Write the counters to a file, CSV if path ends with .csv, otherwise JSON"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records())
+        else:
+            json.dump(records(), f, indent=1)
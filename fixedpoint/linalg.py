@@ -0,0 +1,108 @@
+"""Dot product and multiply-accumulate on fixed point arrays
+
+
+"""
+from __future__ import annotations
+from math import ceil, log2
+import numpy as np
+from .array import FixedPointArray, _trunc_shift_scalar
+from .fixedpoint import FixedPoint
+from .format import QFormat
+
+_INT64_MAX = (1 << 63) - 1
+
+
+def _dot_raw(x: np.ndarray, y: np.ndarray, bits: int, shift: int) -> np.ndarray:
+    """Sum of truncated products over the last axis
+
+    Parameters
+    ----------
+    x, y
+        Scaled integers of equal shape
+    bits
+        Sum of the widths of both formats
+    shift
+        Number of fractional bits dropped from each product, truncating toward zero
+
+    Returns
+    -------
+        int64 array if the sum fits, otherwise object array of Python integers
+    """
+    length = x.shape[-1]
+    # largest magnitude of a truncated product, reached by the product of the minima
+    maxprod = (1 << (bits - 2)) >> shift
+    if bits - 2 > 62:
+        products = _trunc_shift_scalar(x.astype(object) * y.astype(object), shift)
+        return np.sum(products, axis=-1, dtype=object)
+    x = x.astype(np.int64)
+    y = y.astype(np.int64)
+    # sums of this many products can not overflow int64
+    block = max(_INT64_MAX // max(maxprod, 1), 1)
+    if block >= length:
+        return np.sum(_trunc_shift_scalar(x * y, shift), axis=-1)
+    total = np.zeros(x.shape[:-1], dtype=object)
+    for start in range(0, length, block):
+        part = _trunc_shift_scalar(x[..., start:start + block] * y[..., start:start + block], shift)
+        total = total + np.sum(part, axis=-1).astype(object)
+    return total
+
+
+def dot(a: FixedPointArray, b: FixedPointArray, axis: int = -1,
+        full_precision: bool = False) -> FixedPoint | FixedPointArray:
+    """Dot product along an axis with exact accumulation
+    The result of N products grows like a sum, Q4.2 . Q4.2 -> Q(8+ceil(log2(N))).2
+
+    Each product follows FixedPoint multiplication and the sum is exact, the
+    result equals summing a[i] * b[i] with FixedPoint values. The products
+    are accumulated in int64 blocks short enough to never overflow and
+    Python integers are only used for the block sums if the result needs
+    more than 63 bits.
+
+    Parameters
+    ----------
+    a, b
+        FixedPointArray operands of equal shape
+    axis
+        Axis along which to sum the products
+    full_precision
+        Keep all fractional bits of the products, Q4.2 . Q4.2 -> Q(8+ceil(log2(N))).4
+
+    Returns
+    -------
+        FixedPoint for one dimensional operands, otherwise FixedPointArray
+    """
+    if a.shape != b.shape:
+        raise ValueError(f'Shapes {a.shape} and {b.shape} do not match')
+    x = np.moveaxis(a.raw, axis, -1)
+    y = np.moveaxis(b.raw, axis, -1)
+    length = x.shape[-1]
+    n = a.n + b.n if full_precision else max(a.n, b.n)
+    growth = ceil(log2(length)) if length > 1 else 0
+    qformat = QFormat(a.m + b.m + growth, n)
+    raw = _dot_raw(x, y, a.qformat.bits + b.qformat.bits, a.n + b.n - n)
+    result = FixedPointArray._new(raw, qformat)  # pylint: disable=protected-access
+    if result.ndim == 0:
+        return result[()]
+    return result
+
+
+def mac(acc: FixedPoint | FixedPointArray, a: FixedPointArray, b: FixedPointArray,
+        axis: int = -1, full_precision: bool = False) -> FixedPoint | FixedPointArray:
+    """Multiply-accumulate, acc + dot(a, b)
+
+    Parameters
+    ----------
+    acc
+        Accumulator value
+    a, b
+        FixedPointArray operands of equal shape
+    axis
+        Axis along which to sum the products
+    full_precision
+        Keep all fractional bits of the products, see dot
+
+    Returns
+    -------
+        Sum of acc and the dot product, the format grows as for addition
+    """
+    return acc + dot(a, b, axis, full_precision)
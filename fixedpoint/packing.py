@@ -0,0 +1,178 @@
+"""Dense bit packing of fixed point values
+
+Values of a Qm.n format take m+n bits in two's complement. pack stores
+them back to back in a byte stream without padding to a byte, Q3.9 takes
+12 bits per value instead of the 16 bits of an int16:
+
+    >>> from fixedpoint import FixedPointArray, pack, unpack
+    >>> data = pack(FixedPointArray([0.5, -1.0], 'Q3.9'))
+    >>> data.hex()
+    '100e00'
+    >>> unpack(data, 'Q3.9')
+    FixedPointArray([0.5, -1.0], 'Q3.9')
+
+The last byte is padded with zero bits. For formats narrower than 8 bits
+the padding can hold whole values, unpack needs the number of values then.
+"""
+from __future__ import annotations
+from typing import Literal
+import numpy as np
+from .array import FixedPointArray, _check_raw, _widen
+from .format import QFormat, as_qformat
+
+BITORDERS = ('big', 'little')
+
+# values per step, a multiple of 8 so that every step starts on a byte boundary
+_CHUNK = 1 << 16
+
+
+def packed_size(fmt: str | QFormat, count: int) -> int:
+    """Number of bytes of count packed values of the format"""
+    return (as_qformat(fmt).bits * count + 7) // 8
+
+
+def _bits_int64(raw: np.ndarray, bits: int, bitorder: str) -> np.ndarray:
+    """Bit matrix of the low bits of int64 values, one row per value"""
+    if bitorder == 'big':
+        octets = raw.astype('>i8').view(np.uint8).reshape(-1, 8)
+        return np.unpackbits(octets, axis=1)[:, 64 - bits:]
+    octets = raw.astype('<i8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(octets, axis=1, bitorder='little')[:, :bits]
+
+
+def _int64_bits(matrix: np.ndarray, bits: int, bitorder: str) -> np.ndarray:
+    """Sign extended int64 values of a bit matrix, inverse of _bits_int64"""
+    padded = np.zeros((matrix.shape[0], 64), dtype=np.uint8)
+    if bitorder == 'big':
+        padded[:, 64 - bits:] = matrix
+        raw = np.packbits(padded, axis=1).view('>i8').astype(np.int64).ravel()
+    else:
+        padded[:, :bits] = matrix
+        raw = np.packbits(padded, axis=1, bitorder='little').view('<i8').astype(np.int64).ravel()
+    raw <<= 64 - bits
+    raw >>= 64 - bits
+    return raw
+
+
+def _bits_object(raw: np.ndarray, bits: int, bitorder: str) -> np.ndarray:
+    """Bit matrix of the low bits of Python integers, one row per value"""
+    mask = (1 << bits) - 1
+    text = ''.join(format(int(value) & mask, f'0{bits}b') for value in raw)
+    matrix = (np.frombuffer(text.encode('ascii'), dtype=np.uint8) - ord('0')).reshape(-1, bits)
+    return matrix if bitorder == 'big' else matrix[:, ::-1]
+
+
+def _object_bits(matrix: np.ndarray, bits: int, bitorder: str) -> np.ndarray:
+    """Sign extended Python integers of a bit matrix, inverse of _bits_object"""
+    if bitorder == 'little':
+        matrix = matrix[:, ::-1]
+    text = (matrix + ord('0')).astype(np.uint8).tobytes().decode('ascii')
+    sign = 1 << (bits - 1)
+    values = [int(text[i:i + bits], 2) for i in range(0, len(text), bits)]
+    return np.array([(value ^ sign) - sign for value in values], dtype=object)
+
+
+def pack(values, fmt: str | QFormat | None = None,
+         bitorder: Literal['big', 'little'] = 'big') -> bytes:
+    """Pack values densely into bytes
+
+    Parameters
+    ----------
+    values
+        FixedPointArray, or array-like of integers scaled by the fractional bits
+    fmt
+        Qm.n format string or QFormat. Required for integers, FixedPointArray
+        values are requantized to it with policy exact if given.
+    bitorder
+        'big' stores the most significant bit of a value first, filling the
+        bytes from their most significant bit. 'little' stores the least
+        significant bit first, filling the bytes from their least significant bit.
+
+    Returns
+    -------
+        Bytes of m+n bits per value, the last byte is padded with zero bits
+    """
+    if bitorder not in BITORDERS:
+        raise ValueError(f'Invalid bit order {bitorder} given.')
+    if isinstance(values, FixedPointArray):
+        if fmt is not None:
+            values = values.to(fmt)
+        qformat = values.qformat
+        raw = values.raw.ravel()
+    else:
+        if fmt is None:
+            raise ValueError('No fixed point format given')
+        qformat = as_qformat(fmt)
+        raw = np.asarray(values, dtype=object if qformat.bits > 64 else np.int64).ravel()
+        _check_raw(raw, qformat)
+    bits = qformat.bits
+    if raw.dtype != object and bits % 8 == 0:
+        # byte aligned, the low bytes of each value
+        width = bits // 8
+        if bitorder == 'big':
+            return raw.astype('>i8').view(np.uint8).reshape(-1, 8)[:, 8 - width:].tobytes()
+        return raw.astype('<i8').view(np.uint8).reshape(-1, 8)[:, :width].tobytes()
+    to_bits = _bits_object if raw.dtype == object else _bits_int64
+    parts = [np.packbits(to_bits(raw[i:i + _CHUNK], bits, bitorder), bitorder=bitorder)
+             for i in range(0, raw.size, _CHUNK)]
+    return b''.join(part.tobytes() for part in parts)
+
+
+def unpack(data, fmt: str | QFormat, count: int | None = None,
+           bitorder: Literal['big', 'little'] = 'big') -> FixedPointArray:
+    """Unpack densely packed values, inverse of pack
+
+    Parameters
+    ----------
+    data
+        bytes-like object, e.g. bytes, bytearray, memoryview or a uint8 array
+    fmt
+        Qm.n format string or QFormat of the values
+    count
+        Number of values. Default is as many as fit into data, which is the
+        number of packed values for formats of 8 bits or more. Required for
+        narrower formats, the padding of the last byte can hold whole values.
+    bitorder
+        Bit order used by pack
+
+    Returns
+    -------
+        FixedPointArray with the sign extended values
+    """
+    if bitorder not in BITORDERS:
+        raise ValueError(f'Invalid bit order {bitorder} given.')
+    qformat = as_qformat(fmt)
+    bits = qformat.bits
+    octets = np.frombuffer(data, dtype=np.uint8)
+    available = octets.size * 8 // bits
+    if count is None:
+        if bits < 8:
+            raise ValueError(f'The number of values is required for {bits} bit formats')
+        count = available
+    elif count > available:
+        raise ValueError(f'Data holds {available} values, {count} requested')
+    if bits > 64:
+        matrix = np.unpackbits(octets, count=count * bits, bitorder=bitorder)
+        raw = _object_bits(matrix.reshape(count, bits), bits, bitorder)
+        return FixedPointArray.from_raw(raw, qformat, check=False)
+    if bits % 8 == 0:
+        # byte aligned, sign extend the bytes of each value to int64
+        width = bits // 8
+        padded = np.zeros((count, 8), dtype=np.uint8)
+        if bitorder == 'big':
+            padded[:, 8 - width:] = octets[:count * width].reshape(count, width)
+            raw = padded.view('>i8').astype(np.int64).ravel()
+        else:
+            padded[:, :width] = octets[:count * width].reshape(count, width)
+            raw = padded.view('<i8').astype(np.int64).ravel()
+        raw <<= 64 - bits
+        raw >>= 64 - bits
+    else:
+        parts = [np.zeros(0, dtype=np.int64)]
+        for start in range(0, count, _CHUNK):
+            length = min(_CHUNK, count - start)
+            matrix = np.unpackbits(octets[start * bits // 8:], count=length * bits,
+                                   bitorder=bitorder)
+            parts.append(_int64_bits(matrix.reshape(length, bits), bits, bitorder))
+        raw = np.concatenate(parts)
+    return FixedPointArray.from_raw(_widen(raw, bits), qformat, check=False)
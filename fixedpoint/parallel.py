@@ -0,0 +1,218 @@
+"""Chunked execution of array operations on a pool of workers
+
+The arrays are split along the first axis into chunks which are processed
+by a thread pool or a process pool. The integer kernels of NumPy release
+the GIL, so threads run them in parallel without copying the data. The
+chunks are combined in order, the results are bit-exact with the same
+operation on the whole array and do not depend on the number of workers.
+
+    >>> import numpy as np
+    >>> from fixedpoint import FixedPointArray, ParallelExecutor
+    >>> x = FixedPointArray(np.linspace(-1, 1, 10_000_000), 'Q2.30')
+    >>> with ParallelExecutor(workers=8) as ex:
+    ...     y = ex.map(lambda a: (a * a).to('Q2.14', 'fit'), x)
+"""
+from __future__ import annotations
+import concurrent.futures
+import contextvars
+import copy
+import os
+from typing import Callable, List, Tuple
+import numpy as np
+from .array import FixedPointArray
+from .context import Context, getcontext, localcontext
+from .fir import FIRFilter
+from .format import QFormat, as_qformat
+from .requantize import policy_modes, requantize
+
+BACKENDS = ('thread', 'process')
+
+Call = Tuple[tuple, dict]
+
+
+def _run(ctx: Context, func: Callable, args: tuple, kwargs: dict):
+    """Call func in a worker process with the arithmetic context of the caller"""
+    with localcontext(ctx):
+        return func(*args, **kwargs)
+
+
+def _combine(results: list):
+    """Concatenate the results of the chunks along the first axis"""
+    first = results[0]
+    if isinstance(first, tuple):
+        return tuple(_combine([r[i] for r in results]) for i in range(len(first)))
+    if isinstance(first, FixedPointArray):
+        if any(r.qformat != first.qformat for r in results):
+            raise ValueError('Chunks have results of different formats')
+        raw = np.concatenate([r.raw for r in results])
+        return FixedPointArray.from_raw(raw, first.qformat, check=False)
+    return np.concatenate(results)
+
+
+def _generators(rng: np.random.Generator | None, count: int) -> list:
+    """One random generator per chunk, seeded in order from rng"""
+    if rng is None:
+        return [None] * count
+    return [np.random.default_rng(seed) for seed in rng.integers(0, 1 << 63, size=count)]
+
+
+class ParallelExecutor:
+    """Run array operations chunk by chunk on a pool of workers
+
+    Arrays with the same number of dimensions as the first array argument
+    and the same length are split along the first axis, all other
+    arguments are passed unchanged to every call. The pool is created on
+    first use and shut down by close or at the end of a with block.
+
+    The arithmetic context of the caller applies in the workers. Stochastic
+    rounding draws one seed per chunk from the given generator, the result
+    is reproducible for a seeded generator and a fixed chunk size, but
+    differs from rounding the whole array at once. Instrumentation counters
+    are only collected with the thread backend.
+    """
+
+    def __init__(self, workers: int | None = None, chunk: int = 1 << 20,
+                 backend: str = 'thread'):
+        """ParallelExecutor
+
+        Parameters
+        ----------
+        workers
+            Number of threads or processes, default is the number of CPUs.
+            With one worker the chunks run in the calling thread.
+        chunk
+            Number of elements per chunk, rows of multi-dimensional arrays
+            are not split
+        backend
+            thread: thread pool, for the integer kernels which release the GIL
+            process: process pool, for operations on Python integers of
+                formats wider than 64 bits, all arguments must be picklable
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f'Invalid backend {backend} given.')
+        if chunk < 1:
+            raise ValueError(f'Chunk size must be positive, got {chunk}')
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk = chunk
+        self.backend = backend
+        self._pool: concurrent.futures.Executor | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down the pool after the running chunks have finished"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _execute(self, func: Callable, calls: List[Call]) -> list:
+        """Run func for each call in order and return the results"""
+        if self.workers == 1 or len(calls) == 1:
+            return [func(*args, **kwargs) for args, kwargs in calls]
+        if self._pool is None:
+            if self.backend == 'thread':
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.workers)
+            else:
+                self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        if self.backend == 'thread':
+            # every task needs its own copy, a context can only be entered by one thread
+            futures = [self._pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+                       for args, kwargs in calls]
+        else:
+            ctx = getcontext()
+            futures = [self._pool.submit(_run, ctx, func, args, kwargs) for args, kwargs in calls]
+        return [f.result() for f in futures]
+
+    def _bounds(self, array) -> List[Tuple[int, int]]:
+        """Start and stop along the first axis of every chunk of an array"""
+        length = len(array)
+        rows = max(self.chunk // max(int(np.prod(np.shape(array)[1:])), 1), 1)
+        return [(start, min(start + rows, length)) for start in range(0, length, rows)] or [(0, 0)]
+
+    def map(self, func: Callable, *args, **kwargs):
+        """Apply func chunk by chunk and concatenate the results
+
+        Parameters
+        ----------
+        func
+            Function of FixedPointArray or NumPy array chunks returning a
+            FixedPointArray, a NumPy array or a tuple of them
+        args
+            Arguments of func, the first one must be a FixedPointArray or
+            NumPy array with at least one dimension
+        kwargs
+            Keyword arguments passed unchanged to func
+
+        Returns
+        -------
+            The results of the chunks concatenated along the first axis
+        """
+        first = args[0]
+        split = [isinstance(arg, (FixedPointArray, np.ndarray)) and arg.ndim == first.ndim
+                 and len(arg) == len(first) for arg in args]
+        calls = [(tuple(arg[start:stop] if s else arg for arg, s in zip(args, split)), kwargs)
+                 for start, stop in self._bounds(first)]
+        return _combine(self._execute(func, calls))
+
+    def to(self, array: FixedPointArray, fmt: str | QFormat,  # pylint: disable=too-many-arguments
+           policy: str = 'exact', rounding: str | None = None, overflow: str | None = None, *,
+           rng: np.random.Generator | None = None) -> FixedPointArray:
+        """Coerce to new format according to policy, see FixedPointArray.to"""
+        rounding, overflow = policy_modes(policy, rounding, overflow)
+        bounds = self._bounds(array)
+        calls = [((array[start:stop], fmt), {'rounding': rounding, 'overflow': overflow, 'rng': r})
+                 for (start, stop), r in zip(bounds, _generators(rng, len(bounds)))]
+        return _combine(self._execute(FixedPointArray.to, calls))
+
+    def requantize(self, raw: np.ndarray, src: str | QFormat,  # pylint: disable=too-many-arguments
+                   dst: str | QFormat, rounding: str = 'trunc', overflow: str = 'error', *,
+                   rng: np.random.Generator | None = None) -> np.ndarray:
+        """Convert scaled integers from one fixed point format to another, see requantize"""
+        raw = np.asarray(raw)
+        if raw.ndim == 0:
+            return requantize(raw, src, dst, rounding, overflow, rng=rng)
+        src, dst = as_qformat(src), as_qformat(dst)
+        bounds = self._bounds(raw)
+        calls = [((raw[start:stop], src, dst, rounding, overflow), {'rng': r})
+                 for (start, stop), r in zip(bounds, _generators(rng, len(bounds)))]
+        return _combine(self._execute(requantize, calls))
+
+    def fir(self, fir: FIRFilter, x) -> FixedPointArray:
+        """Filter the next samples of a signal, see FIRFilter.process
+
+        Every chunk is filtered by a copy of the filter whose delay line
+        holds the last input samples of the previous chunk, the delay line
+        of fir is updated as if the whole signal had been processed at once.
+
+        Parameters
+        ----------
+        fir
+            FIRFilter, its delay line is carried over between calls
+        x
+            FixedPointArray or array-like of numerical values
+
+        Returns
+        -------
+            FixedPointArray with one output sample per input sample
+        """
+        if not isinstance(x, FixedPointArray):
+            x = self.map(FixedPointArray, np.ravel(np.asarray(x, dtype=np.float64)), fir.input_fmt)
+        elif x.qformat != fir.input_fmt:
+            x = self.map(FixedPointArray.to, x, fir.input_fmt)
+        # pylint: disable=protected-access
+        raw = np.ravel(x.raw).astype(fir._dtype)
+        ext = np.concatenate((fir._state, raw))
+        delay = fir.taps - 1
+        calls: List[Call] = []
+        for start, stop in self._bounds(raw):
+            clone = copy.copy(fir)
+            clone._state = ext[start:start + delay]
+            calls.append(((clone, FixedPointArray.from_raw(raw[start:stop], fir.input_fmt,
+                                                           check=False)), {}))
+        if delay:
+            fir._state = ext[-delay:].copy()
+        return _combine(self._execute(FIRFilter.process, calls))
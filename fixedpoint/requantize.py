@@ -0,0 +1,300 @@
+"""Requantization of scaled integers between fixed point formats
+
+
+"""
+from __future__ import annotations
+import numpy as np
+from . import instrument
+from .dtype import storage_dtype
+from .format import QFormat, as_qformat
+
+ROUNDING_MODES = ('exact', 'floor', 'ceil', 'trunc', 'half_up', 'half_even', 'stochastic')
+OVERFLOW_MODES = ('saturate', 'wrap', 'error')
+
+_RNG = np.random.default_rng()
+
+# elements per block when writing into preallocated arrays
+_BLOCK = 1 << 16
+
+
+def _any(cond) -> bool:
+    """Truth of a comparison on an integer or any element of an array"""
+    if isinstance(cond, np.ndarray):
+        return bool(cond.any())
+    return cond
+
+
+def _round(x, shift, rounding: str, rng):
+    """Divide integers by 2**shift, shift > 0, rounding the quotient
+
+    shift is an integer or an array of shifts per element of x.
+    """
+    q = x >> shift
+    if rounding == 'floor':
+        return q
+    r = x & ((1 << shift) - 1)
+    half = 1 << (shift - 1)
+    if rounding == 'exact':
+        if _any(r != 0):
+            raise ValueError('Rounding error not allowed with policy exact set.')
+        up = False
+    elif rounding == 'ceil':
+        up = r != 0
+    elif rounding == 'trunc':
+        up = (x < 0) & (r != 0)
+    elif rounding == 'half_up':
+        up = r >= half
+    elif rounding == 'half_even':
+        up = (r > half) | ((r == half) & ((q & 1) == 1))
+    elif rounding == 'stochastic':
+        # round up with probability r / 2**shift, comparing at most 62 bits of r
+        bits = np.minimum(shift, 62) if isinstance(shift, np.ndarray) else min(shift, 62)
+        rng = rng or _RNG
+        if isinstance(x, np.ndarray):
+            draw = rng.integers(0, 1 << bits, size=x.shape).astype(x.dtype)
+        else:
+            draw = int(rng.integers(0, 1 << bits))
+        up = (r >> (shift - bits)) > draw
+    else:
+        raise ValueError(f'Invalid rounding mode {rounding} given.')
+    return q + up
+
+
+def _blocks(shape: tuple, size: int = _BLOCK):
+    """Indices splitting an array along the first axis into blocks of about size elements"""
+    if not shape:
+        yield ()
+        return
+    rows = max(size // max(int(np.prod(shape[1:])), 1), 1)
+    for start in range(0, shape[0], rows):
+        yield slice(start, start + rows)
+
+
+def _broadcast(x, out: np.ndarray) -> np.ndarray:
+    """Array x broadcast to the shape of out, copied if it overlaps out other than elementwise"""
+    x = np.asarray(x)
+    if np.may_share_memory(x, out) and not (
+            x.shape == out.shape and x.strides == out.strides
+            and x.__array_interface__['data'] == out.__array_interface__['data']):
+        x = x.copy()
+    return x if x.ndim == 0 else np.broadcast_to(x, out.shape)
+
+
+def _block(x: np.ndarray, block):
+    """Block of an array returned by _broadcast"""
+    return x if x.ndim == 0 else x[block]
+
+
+def _overflow(x, qformat: QFormat, overflow: str):
+    """Handle integers outside the raw range of the format"""
+    if isinstance(x, np.ndarray) and x.dtype != object and qformat.bits >= x.dtype.itemsize * 8:
+        # the working type is not wider than the format, nothing can overflow
+        return x
+    if overflow == 'saturate':
+        if isinstance(x, np.ndarray):
+            return np.clip(x, qformat.min_raw, qformat.max_raw)
+        return min(max(x, qformat.min_raw), qformat.max_raw)
+    if overflow == 'wrap':
+        x = x & ((1 << qformat.bits) - 1)
+        return x - ((x >> (qformat.bits - 1)) << qformat.bits)
+    if overflow == 'error':
+        if not isinstance(x, np.ndarray):
+            if not qformat.min_raw <= x <= qformat.max_raw:
+                raise ValueError(f'A raw value of {x} does not fit in the given format {qformat}')
+        elif _any(x < qformat.min_raw) or _any(x > qformat.max_raw):
+            raise ValueError(f'Values do not fit in the given format {qformat}')
+        return x
+    raise ValueError(f'Invalid overflow mode {overflow} given.')
+
+
+def requantize(raw, src: str | QFormat, dst: str | QFormat,  # pylint: disable=too-many-arguments
+               rounding: str = 'trunc', overflow: str = 'error', *,
+               rng: np.random.Generator | None = None, out: np.ndarray | None = None):
+    """Convert scaled integers from one fixed point format to another
+
+    Only integer shifts, masks and additions are used, the values never
+    pass through floating point.
+
+    Parameters
+    ----------
+    raw
+        Integer or array of integers scaled by the fractional bits of src
+    src
+        Format of raw, Qm.n format string or QFormat
+    dst
+        Target format, Qm.n format string or QFormat
+    rounding
+        Rounding of dropped fractional bits
+            exact: raise ValueError if any dropped bit is set
+            floor: toward minus infinity
+            ceil: toward plus infinity
+            trunc: toward zero
+            half_up: to nearest, ties toward plus infinity
+            half_even: to nearest, ties to even (convergent rounding)
+            stochastic: up with probability of the dropped fraction
+    overflow
+        Handling of values outside the range of dst
+            saturate: clip to the minimum or maximum value
+            wrap: keep the low bits, two's complement wrap around
+            error: raise ValueError
+    rng
+        NumPy random generator for stochastic rounding
+    out
+        Integer array wide enough for dst receiving the result, raw is
+        broadcast to its shape. The result is computed block by block, so
+        the temporaries stay small, and out may be raw itself. out is
+        partially written if a ValueError is raised.
+
+    Returns
+    -------
+        Integer or array of integers scaled by the fractional bits of dst.
+        Arrays use the storage type of dst.
+    """
+    src, dst = as_qformat(src), as_qformat(dst)
+    if out is not None:
+        if out.dtype != object and (out.dtype.kind != 'i' or out.dtype.itemsize * 8 < dst.bits):
+            raise ValueError(f'An array of {out.dtype} can not hold the format {dst}')
+        raw = _broadcast(raw, out)
+        for block in _blocks(out.shape):
+            out[block] = requantize(_block(raw, block), src, dst, rounding, overflow, rng=rng)
+        return out
+    if isinstance(raw, (int, np.integer)):
+        return requantize_int(int(raw), src, dst, rounding, overflow, rng=rng)
+    if overflow not in OVERFLOW_MODES:
+        raise ValueError(f'Invalid overflow mode {overflow} given.')
+    shift = src.n - dst.n
+    # rounding up can not overflow as the quotient is at least one bit shorter
+    raw = np.asarray(raw).astype(storage_dtype(src.bits + max(-shift, 0)), copy=False)
+    if shift > 0:
+        x = _round(raw, shift, rounding, rng)
+    elif rounding not in ROUNDING_MODES:
+        raise ValueError(f'Invalid rounding mode {rounding} given.')
+    else:
+        x = raw << -shift
+    if instrument.ENABLED:
+        instrument.observe_requantize(raw, x, src, dst, overflow)
+    return _overflow(x, dst, overflow).astype(storage_dtype(dst.bits), copy=False)
+
+
+def requantize_int(value: int, src: QFormat, dst: QFormat,  # pylint: disable=too-many-arguments
+                   rounding: str = 'trunc', overflow: str = 'error', *,
+                   rng: np.random.Generator | None = None) -> int:
+    """Convert a scaled Python integer from one fixed point format to another
+
+    Scalar version of requantize for QFormat arguments, see requantize.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f'Invalid rounding mode {rounding} given.')
+    if overflow not in OVERFLOW_MODES:
+        raise ValueError(f'Invalid overflow mode {overflow} given.')
+    shift = src.n - dst.n
+    raw = value
+    if shift <= 0:
+        value <<= -shift
+    elif rounding == 'trunc':
+        value = -(-value >> shift) if value < 0 else value >> shift
+    else:
+        value = _round(value, shift, rounding, rng)
+    if instrument.ENABLED:
+        instrument.observe_requantize(raw, value, src, dst, overflow)
+    if dst.min_raw <= value <= dst.max_raw:
+        return value
+    return _overflow(value, dst, overflow)
+
+
+def round_ratio(num, den, rounding: str = 'trunc',
+                rng: np.random.Generator | None = None):
+    """Round the quotient of two integers
+
+    Parameters
+    ----------
+    num
+        Numerator, integer or array of integers
+    den
+        Denominator, integer or array of integers, not zero
+    rounding
+        Rounding mode, see requantize
+    rng
+        NumPy random generator for stochastic rounding
+
+    Returns
+    -------
+        Rounded quotient num / den, an array if num or den is one
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f'Invalid rounding mode {rounding} given.')
+    if isinstance(num, np.ndarray) or isinstance(den, np.ndarray):
+        return _round_ratio(np.asarray(num), np.asarray(den), rounding, rng)
+    if den < 0:
+        num, den = -num, -den
+    q, r = divmod(num, den)
+    if r == 0 or rounding == 'floor':
+        return q
+    if rounding == 'exact':
+        raise ValueError('Rounding error not allowed with policy exact set.')
+    if rounding in ('ceil', 'trunc'):
+        return q + (rounding == 'ceil' or num < 0)
+    if rounding == 'half_up':
+        return q + (2 * r >= den)
+    if rounding == 'half_even':
+        return q + (2 * r > den or (2 * r == den and q & 1))
+    # stochastic, round up with probability r / den resolved to 62 bits
+    return q + (int((rng or _RNG).integers(0, 1 << 62)) < (r << 62) // den)
+
+
+def _round_ratio(num: np.ndarray, den: np.ndarray, rounding: str, rng) -> np.ndarray:
+    """round_ratio for arrays, int64 operands must have at most 62 bits"""
+    if _any(den == 0):
+        raise ZeroDivisionError('Division by zero')
+    num = np.where(den < 0, -num, num)
+    den = np.abs(den)
+    # floor division and remainder, object arrays have no divmod loop
+    q = num // den
+    r = num - q * den
+    if rounding == 'floor':
+        return q
+    if rounding == 'exact':
+        if _any(r != 0):
+            raise ValueError('Rounding error not allowed with policy exact set.')
+        return q
+    if rounding == 'ceil':
+        up = r != 0
+    elif rounding == 'trunc':
+        up = (num < 0) & (r != 0)
+    elif rounding == 'half_up':
+        up = 2 * r >= den
+    elif rounding == 'half_even':
+        up = (2 * r > den) | ((2 * r == den) & ((q & 1) == 1))
+    else:
+        up = (rng or _RNG).random(q.shape) * den < r
+    return q + up
+
+
+_POLICIES = {
+    'exact': ('exact', 'error'),
+    'round': ('trunc', 'error'),
+    'fit': ('trunc', 'saturate'),
+}
+
+
+def policy_modes(policy: str, rounding: str | None = None,
+                 overflow: str | None = None) -> tuple[str, str]:
+    """Rounding and overflow mode for a policy of FixedPoint.to
+
+    Parameters
+    ----------
+    policy
+        exact, round or fit
+    rounding
+        Rounding mode overriding the policy
+    overflow
+        Overflow mode overriding the policy
+
+    Returns
+    -------
+        Rounding and overflow mode
+    """
+    if policy not in _POLICIES:
+        raise ValueError(f'Invalid policy {policy} given.')
+    default_rounding, default_overflow = _POLICIES[policy]
+    return rounding or default_rounding, overflow or default_overflow
@@ -0,0 +1,238 @@
+"""Error statistics of fixed point results against a reference
+
+ErrorStatistics compares a fixed point result with a float reference or a
+reference in a wider format piece by piece and keeps only the sums, so
+captures of any length can be streamed through it. Errors are measured in
+ULP, the LSB of the result format:
+
+    >>> import numpy as np
+    >>> from fixedpoint import FixedPointArray, error_statistics
+    >>> x = 0.9 * np.sin(0.01 * np.arange(100000))
+    >>> stats = error_statistics(FixedPointArray(x, 'Q1.11'), x)
+    >>> round(stats.sqnr, 1), round(stats.enob, 1)
+    (67.1, 10.9)
+    >>> print(stats.report())
+"""
+from __future__ import annotations
+import math
+import operator
+import numpy as np
+from .array import FixedPointArray, _exact
+from .format import QFormat
+
+# histogram bins per ULP
+_SUBDIVISIONS = 4
+
+
+class ErrorStatistics:  # pylint: disable=too-many-instance-attributes
+    """Error distribution of a stream of fixed point results
+
+    Results are passed piece by piece to update together with their
+    reference. The error is result minus reference. A reference in a fixed
+    point format is subtracted exactly on the scaled integers. NaN and
+    infinite references are counted as invalid and otherwise ignored.
+
+    Attributes
+    ----------
+    qformat
+        Format of the results, its LSB is the ULP of the errors
+    count
+        Number of compared values
+    invalid
+        Number of NaN or infinite references, not compared
+    exact
+        Number of results equal to the reference
+    max_error
+        Largest absolute error in ULP
+    """
+
+    def __init__(self, span: int = 8, chunk: int = 1 << 20):
+        """ErrorStatistics
+
+        Parameters
+        ----------
+        span
+            The histogram covers the errors from -span to span ULP in bins
+            of a quarter ULP, larger errors are counted in the first and
+            last bin
+        chunk
+            Number of values processed at once, bounds the temporary memory
+        """
+        self.chunk = chunk
+        self.qformat: QFormat | None = None
+        self.count = 0
+        self.invalid = 0
+        self.exact = 0
+        self.max_error = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._signal = 0.0
+        self._counts = np.zeros(2 * span * _SUBDIVISIONS + 2, dtype=np.int64)
+
+    @property
+    def span(self) -> int:
+        """Largest absolute error in ULP with bins of its own in the histogram"""
+        return (self._counts.size - 2) // (2 * _SUBDIVISIONS)
+
+    def update(self, result: FixedPointArray, reference) -> ErrorStatistics:
+        """Add a piece of results
+
+        Parameters
+        ----------
+        result
+            FixedPointArray of the design
+        reference
+            FixedPointArray or array-like of numbers of the same shape
+
+        Returns
+        -------
+            The statistics itself
+        """
+        if not isinstance(result, FixedPointArray):
+            raise TypeError(f'Expected FixedPointArray, got {type(result).__name__}')
+        if self.qformat is not None and result.qformat != self.qformat:
+            raise ValueError(f'Results of format {result.qformat}, earlier ones are {self.qformat}')
+        self.qformat = result.qformat
+        if isinstance(reference, FixedPointArray):
+            ref, ref_format = reference.raw, reference.qformat
+        else:
+            ref, ref_format = np.asarray(reference, dtype=np.float64), None
+        if ref.shape != result.shape:
+            raise ValueError(f'Shapes {result.shape} and {ref.shape} differ')
+        raw, ref = np.ravel(result.raw), np.ravel(ref)
+        for start in range(0, raw.size, self.chunk):
+            self._update(raw[start:start + self.chunk], result.qformat,
+                         ref[start:start + self.chunk], ref_format)
+        return self
+
+    def _update(self, raw: np.ndarray, qformat: QFormat, ref: np.ndarray,
+                ref_format: QFormat | None):
+        """Add a piece of scaled integers against reference values or scaled integers"""
+        if ref_format is not None:
+            diff, exact = _exact(operator.sub, raw, qformat, (ref, ref_format))
+            error = np.ldexp(diff.astype(np.float64), qformat.n - exact.n)
+            ref = np.ldexp(ref.astype(np.float64), -ref_format.n)
+        else:
+            finite = np.isfinite(ref)
+            if not finite.all():
+                self.invalid += int(ref.size - np.count_nonzero(finite))
+                raw, ref = raw[finite], ref[finite]
+            error = raw.astype(np.float64) - np.ldexp(ref, qformat.n)
+        self.count += error.size
+        self.exact += error.size - int(np.count_nonzero(error))
+        self.max_error = max(self.max_error, float(np.abs(error).max(initial=0.0)))
+        self._sum += float(error.sum())
+        self._sum_squares += float(np.dot(error, error))
+        self._signal += float(np.dot(ref, ref))
+        index = np.floor(error * _SUBDIVISIONS) + self.span * _SUBDIVISIONS + 1
+        index = np.clip(index, 0, self._counts.size - 1).astype(np.int64)
+        self._counts += np.bincount(index, minlength=self._counts.size)
+
+    def merge(self, other: ErrorStatistics) -> ErrorStatistics:
+        """Add the statistics of another piece of the same stream, e.g. of a parallel worker
+
+        Returns
+        -------
+            The statistics itself
+        """
+        if other.qformat is not None:
+            if self.qformat is not None and other.qformat != self.qformat:
+                raise ValueError(f'Results of format {other.qformat}, earlier ones are '
+                                 f'{self.qformat}')
+            self.qformat = other.qformat
+        if other.span != self.span:
+            raise ValueError('The histograms have different spans')
+        self.count += other.count
+        self.invalid += other.invalid
+        self.exact += other.exact
+        self.max_error = max(self.max_error, other.max_error)
+        self._sum += other._sum  # pylint: disable=protected-access
+        self._sum_squares += other._sum_squares  # pylint: disable=protected-access
+        self._signal += other._signal  # pylint: disable=protected-access
+        self._counts += other._counts  # pylint: disable=protected-access
+        return self
+
+    @property
+    def ulp(self) -> float:
+        """Value of one ULP of the errors"""
+        return self.qformat.resolution if self.qformat is not None else math.nan
+
+    @property
+    def mean_error(self) -> float:
+        """Mean error in ULP, the bias of the rounding"""
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def rms_error(self) -> float:
+        """Root mean square error in ULP"""
+        return math.sqrt(self._sum_squares / self.count) if self.count else 0.0
+
+    @property
+    def sqnr(self) -> float:
+        """Signal to quantization noise ratio in dB, the power of the reference over the error"""
+        if self._sum_squares == 0:
+            return math.inf
+        if self._signal == 0:
+            return -math.inf
+        return 10 * math.log10(self._signal / (self._sum_squares * self.ulp ** 2))
+
+    @property
+    def enob(self) -> float:
+        """Effective number of bits, (SQNR - 1.76) / 6.02 as for a full scale sine"""
+        return (self.sqnr - 1.76) / 6.02
+
+    def histogram(self):
+        """Error distribution
+
+        Returns
+        -------
+        edges
+            Lower edges of the bins in ULP, a bin holds the errors from its
+            edge up to a quarter ULP more. The first bin holds all errors
+            below -span and the last one all errors from span on.
+        counts
+            Number of values per bin
+        """
+        edges = (np.arange(self._counts.size) - 1 - self.span * _SUBDIVISIONS) / _SUBDIVISIONS
+        edges[0] = -math.inf
+        return edges, self._counts.copy()
+
+    def report(self) -> str:
+        """Statistics and non-empty bins of the error histogram formatted as text"""
+        lines = [f'values {self.count}, invalid {self.invalid}, exact {self.exact}, '
+                 f'format {self.qformat}, ULP {self.ulp:.6g}',
+                 f'max {self.max_error:.4g} ULP, mean {self.mean_error:.4g} ULP, '
+                 f'rms {self.rms_error:.4g} ULP',
+                 f'SQNR {self.sqnr:.2f} dB, ENOB {self.enob:.2f} bits',
+                 f"{'error ULP':<12}{'count':>12}"]
+        for edge, count in zip(*self.histogram()):
+            if count:
+                label = f'< {-self.span}' if edge == -math.inf else f'>= {edge:g}' \
+                    if edge == self.span else f'{edge:g}'
+                lines.append(f'{label:<12}{count:>12}')
+        return '\n'.join(lines)
+
+
+def error_statistics(result, reference, **kwargs) -> ErrorStatistics:
+    """Error statistics of results against a reference, see ErrorStatistics
+
+    Parameters
+    ----------
+    result
+        FixedPointArray, or an iterable of FixedPointArray pieces, e.g. iter_chunks
+    reference
+        FixedPointArray or array-like of numbers of the same shape, or an
+        iterable of the same number of pieces matching the pieces of result
+    kwargs
+        span and chunk, see ErrorStatistics
+
+    Returns
+    -------
+        ErrorStatistics
+    """
+    stats = ErrorStatistics(**kwargs)
+    if isinstance(result, FixedPointArray):
+        return stats.update(result, reference)
+    for piece, expected in zip(result, reference, strict=True):
+        stats.update(piece, expected)
+    return stats
@@ -0,0 +1,533 @@
+"""Tracing of FixedPoint models and compilation into array kernels
+
+A model written as Python code over FixedPoint scalars is called once with
+Tracer arguments. The tracer records every operator call with the formats,
+rounding and overflow modes the active context gives it into a dataflow
+graph. The graph compiles into a kernel which runs the recorded integer
+operations on whole arrays of scaled integers, bit-exact with calling the
+model for every element:
+
+    >>> from fixedpoint import FixedPoint, FixedPointArray, fuse
+    >>> @fuse('Q1.15', 'Q1.15')
+    ... def mix(x, y):
+    ...     return (x * FixedPoint(0.75, 'Q1.15') + y * 0.25).to('Q1.15', 'fit')
+    >>> mix(FixedPoint(0.5, 'Q1.15'), FixedPoint(-0.5, 'Q1.15'))
+    FixedPoint(0.25, 'Q1.15')
+    >>> mix(FixedPointArray([0.5, 0.5], 'Q1.15'), FixedPointArray([-0.5, 0.5], 'Q1.15'))
+    FixedPointArray([0.25, 0.5], 'Q1.15')
+
+The model must not branch on values. Traced are the arithmetic operators
++, -, *, ** with FixedPoint, Tracer and number operands, unary -, + and
+abs, the shifts << and >> and to().
+"""
+from __future__ import annotations
+import functools
+from numbers import Real
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from .array import FixedPointArray, _widen
+from .context import getcontext
+from .dtype import storage_dtype
+from .fixedpoint import FixedPoint, _ratio
+from .format import QFormat, as_qformat, product_format, sum_format
+from .requantize import _round, policy_modes, requantize
+
+# rounding modes for which rounding twice in a row equals rounding once by the total shift
+_NESTING = ('floor', 'ceil', 'trunc')
+
+
+class Node:  # pylint: disable=too-few-public-methods
+    """Operation of a graph
+
+    Attributes
+    ----------
+    op
+        input, const, add, sub, mul, neg, abs, shl or requant
+    args
+        Indices of the argument nodes
+    qformat
+        Format of the result. Except for requant the result is exact.
+    params
+        input: index of the argument
+        const: scaled integer
+        shl: number of bits
+        requant: source format, which may relabel the argument with the same
+            width, rounding mode, overflow mode or None if the result always
+            fits, random generator
+    """
+    __slots__ = ('op', 'args', 'qformat', 'params')
+
+    def __init__(self, op: str, args: tuple, qformat: QFormat, params=None):
+        self.op = op
+        self.args = args
+        self.qformat = qformat
+        self.params = params
+
+    def __repr__(self):
+        return f'Node({self.op!r}, {self.args}, {self.qformat.fmt!r}, {self.params!r})'
+
+
+class Tracer:
+    """Placeholder for a FixedPoint value recording the operations on it"""
+    __slots__ = ('graph', 'node')
+
+    def __init__(self, graph: Graph, node: int):
+        self.graph = graph
+        self.node = node
+
+    @property
+    def qformat(self) -> QFormat:
+        """Format of the traced value"""
+        return self.graph.nodes[self.node].qformat
+
+    @property
+    def fmt(self) -> str:
+        """Format string 'Qm.n'"""
+        return self.qformat.fmt
+
+    @property
+    def m(self) -> int:
+        """Number of integer bits"""
+        return self.qformat.m
+
+    @property
+    def n(self) -> int:
+        """Number of fractional bits"""
+        return self.qformat.n
+
+    def __repr__(self):
+        return f"Tracer(node={self.node}, '{self.fmt}')"
+
+    def __bool__(self):
+        raise TypeError('The value of a Tracer is unknown, traced models must not branch on values')
+
+    def _emit(self, op: str, args: tuple, qformat: QFormat, params=None) -> Tracer:
+        return Tracer(self.graph, self.graph.add(op, args, qformat, params))
+
+    def _requant(self, exact: Tracer, qformat: QFormat, rounding: str,
+                 overflow: str | None) -> Tracer:
+        """Requantize an exact result"""
+        return self._emit('requant', (exact.node,), qformat,
+                          (exact.qformat, rounding, overflow, None))
+
+    def _number(self, exact: Tracer) -> Tracer:
+        """Result of an operation with a number or a unary operation, see FixedPoint._number"""
+        ctx = getcontext()
+        if ctx.default:
+            return self._requant(exact, self.qformat, 'trunc', 'error')
+        return self._requant(exact, ctx.result_format(self.qformat, self.qformat),
+                             ctx.rounding, ctx.overflow)
+
+    def _operand(self, other) -> Tuple[Tracer | None, bool]:
+        """Traced operand and whether it is fixed point, None if the type is not supported"""
+        if isinstance(other, Tracer):
+            if other.graph is not self.graph:
+                raise ValueError('Operands belong to different traces')
+            return other, True
+        if isinstance(other, FixedPoint):
+            return self._emit('const', (), other.qformat, other.value), True
+        if isinstance(other, Real):
+            num, den = _ratio(other)
+            if den & (den - 1):
+                raise ValueError(f'Only numbers with a power of two denominator can be traced, '
+                                 f'got {other}')
+            n = den.bit_length() - 1
+            return self._emit('const', (), QFormat(num.bit_length() + 1 - n, n), num), False
+        return None, False
+
+    def _binary(self, op: str, other, reverse: bool = False):
+        """Trace add, sub or mul, see FixedPoint.__add__ and FixedPoint.__mul__"""
+        operand, fixed = self._operand(other)
+        if operand is None:
+            return NotImplemented
+        a, b = (operand, self) if reverse else (self, operand)
+        if op == 'mul':
+            exact = QFormat(a.m + b.m, a.n + b.n)
+            grown = product_format(a.qformat, b.qformat)
+        else:
+            exact = grown = sum_format(a.qformat, b.qformat)
+        result = self._emit(op, (a.node, b.node), exact)
+        if not fixed:
+            return self._number(result)
+        ctx = getcontext()
+        if ctx.default:
+            # products are truncated to the fractional bits of the wider operand and always fit
+            return result if op != 'mul' else self._requant(result, grown, 'trunc', None)
+        operand_fmt = QFormat(max(a.m, b.m), max(a.n, b.n))
+        return self._requant(result, ctx.result_format(grown, operand_fmt), ctx.rounding,
+                             ctx.overflow)
+
+    def __add__(self, other):
+        return self._binary('add', other)
+
+    def __radd__(self, other):
+        return self._binary('add', other, reverse=True)
+
+    def __sub__(self, other):
+        return self._binary('sub', other)
+
+    def __rsub__(self, other):
+        return self._binary('sub', other, reverse=True)
+
+    def __mul__(self, other):
+        return self._binary('mul', other)
+
+    def __rmul__(self, other):
+        return self._binary('mul', other, reverse=True)
+
+    def __pow__(self, power: int) -> Tracer:
+        if not isinstance(power, int) or power < 1:
+            raise ValueError(f'Only positive integer powers are supported, got {power}')
+        result = self
+        for _ in range(power - 1):
+            result = self._emit('mul', (result.node, self.node),
+                                QFormat(result.m + self.m, result.n + self.n))
+        return self._requant(result, QFormat(self.m * power, self.n), 'trunc', None)
+
+    def __neg__(self):
+        return self._number(self._emit('neg', (self.node,), QFormat(self.m + 1, self.n)))
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return self._number(self._emit('abs', (self.node,), QFormat(self.m + 1, self.n)))
+
+    def __lshift__(self, other: int):
+        return self._number(self._emit('shl', (self.node,), QFormat(self.m + other, self.n),
+                                       other))
+
+    def __rshift__(self, other: int):
+        # an arithmetic shift is rounding toward minus infinity of the value with n+other bits
+        return self._emit('requant', (self.node,), self.qformat,
+                          (QFormat(self.m - other, self.n + other), 'floor', None, None))
+
+    def to(self, fmt: str | QFormat, policy: str = 'exact', rounding: str | None = None,
+           overflow: str | None = None, *, rng=None) -> Tracer:
+        """Trace a conversion to a new format, see FixedPoint.to"""
+        rounding, overflow = policy_modes(policy, rounding, overflow)
+        return self._emit('requant', (self.node,), as_qformat(fmt),
+                          (self.qformat, rounding, overflow, rng))
+
+
+class Graph:
+    """Dataflow graph of a traced model
+
+    Attributes
+    ----------
+    nodes
+        List of Node in the order of recording, arguments come first
+    inputs
+        Node indices of the arguments of the model
+    outputs
+        Node indices of the results of the model
+    single
+        True if the model returned one value instead of a tuple
+    """
+
+    def __init__(self):
+        self.nodes: List[Node] = []
+        self.inputs: List[int] = []
+        self.outputs: List[int] = []
+        self.single = True
+
+    def add(self, op: str, args: tuple, qformat: QFormat, params=None) -> int:
+        """Append a node and return its index"""
+        self.nodes.append(Node(op, args, qformat, params))
+        return len(self.nodes) - 1
+
+    def report(self) -> str:
+        """Nodes with their arguments and formats as text"""
+        lines = [f"{'node':<6}{'op':<9}{'args':<12}{'format':<10}params"]
+        for i, node in enumerate(self.nodes):
+            params = node.params
+            if node.op == 'requant':
+                params = f'{params[0]} {params[1]} {params[2]}'
+            lines.append(f"{i:<6}{node.op:<9}{','.join(map(str, node.args)):<12}"
+                         f"{node.qformat.fmt:<10}{'' if params is None else params}")
+        lines.append(f"outputs {', '.join(map(str, self.outputs))}")
+        return '\n'.join(lines)
+
+    def compile(self) -> Kernel:
+        """Compile into a kernel on arrays, see Kernel"""
+        return Kernel(self)
+
+
+def trace(func: Callable, *formats: str | QFormat) -> Graph:
+    """Record the operations of a model on FixedPoint values
+
+    The operations are traced with the arithmetic context active during the call.
+
+    Parameters
+    ----------
+    func
+        Function of FixedPoint arguments returning a FixedPoint or a tuple of them
+    formats
+        Format of each argument
+
+    Returns
+    -------
+        Graph
+    """
+    graph = Graph()
+    args = []
+    for i, fmt in enumerate(formats):
+        node = graph.add('input', (), as_qformat(fmt), i)
+        graph.inputs.append(node)
+        args.append(Tracer(graph, node))
+    result = func(*args)
+    graph.single = not isinstance(result, (tuple, list))
+    for value in [result] if graph.single else result:
+        if isinstance(value, FixedPoint):
+            value = Tracer(graph, graph.add('const', (), value.qformat, value.value))
+        if not isinstance(value, Tracer) or value.graph is not graph:
+            raise TypeError(f'A traced model must return FixedPoint values, got {value!r}')
+        graph.outputs.append(value.node)
+    return graph
+
+
+def _fits(src: QFormat, dst: QFormat, rounding: str) -> bool:
+    """Check if every value of src rounded to the fractional bits of dst is in range of dst"""
+    # rounding up the largest value may carry into the next integer bit
+    carry = dst.n < src.n and rounding not in ('floor', 'trunc')
+    return dst.m >= src.m + carry
+
+
+def _raises(node: Node) -> bool:
+    """Check if a node is a requantization which may raise ValueError"""
+    if node.op != 'requant':
+        return False
+    src, rounding, overflow, _ = node.params
+    return (overflow == 'error' and not _fits(src, node.qformat, rounding)) or \
+        (rounding == 'exact' and src.n > node.qformat.n)
+
+
+def _merge(outer: tuple, dst: QFormat, inner: tuple, mid: QFormat) -> tuple | None:
+    """Parameters of one requantization equal to inner followed by outer, or None
+
+    inner converts src to mid, outer converts its source, mid or a relabel
+    of mid with the same width, to dst
+    """
+    src, inner_rounding, inner_overflow, inner_rng = inner
+    outer_src, rounding, overflow, rng = outer
+    if inner_rng is not None or not (inner_overflow is None or _fits(src, mid, inner_rounding)):
+        return None
+    # right shifts of the scaled integers
+    inner_shift = src.n - mid.n
+    outer_shift = outer_src.n - dst.n
+    if inner_shift > 0 and not (inner_rounding == rounding and rounding in _NESTING
+                                and outer_shift >= 0):
+        return None
+    # a left shift does not change the value, two roundings toward the same side nest
+    n = dst.n + inner_shift + outer_shift
+    return QFormat(src.bits - n, n), rounding, overflow, rng
+
+
+class Kernel:
+    """Compiled graph running on arrays of scaled integers
+
+    Compilation merges requantizations following each other where the
+    result is the same, e.g. a truncation after a truncation or a
+    conversion to a wider format, skips range checks which can not fail,
+    drops requantizations which do not change the scaled integers and
+    drops unused operations. The kernel then executes the remaining integer
+    operations on NumPy arrays, int64 where the exact intermediate results
+    fit and Python integers otherwise. Intermediate arrays are released
+    after their last use. Instrumentation only records the requantizations
+    left after the merge.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.inputs = [graph.nodes[i].qformat for i in graph.inputs]
+        self.outputs = [graph.nodes[i].qformat for i in graph.outputs]
+        nodes = [Node(node.op, node.args, node.qformat, node.params) for node in graph.nodes]
+        self.merged = self._optimize(nodes, graph.outputs)
+        self.consts: Dict[int, np.ndarray] = {}
+        self.steps: List[Tuple[int, Node, List[int]]] = []
+        self._schedule(nodes, graph)
+
+    @staticmethod
+    def _optimize(nodes: List[Node], outputs: List[int]) -> int:
+        """Merge and drop requantizations in place, return the number of removed ones"""
+        uses = [0] * len(nodes)
+        for node in nodes:
+            for arg in node.args:
+                uses[arg] += 1
+        for i in outputs:
+            uses[i] += 1
+        removed = 0
+        for node in nodes:
+            if node.op != 'requant':
+                continue
+            inner = nodes[node.args[0]]
+            while inner.op == 'requant' and uses[node.args[0]] == 1:
+                params = _merge(node.params, node.qformat, inner.params, inner.qformat)
+                if params is None:
+                    break
+                uses[node.args[0]] = 0
+                node.args, node.params = inner.args, params
+                inner = nodes[node.args[0]]
+                removed += 1
+        alias = list(range(len(nodes)))
+        for i, node in enumerate(nodes):
+            node.args = tuple(alias[arg] for arg in node.args)
+            if node.op != 'requant':
+                continue
+            src, rounding, overflow, rng = node.params
+            if overflow is not None and _fits(src, node.qformat, rounding):
+                overflow = None
+                node.params = src, rounding, overflow, rng
+            if src.n == node.qformat.n and overflow is None and i not in outputs:
+                # same scaled integers, only the label of the format changes
+                alias[i] = node.args[0]
+                removed += 1
+        return removed
+
+    def _schedule(self, nodes: List[Node], graph: Graph):
+        """List the steps needed for the outputs"""
+        # requantizations which may raise are kept like in the scalar model
+        needed = set(graph.outputs) | {i for i, node in enumerate(nodes) if _raises(node)}
+        for i in range(len(nodes) - 1, -1, -1):
+            if i in needed:
+                needed.update(nodes[i].args)
+        last_use: Dict[int, int] = {}
+        for i in sorted(needed):
+            node = nodes[i]
+            if node.op == 'input':
+                continue
+            if node.op == 'const':
+                self.consts[i] = np.asarray(node.params, dtype=storage_dtype(node.qformat.bits))
+            else:
+                self.steps.append((i, node, [nodes[arg] for arg in node.args]))
+                last_use[i] = len(self.steps) - 1
+                for arg in node.args:
+                    last_use[arg] = len(self.steps) - 1
+        for i in graph.outputs:
+            last_use[i] = len(self.steps)
+        self._free = [[arg for arg, step in last_use.items() if step == k]
+                      for k in range(len(self.steps))]
+
+    def report(self) -> str:
+        """Steps of the kernel as text"""
+        lines = [f'inputs {", ".join(q.fmt for q in self.inputs)}, constants {len(self.consts)}, '
+                 f'merged {self.merged}']
+        for i, node, _ in self.steps:
+            params = node.params
+            if node.op == 'requant':
+                params = f'{params[0]} -> {node.qformat} {params[1]} {params[2]}'
+            elif node.op != 'shl':
+                params = node.qformat
+            lines.append(f"{i:<6}{node.op:<9}{','.join(map(str, node.args)):<12}{params}")
+        return '\n'.join(lines)
+
+    def _inputs(self, args: tuple) -> Dict[int, np.ndarray]:
+        """Scaled integers of the constants and the arguments by node"""
+        if len(args) != len(self.inputs):
+            raise TypeError(f'The kernel takes {len(self.inputs)} arguments, got {len(args)}')
+        values: Dict[int, np.ndarray] = dict(self.consts)
+        for i, arg, qformat in zip(self.graph.inputs, args, self.inputs):
+            if isinstance(arg, (FixedPointArray, FixedPoint)):
+                if arg.qformat != qformat:
+                    arg = arg.to(qformat)
+                values[i] = np.asarray(arg.raw if isinstance(arg, FixedPointArray) else arg.value,
+                                       dtype=storage_dtype(qformat.bits))
+            else:
+                values[i] = FixedPointArray(arg, qformat).raw
+        return values
+
+    def __call__(self, *args):
+        """Run the kernel
+
+        Parameters
+        ----------
+        args
+            FixedPointArray, FixedPoint or array-like of numbers per input,
+            converted to the input format if needed. Shapes are broadcast.
+
+        Returns
+        -------
+            FixedPointArray or tuple of FixedPointArray like the model
+        """
+        values = self._inputs(args)
+        shape = np.broadcast_shapes(*(values[i].shape for i in self.graph.inputs))
+        for (i, node, arg_nodes), free in zip(self.steps, self._free):
+            values[i] = _execute(node, arg_nodes, [values[arg] for arg in node.args])
+            for arg in free:
+                if arg not in self.consts:
+                    del values[arg]
+        results = []
+        for i, qformat in zip(self.graph.outputs, self.outputs):
+            raw = values[i]
+            if raw.shape != shape:
+                raw = np.broadcast_to(raw, shape).copy()
+            elif self.graph.nodes[i].op == 'input':
+                raw = raw.copy()
+            results.append(FixedPointArray.from_raw(_widen(raw, qformat.bits), qformat,
+                                                    check=False))
+        return results[0] if self.graph.single else tuple(results)
+
+
+def _execute(node: Node, arg_nodes: List[Node], args: List[np.ndarray]) -> np.ndarray:
+    """Integer operation of a node on arrays of scaled integers"""
+    qformat = node.qformat
+    if node.op in ('add', 'sub'):
+        a, b = (_widen(x, qformat.bits) << (qformat.n - x_node.qformat.n)
+                for x, x_node in zip(args, arg_nodes))
+        return a + b if node.op == 'add' else a - b
+    if node.op == 'mul':
+        return _widen(args[0], qformat.bits) * _widen(args[1], qformat.bits)
+    if node.op == 'neg':
+        return -_widen(args[0], qformat.bits)
+    if node.op == 'abs':
+        return np.abs(_widen(args[0], qformat.bits))
+    if node.op == 'shl':
+        return _widen(args[0], qformat.bits) << node.params
+    return _requant(node, args[0])
+
+
+def _requant(node: Node, x: np.ndarray) -> np.ndarray:
+    """Requantization of a node, without range check if the overflow mode is None"""
+    qformat = node.qformat
+    src, rounding, overflow, rng = node.params
+    if overflow is not None:
+        return requantize(x, src, qformat, rounding, overflow, rng=rng)
+    shift = src.n - qformat.n
+    x = _widen(x, src.bits + max(-shift, 0))
+    x = _round(x, shift, rounding, rng) if shift > 0 else x << -shift
+    return _widen(x, qformat.bits)
+
+
+class Fused:
+    """Model running on FixedPoint scalars or, compiled, on arrays
+
+    Calls with FixedPoint or number arguments run the Python function,
+    calls with array arguments run the kernel compiled for the active
+    context.
+    """
+
+    def __init__(self, func: Callable, formats: tuple):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.formats = formats
+        self._kernels: Dict[tuple, Kernel] = {}
+
+    def kernel(self) -> Kernel:
+        """Kernel for the active context, traced and compiled on first use"""
+        ctx = getcontext()
+        key = (str(ctx.growth), ctx.rounding, ctx.overflow)
+        if key not in self._kernels:
+            self._kernels[key] = trace(self.func, *self.formats).compile()
+        return self._kernels[key]
+
+    def __call__(self, *args):
+        if any(isinstance(arg, (FixedPointArray, np.ndarray, list, tuple)) for arg in args):
+            return self.kernel()(*args)
+        return self.func(*args)
+
+
+def fuse(*formats: str | QFormat) -> Callable[[Callable], Fused]:
+    """Decorator for a model with arguments of the given formats, see Fused"""
+    def decorator(func: Callable) -> Fused:
+        return Fused(func, formats)
+    return decorator
@@ -0,0 +1,283 @@
+"""Bit-true fixed point FFT
+
+The transform is an iterative decimation in time FFT with radix-2 or
+radix-4 stages on the real and imaginary parts as FixedPointArray.
+Twiddle factors are quantized to their own format. Each complex product
+is computed exactly and rounded once to the data format, and the
+butterfly outputs are scaled and saturated according to the schedule.
+Leading axes are independent frames, all frames are transformed at once.
+
+    >>> from fixedpoint import FFT, FixedPointArray
+    >>> fft = FFT(8, 'Q1.15', scaling='shift')
+    >>> re, im, exponent = fft.process(FixedPointArray([0.5] * 8, 'Q1.15'))
+    >>> re.to_float() * 2.0 ** exponent
+    array([4., 0., 0., 0., 0., 0., 0., 0.])
+"""
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+import numpy as np
+from .array import FixedPointArray
+from .format import QFormat, as_qformat
+from .requantize import _overflow, _round
+
+SCALINGS = ('shift', 'none', 'bfp')
+
+
+def _digit_reversal(index: np.ndarray, radices: Sequence[int]) -> np.ndarray:
+    """Input order for decimation in time with the given stage radices"""
+    if not radices:
+        return index
+    radix = radices[-1]
+    return np.concatenate([_digit_reversal(index[r::radix], radices[:-1])
+                           for r in range(radix)])
+
+
+def _schedule(scaling: str | Sequence[int], radices: List[int],
+              qformat: QFormat) -> Tuple[List[int] | None, List[QFormat]]:
+    """Shifts and data formats of the stages"""
+    growth = [r.bit_length() - 1 for r in radices]
+    if isinstance(scaling, str):
+        if scaling not in SCALINGS:
+            raise ValueError(f'Invalid scaling {scaling} given.')
+        if scaling == 'bfp':
+            return None, [QFormat(qformat.m + max(growth) + 1, qformat.n)] * len(growth)
+        shifts = growth if scaling == 'shift' else [0] * len(growth)
+    else:
+        shifts = list(scaling)
+        if len(shifts) != len(growth):
+            raise ValueError(f'Expected {len(growth)} shifts, got {len(shifts)}')
+    formats = []
+    m = qformat.m + 1
+    for grow, shift in zip(growth, shifts):
+        m += grow - shift
+        formats.append(QFormat(m, qformat.n))
+    return shifts, formats
+
+
+class FFT:  # pylint: disable=too-many-instance-attributes
+    """Fixed point FFT or IFFT of a fixed size
+
+    Stage j combines `radix` transforms of length L into one of length
+    radix * L. Its exact output grows by log2(radix) integer bits, the
+    schedule removes some of them again by shifting right:
+
+        shift: log2(radix) bits every stage, the output is DFT / size
+        none: no shift, the format grows up to Q(m+1+log2(size)).n
+        bfp: block floating point, before each stage every frame is
+            shifted so that its largest value leaves log2(radix)+1 bits
+            of headroom in the fixed data format Q(m+h).n
+        sequence of int: the number of bits to shift after each stage
+
+    The data formats start with one extra integer bit, complex rotation
+    by the twiddle factors can grow a part by sqrt(2). Results out of the
+    stage format are saturated or handled as given by overflow.
+
+    Attributes
+    ----------
+    radices
+        Radix of each stage, radix-4 transforms of odd log2(size) start with a radix-2 stage
+    shifts
+        Bits shifted after each stage, None for block floating point
+    stage_formats
+        Data format after each stage
+    out_fmt
+        Format of the result
+    """
+
+    def __init__(self, size: int,  # pylint: disable=too-many-arguments
+                 input_fmt: str | QFormat, twiddle_fmt: str | QFormat = 'Q2.16', *,
+                 scaling: str | Sequence[int] = 'shift', radix: int = 2,
+                 inverse: bool = False, rounding: str = 'trunc', overflow: str = 'saturate'):
+        """FFT
+
+        Parameters
+        ----------
+        size
+            Transform length, a power of two
+        input_fmt
+            Qm.n format string or QFormat of the real and imaginary parts
+        twiddle_fmt
+            Format of the quantized twiddle factors, should hold 1.0
+        scaling
+            'shift', 'none', 'bfp' or the number of bits to shift after each stage
+        radix
+            2 or 4
+        inverse
+            Compute the inverse transform, without the factor 1/size
+        rounding
+            Rounding mode of the products and shifts, see requantize
+        overflow
+            Overflow mode for values out of the stage format, see requantize
+        """
+        if size < 2 or size & (size - 1):
+            raise ValueError(f'Size {size} is not a power of two')
+        if radix not in (2, 4):
+            raise ValueError(f'Radix {radix} is not supported')
+        self.size = size
+        self.input_fmt = as_qformat(input_fmt)
+        self.twiddle_fmt = as_qformat(twiddle_fmt)
+        self.inverse = inverse
+        self.rounding = rounding
+        self.overflow = overflow
+        stages = size.bit_length() - 1
+        self.radices: List[int] = [2] * stages
+        if radix == 4:
+            self.radices = [2] * (stages % 2) + [4] * (stages // 2)
+        self.shifts, self.stage_formats = _schedule(scaling, self.radices, self.input_fmt)
+        self.out_fmt = self.stage_formats[-1]
+        widest = max(f.bits for f in self.stage_formats) + 3
+        self._dtype = np.dtype(np.int64 if widest + self.twiddle_fmt.bits <= 62 else object)
+        self._order = _digit_reversal(np.arange(size), self.radices)
+        self._twiddles = [self._stage_twiddles(r, length) for r, length in
+                          zip(self.radices, np.cumprod([1] + self.radices[:-1]).tolist())]
+
+    def _stage_twiddles(self, radix: int, length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Quantized W^(r*k) for r in 1..radix-1 and k < length, rounded to nearest"""
+        sign = 1 if self.inverse else -1
+        step = sign * 2 * np.pi / (radix * length)
+        angle = np.outer(np.arange(1, radix), np.arange(length)) * step
+        fmt = self.twiddle_fmt
+        parts = []
+        for part in (np.cos(angle), np.sin(angle)):
+            raw = np.clip(np.round(part * fmt.scale), fmt.min_raw, fmt.max_raw)
+            parts.append(raw.astype(np.int64).astype(self._dtype))
+        return parts[0], parts[1]
+
+    def report(self) -> str:
+        """Radix, shift and data format of each stage as text table"""
+        lines = [f"{'stage':<7}{'radix':>6}{'shift':>7}  format"]
+        for j, (radix, fmt) in enumerate(zip(self.radices, self.stage_formats)):
+            shift = 'bfp' if self.shifts is None else str(self.shifts[j])
+            lines.append(f'{j:<7}{radix:>6}{shift:>7}  {fmt}')
+        return '\n'.join(lines)
+
+    def process(self, re, im=None) -> Tuple[FixedPointArray, FixedPointArray, np.ndarray]:
+        """Transform frames along the last axis
+
+        Parameters
+        ----------
+        re, im
+            Real and imaginary parts, FixedPointArray or array-like of
+            numerical values converted to the input format. im defaults to zero.
+
+        Returns
+        -------
+        re, im
+            FixedPointArray of the result in out_fmt
+        exponent
+            Integer array with one entry per frame, the transform is
+            (re + 1j * im) * 2**exponent
+        """
+        xr = self._input(re)
+        xi = np.zeros_like(xr) if im is None else self._input(im)
+        if xr.shape != xi.shape:
+            raise ValueError(f'Shapes {xr.shape} and {xi.shape} do not match')
+        shape = xr.shape
+        xr = xr.reshape(-1, self.size)[:, self._order]
+        xi = xi.reshape(-1, self.size)[:, self._order]
+        exponent = np.zeros(xr.shape[0], dtype=np.int64)
+        length = 1
+        for j, radix in enumerate(self.radices):
+            fmt = self.stage_formats[j]
+            if self.shifts is None:
+                xr, xi, shift = self._block_scale(xr, xi, fmt, radix)
+                exponent += shift
+            xr, xi = self._stage(xr, xi, radix, length, j)
+            if self.shifts:
+                exponent += self.shifts[j]
+                xr, xi = self._shift(xr, self.shifts[j]), self._shift(xi, self.shifts[j])
+            xr, xi = _overflow(xr, fmt, self.overflow), _overflow(xi, fmt, self.overflow)
+            length *= radix
+        return (FixedPointArray.from_raw(xr.reshape(shape), self.out_fmt, check=False),
+                FixedPointArray.from_raw(xi.reshape(shape), self.out_fmt, check=False),
+                exponent.reshape(shape[:-1]))
+
+    def _input(self, x) -> np.ndarray:
+        """Raw integers of a frame in the working type"""
+        if not isinstance(x, FixedPointArray):
+            x = FixedPointArray(x, self.input_fmt)
+        elif x.qformat != self.input_fmt:
+            x = x.to(self.input_fmt)
+        if x.shape[-1:] != (self.size,):
+            raise ValueError(f'Frames of length {self.size} expected, got shape {x.shape}')
+        return x.raw.astype(self._dtype)
+
+    def _shift(self, x: np.ndarray, shift: int) -> np.ndarray:
+        """Divide by 2**shift with the rounding mode"""
+        if shift <= 0:
+            return x << -shift
+        return _round(x, shift, self.rounding, None)
+
+    def _block_scale(self, xr: np.ndarray, xi: np.ndarray, fmt: QFormat,
+                     radix: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Shift each frame to leave log2(radix)+1 bits of headroom, returns the shifts"""
+        largest = np.maximum(np.max(np.abs(xr), axis=1), np.max(np.abs(xi), axis=1))
+        bits = np.array([int(v).bit_length() for v in largest], dtype=np.int64)
+        shift = np.maximum(bits - (fmt.bits - 1 - radix.bit_length()), 0)
+        for k in np.unique(shift[shift > 0]).tolist():
+            rows = shift == k
+            xr[rows] = self._shift(xr[rows], k)
+            xi[rows] = self._shift(xi[rows], k)
+        return xr, xi, shift
+
+    def _stage(self, xr: np.ndarray, xi: np.ndarray, radix: int, length: int,
+               j: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Combine radix transforms of the given length, exact except the products"""
+        frames = xr.shape[0]
+        xr = xr.reshape(frames, -1, radix, length)
+        xi = xi.reshape(frames, -1, radix, length)
+        wr, wi = self._twiddles[j]
+        tr, ti = [xr[:, :, 0]], [xi[:, :, 0]]
+        for r in range(1, radix):
+            # complex product, rounded once to the data format
+            tr.append(self._shift(xr[:, :, r] * wr[r - 1] - xi[:, :, r] * wi[r - 1],
+                                  self.twiddle_fmt.n))
+            ti.append(self._shift(xr[:, :, r] * wi[r - 1] + xi[:, :, r] * wr[r - 1],
+                                  self.twiddle_fmt.n))
+        if radix == 2:
+            yr, yi = [tr[0] + tr[1], tr[0] - tr[1]], [ti[0] + ti[1], ti[0] - ti[1]]
+        else:
+            yr, yi = _butterfly4(tr, ti, self.inverse)
+        return (np.stack(yr, axis=2).reshape(frames, -1),
+                np.stack(yi, axis=2).reshape(frames, -1))
+
+
+def _butterfly4(tr: List[np.ndarray], ti: List[np.ndarray],
+                inverse: bool) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Radix-4 butterfly on the rotated inputs"""
+    # (t1 - t3) times -j for the forward and times +j for the inverse transform
+    if inverse:
+        sr, si = ti[3] - ti[1], tr[1] - tr[3]
+    else:
+        sr, si = ti[1] - ti[3], tr[3] - tr[1]
+    ar, ai = tr[0] + tr[2], ti[0] + ti[2]
+    br, bi = tr[0] - tr[2], ti[0] - ti[2]
+    cr, ci = tr[1] + tr[3], ti[1] + ti[3]
+    return [ar + cr, br + sr, ar - cr, br - sr], [ai + ci, bi + si, ai - ci, bi - si]
+
+
+def fft(re, im=None, input_fmt: str | QFormat | None = None,
+        **kwargs) -> Tuple[FixedPointArray, FixedPointArray, np.ndarray]:
+    """FFT along the last axis, see FFT for the keyword arguments
+
+    Parameters
+    ----------
+    re, im
+        Real and imaginary parts, FixedPointArray or array-like with input_fmt
+    input_fmt
+        Input format, default is the format of re
+
+    Returns
+    -------
+        re, im and exponent, see FFT.process
+    """
+    if input_fmt is None:
+        input_fmt = re.qformat
+    return FFT(np.shape(re.raw if isinstance(re, FixedPointArray) else re)[-1],
+               input_fmt, **kwargs).process(re, im)
+
+
+def ifft(re, im=None, input_fmt: str | QFormat | None = None,
+         **kwargs) -> Tuple[FixedPointArray, FixedPointArray, np.ndarray]:
+    """Inverse FFT along the last axis, see fft"""
+    return fft(re, im, input_fmt, inverse=True, **kwargs)
@@ -0,0 +1,97 @@
+"""Tests for RangeAnalyzer"""
+import math
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPointArray, QFormat, RangeAnalyzer, iter_chunks, recommend_format
+from fixedpoint import requantize
+
+
+def test_statistics():
+    """Test streaming statistics equal the statistics of the whole signal"""
+    rng = np.random.default_rng(0)
+    x = np.concatenate((rng.normal(0, 3, 10000), [0, 0, np.nan, np.inf]))
+    whole = RangeAnalyzer().update(x)
+    pieces = RangeAnalyzer(chunk=1000)
+    for start in range(0, x.size, 777):
+        pieces.update(x[start:start + 777])
+    finite = x[np.isfinite(x)]
+    for analyzer in (whole, pieces):
+        assert analyzer.count == 10002
+        assert analyzer.invalid == 2
+        assert analyzer.zeros == 2
+        assert analyzer.min == finite.min()
+        assert analyzer.max == finite.max()
+        assert math.isclose(analyzer.rms, np.sqrt(np.mean(finite ** 2)))
+    assert np.array_equal(np.concatenate(whole.histogram()), np.concatenate(pieces.histogram()))
+    assert math.isclose(whole.overflow_probability(3), np.mean(np.abs(finite) >= 4))
+    merged = RangeAnalyzer().update(x[:5000]).merge(RangeAnalyzer().update(x[5000:]))
+    assert merged.frac_bits() == whole.frac_bits()
+    assert merged.recommend(1e-3, 40) == whole.recommend(1e-3, 40)
+
+
+def test_histogram():
+    """Test the magnitude bins of positive and negative values and powers of two"""
+    analyzer = RangeAnalyzer().update([1.0, 1.5, -1.0, -1.5, -2.0, 0.25, 3.0])
+    exponents, positive, negative = analyzer.histogram()
+    assert exponents.tolist() == [-2, -1, 0, 1]
+    assert positive.tolist() == [1, 0, 2, 1]
+    assert negative.tolist() == [0, 1, 2, 0]
+    assert analyzer.frac_bits() == 2
+
+
+def test_lossless():
+    """Test the exact format of fixed and float samples"""
+    rng = np.random.default_rng(1)
+    x = FixedPointArray.from_raw(rng.integers(-512, 512, 10000), 'Q4.6')
+    assert RangeAnalyzer().update(x).recommend() == QFormat(4, 6)
+    assert RangeAnalyzer().update(x.to_float()).recommend() == QFormat(4, 6)
+    assert recommend_format(iter_chunks(x, 100)) == QFormat(4, 6)
+    wide = FixedPointArray.from_raw(np.array([1 << 90, -(1 << 90)], dtype=object), 'Q100.20')
+    assert RangeAnalyzer().update(wide).recommend(max_bits=200) == QFormat(72, 0)
+    assert RangeAnalyzer().update([-1.0]).recommend() == QFormat(1, 0)
+    assert RangeAnalyzer().update([-1.0, 0.5]).recommend() == QFormat(1, 1)
+    assert RangeAnalyzer().update([1.0]).recommend() == QFormat(2, 0)
+    assert RangeAnalyzer().update([0.125, -0.0625]).recommend() == QFormat(-1, 4)
+
+
+def test_overflow():
+    """Test integer bits for an allowed overflow probability"""
+    rng = np.random.default_rng(2)
+    analyzer = RangeAnalyzer().update(rng.normal(0, 1, 100000))
+    assert analyzer.recommend(sqnr=40).m == 4
+    assert analyzer.recommend(overflow=1e-3, sqnr=40).m == 3
+    assert analyzer.recommend(overflow=0.1, sqnr=40).m == 2
+    # the maximum must not exceed the largest value of the format
+    analyzer = RangeAnalyzer().update([0.99999])
+    assert analyzer.recommend(sqnr=10) == QFormat(2, 1)
+    assert analyzer.recommend(sqnr=10, rounding='half_up') == QFormat(2, 0)
+    data = [0.9999, -0.5, 0.25]
+    for rounding in ('trunc', 'floor', 'half_even', 'ceil'):
+        qformat = RangeAnalyzer().update(data).recommend(sqnr=40, rounding=rounding)
+        assert FixedPointArray(data, qformat).to_float().max() <= qformat.maxval
+
+
+def test_sqnr():
+    """Test the SQNR estimate against the quantized signal"""
+    x = 0.9 * np.sin(2 * np.pi * 0.01234567 * np.arange(100000))
+    analyzer = RangeAnalyzer().update(x)
+    raw = FixedPointArray(x, 'Q1.40').raw
+    for rounding in ('trunc', 'half_even', 'stochastic'):
+        qformat = analyzer.recommend(sqnr=60, rounding=rounding)
+        assert analyzer.sqnr(qformat.n, rounding) >= 60 > analyzer.sqnr(qformat.n - 1, rounding)
+        y = requantize(raw, 'Q1.40', qformat, rounding, 'saturate') / qformat.scale
+        measured = 10 * np.log10(np.mean(x ** 2) / np.mean((y - x) ** 2))
+        assert abs(measured - analyzer.sqnr(qformat.n, rounding)) < 0.5
+    assert analyzer.sqnr(analyzer.frac_bits()) == math.inf
+
+
+def test_invalid():
+    """Test errors"""
+    with raises(ValueError):
+        RangeAnalyzer().recommend()
+    with raises(ValueError):
+        RangeAnalyzer().update([1e10, 1e-10]).recommend()
+    with raises(ValueError):
+        RangeAnalyzer().update([1.0]).recommend(rounding='nearest')
+    with raises(ValueError):
+        RangeAnalyzer().update([1.0]).recommend(sqnr=40, rounding='exact')
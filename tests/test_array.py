@@ -0,0 +1,256 @@
+"""Tests for FixedPointArray class"""
+import operator
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, localcontext, requantize
+
+
+def test_instantiate():
+    """Test values stored as scaled integers"""
+    a = FixedPointArray([1, -0.5, 0.25], 'Q4.2')
+    assert a.raw.tolist() == [4, -2, 1]
+    assert a.m == 4
+    assert a.n == 2
+
+
+def test_instantiate_invalid():
+    """Test values out of range"""
+    with raises(ValueError):
+        FixedPointArray([1.5, 8], 'Q4.2')
+
+
+def test_from_raw():
+    """Test creation from scaled integers"""
+    a = FixedPointArray.from_raw([4, -2], 'Q4.2')
+    assert a.to_float().tolist() == [1.0, -0.5]
+    with raises(ValueError):
+        FixedPointArray.from_raw([32], 'Q4.2')
+
+
+def test_getitem():
+    """Test indexing returns FixedPoint scalars and slicing arrays"""
+    a = FixedPointArray([1, -0.5, 0.25], 'Q4.2')
+    assert isinstance(a[1], FixedPoint)
+    assert a[1] == FixedPoint(-0.5, 'Q4.2')
+    b = a[1:]
+    assert isinstance(b, FixedPointArray)
+    assert (b == FixedPointArray([-0.5, 0.25], 'Q4.2')).all()
+
+
+def test_repr():
+    """Test __repr__ method"""
+    a = FixedPointArray([1, 0.5], 'Q2.1')
+    assert repr(a) == "FixedPointArray([1.0, 0.5], 'Q2.1')"
+
+
+def test_add():
+    """Test format growth matches FixedPoint.__add__"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    b = FixedPointArray([0.5, 0.5], 'Q4.2')
+    c = a + b
+    assert c.fmt == 'Q7.4'
+    assert c.to_float().tolist() == [2.0, -1.75]
+
+
+def test_sub():
+    """Test format growth matches FixedPoint.__sub__"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    c = a - FixedPoint(0.5, 'Q4.2')
+    assert c.fmt == 'Q7.4'
+    assert c.to_float().tolist() == [1.0, -2.75]
+
+
+def test_mul():
+    """Test format growth matches FixedPoint.__mul__"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    b = FixedPointArray([0.5, -1], 'Q4.2')
+    c = a * b
+    assert c.fmt == 'Q10.4'
+    assert c.to_float().tolist() == [0.75, 2.25]
+
+
+def test_number_operands():
+    """Test operations with numbers keep the format"""
+    a = FixedPointArray([1, -2], 'Q4.2')
+    assert (a + 1).to_float().tolist() == [2.0, -1.0]
+    assert (1 - a).to_float().tolist() == [0.0, 3.0]
+    assert (a * 0.5).to_float().tolist() == [0.5, -1.0]
+    assert (a + 0.3).fmt == 'Q4.2'
+    with raises(ValueError):
+        _ = a + 8
+
+
+def test_add_wide_number():
+    """Test integers are added exactly and wide sums do not wrap"""
+    a = FixedPointArray.from_raw([0, -7], 'Q62.0')
+    assert (a + (2 ** 55 + 1)).raw.tolist() == [2 ** 55 + 1, 2 ** 55 - 6]
+    assert (a - np.array([2 ** 40 + 1, 1])).raw.tolist() == [-2 ** 40 - 1, -8]
+    b = FixedPointArray.from_raw([2 ** 63 - 1], 'Q64.0')
+    with raises(ValueError):
+        _ = b + 2.0 ** 61
+    with raises(ValueError):
+        _ = b + 1
+    assert (b - 2.0 ** 61).raw.tolist() == [2 ** 63 - 1 - 2 ** 61]
+
+
+def test_mul_wide_number():
+    """Test large power of two multipliers do not wrap the int64 product"""
+    a = FixedPointArray.from_raw([3, -2 ** 40], 'Q62.0')
+    assert (a * 2.0 ** 20).raw.tolist() == [3 << 20, -2 ** 60]
+    with raises(ValueError):
+        _ = FixedPointArray.from_raw([2 ** 45], 'Q50.0') * 1048576.0
+    with raises(ValueError):
+        _ = FixedPointArray([2 ** 25], 'Q30.0') * 2.0 ** 40
+
+
+def test_scalar_match():
+    """Test elementwise results are identical to FixedPoint"""
+    rng = np.random.default_rng(1)
+    x = rng.uniform(-8, 8, 100)
+    y = rng.uniform(-4, 4, 100)
+    a = FixedPointArray(x, 'Q5.6')
+    b = FixedPointArray(y, 'Q4.3')
+    for op in (operator.add, operator.sub, operator.mul):
+        c = op(a, b)
+        for i in range(100):
+            fp = op(FixedPoint(x[i], 'Q5.6'), FixedPoint(y[i], 'Q4.3'))
+            assert c[i].fmt == fp.fmt
+            assert c[i].value == fp.value
+
+
+def test_divide():
+    """Test division operators and ufuncs give the bits of the scalar operators"""
+    rng = np.random.default_rng(1)
+    a = FixedPointArray(rng.uniform(-7, 7, 200), 'Q4.8')
+    b = FixedPointArray(rng.uniform(0.2, 3, 200) * rng.choice([-1, 1], 200), 'Q3.5')
+    wide = FixedPointArray(rng.uniform(-1e6, 1e6, 200), 'Q30.40')
+    ops = (operator.truediv, operator.floordiv, operator.mod,
+           lambda x, y: x / 3, lambda x, y: x // -2.5, lambda x, y: 2.5 % y)
+    for kwargs in ({}, {'growth': 'keep', 'rounding': 'half_even', 'overflow': 'saturate'}):
+        with localcontext(**kwargs):
+            for x in (a, wide):
+                for op in ops:
+                    result = op(x, b)
+                    expected = [op(u, v) for u, v in zip(x, b)]
+                    assert result.qformat == expected[0].qformat
+                    assert result.raw.tolist() == [e.value for e in expected]
+    quot, rem = np.divmod(a, b)
+    assert np.array_equal(quot.raw, (a // b).raw)
+    assert np.array_equal(rem.raw, (a % b).raw)
+    assert np.true_divide(FixedPoint(1, 'Q4.8'), b).raw.tolist() == \
+        [(FixedPoint(1, 'Q4.8') / v).value for v in b]
+    with raises(ZeroDivisionError):
+        _ = a / FixedPointArray([0], 'Q2.2')
+
+
+def test_compare():
+    """Test elementwise comparison"""
+    a = FixedPointArray([1, -2], 'Q4.2')
+    b = FixedPointArray([1, 2], 'Q4.4')
+    assert (a == b).tolist() == [True, False]
+    assert (a < b).tolist() == [False, True]
+    assert (a >= 0).tolist() == [True, False]
+
+
+def test_to():
+    """Test coercion to new format"""
+    a = FixedPointArray([1.75, -1.75], 'Q4.2')
+    assert a.to('Q4.1', 'round').to_float().tolist() == [1.5, -1.5]
+    assert a.to('Q2.2', 'fit').to_float().tolist() == [1.75, -1.75]
+    assert a.to('Q1.2', 'fit').to_float().tolist() == [0.75, -1.0]
+    with raises(ValueError):
+        a.to('Q4.1')
+
+
+def test_storage():
+    """Test smallest storage type is picked for the format width"""
+    assert FixedPointArray([1], 'Q4.4').raw.dtype == np.int8
+    assert FixedPointArray([1], 'Q4.12').raw.dtype == np.int16
+    assert FixedPointArray([1], 'Q16.16').raw.dtype == np.int32
+    assert FixedPointArray([1], 'Q32.32').raw.dtype == np.int64
+    assert FixedPointArray([1], 'Q64.64').raw.dtype == object
+
+
+def test_storage_growth():
+    """Test results use a wider storage type if needed"""
+    a = FixedPointArray([-8, 7.9375], 'Q4.4')
+    c = a * a
+    assert c.fmt == 'Q8.4'
+    assert c.raw.dtype == np.int16
+    assert c.to_float().tolist() == [64.0, 63.0]
+    with raises(ValueError):
+        _ = -a
+
+
+def test_wide():
+    """Test wide formats are bit exact"""
+    a = FixedPointArray.from_raw([2 ** 100 + 1, -5], 'Q60.60')
+    b = FixedPointArray.from_raw([-(2 ** 90) + 3, 7], 'Q40.60')
+    c = a * b
+    assert c.fmt == 'Q100.60'
+    for i in range(2):
+        fp = FixedPoint.from_raw(int(a.raw[i]), 'Q60.60') * FixedPoint.from_raw(int(b.raw[i]),
+                                                                               'Q40.60')
+        assert c[i].value == fp.value
+    assert (a + b)[0].value == 2 ** 100 + 1 - 2 ** 90 + 3
+
+
+def test_from_raw_no_copy():
+    """Test integer buffers wide enough for the format are not copied"""
+    x = np.array([1, 2, 3], dtype=np.int32)
+    a = FixedPointArray.from_raw(x, 'Q4.4')
+    assert a.raw is x
+
+
+def test_inplace():
+    """Test in-place operators keep the format and buffer of the target"""
+    a = FixedPointArray([1.5, -0.75, 0.25], 'Q4.4')
+    raw = a.raw
+    a += FixedPointArray([0.5, 0.5, 0.5], 'Q2.8')
+    assert a.raw is raw
+    assert a.fmt == 'Q4.4'
+    assert a.to_float().tolist() == [2.0, -0.25, 0.75]
+    a *= FixedPoint(-0.375, 'Q1.3')
+    assert a.to_float().tolist() == [-0.75, 0.0625, -0.25]
+    a -= 0.25
+    a <<= 2
+    a >>= 3
+    assert a.to_float().tolist() == [-0.5, -0.125, -0.25]
+    # the result must fit the target in the default context
+    with raises(ValueError):
+        a -= FixedPoint(7.75, 'Q4.4')
+    with localcontext(rounding='half_even', overflow='saturate'):
+        a *= 100
+        assert a.to_float().tolist() == [-8.0, -8.0, -8.0]
+    # overlapping operands are read before they are written
+    b = FixedPointArray(np.arange(8) / 8, 'Q4.4')
+    b[1:] += b[:-1]
+    assert b.raw.tolist() == [0, 2, 6, 10, 14, 18, 22, 26]
+
+
+def test_out():
+    """Test ufuncs, to and sum writing into preallocated arrays"""
+    rng = np.random.default_rng(0)
+    a = FixedPointArray(rng.uniform(-1, 0.99, (500, 300)), 'Q1.15')
+    b = FixedPointArray(rng.uniform(-2, 2, 300), 'Q2.10')
+    out = FixedPointArray(np.zeros((500, 300)), 'Q3.25')
+    assert np.multiply(a, b, out=out) is out
+    # the product is exact in the wider format
+    exact = a.raw.astype(np.int64) * b.raw
+    assert np.array_equal(out.raw, exact)
+    np.add(out, 0.5, out=out)
+    np.subtract(FixedPoint(1, 'Q2.0'), out, out=out)
+    assert np.array_equal(out.raw, (1 << 24) - exact)
+    with localcontext(rounding='half_up', overflow='wrap'):
+        small = FixedPointArray(np.zeros((500, 300)), 'Q1.3')
+        np.multiply(a, b, out=small)
+        assert np.array_equal(small.raw, requantize(exact, 'Q3.25', 'Q1.3', 'half_up', 'wrap'))
+    mask = np.zeros((500, 300), dtype=bool)
+    np.less(0.25, a, out=mask)
+    assert np.array_equal(mask, a > 0.25)
+    total = FixedPointArray(np.zeros(300), 'Q10.15')
+    assert np.array_equal(a.sum(axis=0, out=total).raw, a.sum(axis=0).to('Q10.15').raw)
+    with raises(TypeError):
+        np.negative(a, out=np.zeros((500, 300)))
+    with raises(ValueError):
+        a.to('Q4.4', 'round', out=small)
@@ -0,0 +1,69 @@
+"""Tests for memory-mapped capture files"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPointArray, load_capture, iter_chunks
+
+
+def test_load(tmp_path):
+    """Test samples are mapped without copy"""
+    path = tmp_path / 'capture.bin'
+    np.array([-32768, 16384, 1, 32767], dtype='<i2').tofile(path)
+    x = load_capture(path, 'Q1.15')
+    assert isinstance(x, FixedPointArray)
+    assert isinstance(x.raw.base, np.memmap)
+    assert x.to_float().tolist() == [-1.0, 0.5, 2 ** -15, 1 - 2 ** -15]
+    assert (x + x).fmt == 'Q2.15'
+
+
+def test_byteorder(tmp_path):
+    """Test big endian samples"""
+    path = tmp_path / 'capture.bin'
+    np.array([-2, 3, 100000], dtype='>i4').tofile(path)
+    x = load_capture(path, 'Q20.2', 'int32', byteorder='>')
+    assert x.to_float().tolist() == [-0.5, 0.75, 25000.0]
+
+
+def test_offset_stride(tmp_path):
+    """Test header and interleaved channels"""
+    path = tmp_path / 'capture.bin'
+    with open(path, 'wb') as f:
+        f.write(b'HEAD')
+        np.array([[1, -1], [2, -2], [3, -3]], dtype='<i2').tofile(f)
+    i = load_capture(path, 'Q12.4', 'int16', offset=4, stride=4)
+    q = load_capture(path, 'Q12.4', 'int16', offset=6, stride=4, count=2)
+    assert i.raw.tolist() == [1, 2, 3]
+    assert q.raw.tolist() == [-1, -2]
+    with raises(ValueError):
+        load_capture(path, 'Q12.4', 'int16', offset=6, stride=4, count=4)
+    with raises(ValueError):
+        load_capture(path, 'Q12.4', 'int8')
+
+
+def test_write(tmp_path):
+    """Test changes are written back in mode r+"""
+    path = tmp_path / 'capture.bin'
+    np.zeros(4, dtype=np.int8).tofile(path)
+    x = load_capture(path, 'Q4.4', mode='r+')
+    x[1] = 0.25
+    x.raw.base.flush()
+    assert np.fromfile(path, dtype=np.int8).tolist() == [0, 4, 0, 0]
+
+
+def test_chunks(tmp_path):
+    """Test chunked iteration and range check of narrow formats"""
+    path = tmp_path / 'capture.bin'
+    np.arange(10, dtype=np.int16).tofile(path)
+    chunks = list(iter_chunks(load_capture(path, 'Q5.0', 'int16'), 4))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert chunks[2].raw.tolist() == [8, 9]
+    x = load_capture(path, 'Q4.0', 'int16')
+    with raises(ValueError):
+        list(iter_chunks(x, 4))
+    assert len(list(iter_chunks(x, 4, check=False))) == 3
+
+
+def test_empty(tmp_path):
+    """Test empty file"""
+    path = tmp_path / 'capture.bin'
+    path.write_bytes(b'')
+    assert len(load_capture(path, 'Q1.15')) == 0
@@ -0,0 +1,95 @@
+"""Tests for the arithmetic context"""
+import asyncio
+import operator
+import threading
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, Context, getcontext, localcontext
+
+
+def test_default():
+    """Test default context keeps the growing formats"""
+    assert getcontext().default
+    assert (FixedPoint(1.5, 'Q2.2') + FixedPoint(1.5, 'Q2.2')).fmt == 'Q3.2'
+
+
+def test_keep():
+    """Test keep growth with saturation and rounding"""
+    a = FixedPoint(1.5, 'Q2.2')
+    with localcontext(growth='keep', rounding='half_even', overflow='saturate'):
+        assert float(a + a) == 1.75
+        assert (a + a).fmt == 'Q2.2'
+        assert float(a * FixedPoint(0.25, 'Q2.2')) == 0.5
+        assert float(-FixedPoint(-2, 'Q2.2')) == 1.75
+    with localcontext(growth='keep', overflow='wrap'):
+        assert float(a + a) == -1.0
+
+
+def test_fixed_format():
+    """Test all results in a fixed target format"""
+    with localcontext(growth='Q8.4', rounding='floor'):
+        c = FixedPoint(1.3, 'Q2.8') * FixedPoint(-1.1, 'Q2.8')
+        assert c.fmt == 'Q8.4'
+        assert float(c) == -1.4375
+        assert (FixedPoint(1.5, 'Q2.2') + 0.3).fmt == 'Q8.4'
+
+
+def test_error():
+    """Test overflow error and exact rounding"""
+    with localcontext(growth='keep'):
+        with raises(ValueError):
+            operator.add(FixedPoint(1.5, 'Q2.2'), FixedPoint(1.5, 'Q2.2'))
+    with localcontext(rounding='exact'):
+        with raises(ValueError):
+            operator.mul(FixedPoint(0.25, 'Q2.2'), 0.5)
+
+
+def test_array():
+    """Test array operators follow the context"""
+    a = FixedPointArray([1.5, -0.75], 'Q2.2')
+    with localcontext(growth='keep', overflow='saturate', rounding='half_up'):
+        assert (a + a).to_float().tolist() == [1.75, -1.5]
+        assert (a * 0.5).to_float().tolist() == [0.75, -0.25]
+        assert (a * FixedPoint(0.5, 'Q2.2')).fmt == 'Q2.2'
+
+
+def test_nesting():
+    """Test contexts are restored on exit"""
+    with localcontext(growth='keep') as outer:
+        with localcontext(overflow='wrap') as inner:
+            assert inner.growth == 'keep'
+            assert getcontext() is inner
+        assert getcontext() is outer
+    assert getcontext().default
+
+
+def test_thread_local():
+    """Test a context does not leak into other threads"""
+    seen = []
+    with localcontext(growth='keep'):
+        thread = threading.Thread(target=lambda: seen.append(getcontext().growth))
+        thread.start()
+        thread.join()
+    assert seen == ['grow']
+
+
+def test_asyncio():
+    """Test each task has its own context"""
+    async def task(growth):
+        with localcontext(growth=growth):
+            await asyncio.sleep(0)
+            return (FixedPoint(1, 'Q4.2') + FixedPoint(1, 'Q4.2')).fmt
+
+    async def main():
+        return await asyncio.gather(task('keep'), task('grow'), task('Q6.1'))
+
+    assert asyncio.run(main()) == ['Q4.2', 'Q5.2', 'Q6.1']
+
+
+def test_invalid():
+    """Test invalid context settings and immutability"""
+    with raises(ValueError):
+        Context(rounding='nearest')
+    with raises(ValueError):
+        Context(growth='shrink')
+    with raises(AttributeError):
+        getcontext().growth = 'keep'
@@ -0,0 +1,96 @@
+"""Tests for qdtype and NumPy ufunc dispatch"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, qarray, qdtype
+from fixedpoint.dtype import fmt_from_dtype
+
+
+def test_qdtype():
+    """Test format stored in dtype metadata"""
+    dtype = qdtype('Q6.4')
+    assert dtype == np.int16
+    assert fmt_from_dtype(dtype) == 'Q6.4'
+    assert fmt_from_dtype(np.dtype(np.int64)) is None
+
+
+def test_qdtype_invalid():
+    """Test invalid format"""
+    with raises(ValueError):
+        qdtype('Q6')
+
+
+def test_array_conversion():
+    """Test np.array with a qdtype returns scaled integers"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    x = np.array(a, dtype=qdtype('Q6.2'))
+    assert x.tolist() == [6, -9]
+    assert fmt_from_dtype(x.dtype) == 'Q6.2'
+    assert np.array(a).tolist() == [1.5, -2.25]
+
+
+def test_qarray():
+    """Test qarray scales and range checks numbers"""
+    x = qarray([1.5, 2.25], 'Q6.4')
+    assert x.tolist() == [24, 36]
+    assert fmt_from_dtype(x.dtype) == 'Q6.4'
+    assert FixedPointArray(x).to_float().tolist() == [1.5, 2.25]
+    assert qarray(FixedPointArray([1.5], 'Q4.4'), qdtype('Q6.2')).tolist() == [6]
+    with raises(ValueError):
+        _ = qarray([40.0], 'Q6.4')
+    # values wider than the float mantissa keep all bits
+    wide = FixedPointArray.from_raw([2 ** 60 + 1, -3], 'Q40.30')
+    assert qarray(wide, 'Q40.30').tolist() == [2 ** 60 + 1, -3]
+    assert FixedPointArray(wide, 'Q40.30').raw.tolist() == [2 ** 60 + 1, -3]
+    assert FixedPointArray(wide).fmt == 'Q40.30'
+    assert FixedPointArray(wide, 'Q41.31').raw.tolist() == [2 ** 61 + 2, -6]
+
+
+def test_from_qdtype_array():
+    """Test FixedPointArray from NumPy array with a qdtype"""
+    x = np.array([6, -9], dtype=qdtype('Q6.2'))
+    a = FixedPointArray(x)
+    assert a.fmt == 'Q6.2'
+    assert a.to_float().tolist() == [1.5, -2.25]
+    b = FixedPointArray([1.5, -2.25], qdtype('Q4.4'))
+    assert b.fmt == 'Q4.4'
+
+
+def test_ufuncs():
+    """Test ufuncs follow the FixedPoint format rules"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    b = FixedPointArray([0.5, 0.5], 'Q4.2')
+    c = np.add(a, b)
+    assert c.fmt == 'Q7.4'
+    assert c.to_float().tolist() == [2.0, -1.75]
+    c = np.multiply(a, b)
+    assert c.fmt == 'Q10.4'
+    assert np.less(a, b).tolist() == [False, True]
+    assert np.negative(a).to_float().tolist() == [-1.5, 2.25]
+
+
+def test_ufunc_ndarray():
+    """Test ufuncs with plain NumPy arrays"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    c = np.array([1.0, 2.0]) + a
+    assert isinstance(c, FixedPointArray)
+    assert np.array(c).tolist() == [2.5, -0.25]
+
+
+def test_sum():
+    """Test np.sum grows int bits by ceil(log2(N))"""
+    a = FixedPointArray([1.5, -2.25, 3], 'Q6.4')
+    s = np.sum(a)
+    assert isinstance(s, FixedPoint)
+    assert s.fmt == 'Q8.4'
+    assert float(s) == 2.25
+    b = FixedPointArray([[1, 2], [3, 4]], 'Q4.0')
+    s = np.sum(b, axis=0)
+    assert s.fmt == 'Q5.0'
+    assert s.to_float().tolist() == [4.0, 6.0]
+
+
+def test_astype():
+    """Test casting"""
+    a = FixedPointArray([1.5, -2.25], 'Q6.4')
+    assert a.astype(qdtype('Q4.1')).to_float().tolist() == [1.5, -2.0]
+    assert a.astype(np.float32).dtype == np.float32
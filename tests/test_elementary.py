@@ -0,0 +1,130 @@
+"""Tests for elementary functions"""
+from fractions import Fraction
+import math
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, sin, cos, atan2, sqrt, reciprocal, divide
+
+
+def test_sin_cos():
+    """Test accuracy of table lookup and CORDIC"""
+    x = FixedPointArray(np.linspace(-3.14, 3.14, 1001), 'Q3.13')
+    for method in ('lut', 'cordic'):
+        for func, ref in ((sin, np.sin), (cos, np.cos)):
+            y = func(x, method=method)
+            assert y.fmt == 'Q2.13'
+            assert np.max(np.abs(y.to_float() - ref(x.to_float()))) <= 2 ** -13
+
+
+def test_scalar():
+    """Test scalars give the same bits as arrays"""
+    x = FixedPointArray([-2.5, 0.125, 1.0, 7.75], 'Q4.8')
+    for func in (sin, cos):
+        for method in ('lut', 'cordic'):
+            y = func(x, 'Q1.15', method)
+            assert [func(v, 'Q1.15', method) for v in x] == list(y)
+    assert isinstance(sin(FixedPoint(0.5, 'Q3.13')), FixedPoint)
+
+
+def test_saturate():
+    """Test results saturate to the output format"""
+    assert cos(FixedPoint(0, 'Q3.13'), 'Q1.15').value == 2 ** 15 - 1
+    assert sin(FixedPoint(-1.5707963, 'Q3.28'), 'Q1.15').value == -2 ** 15
+
+
+def test_table_cache():
+    """Test tables are generated once per format and size"""
+    x = FixedPoint(1, 'Q3.13')
+    # pylint: disable-next=import-outside-toplevel
+    from fixedpoint.elementary import _sin_table
+    _sin_table.cache_clear()
+    sin(x, 'Q2.14')
+    cos(x, 'Q2.14')
+    sin(x, 'Q2.14', table_bits=12)
+    info = _sin_table.cache_info()  # pylint: disable=no-value-for-parameter
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def test_atan2():
+    """Test all quadrants against math.atan2"""
+    t = np.linspace(-3.1, 3.1, 999)
+    y = FixedPointArray(2 * np.sin(t), 'Q3.13')
+    x = FixedPointArray(2 * np.cos(t), 'Q3.13')
+    angle = atan2(y, x)
+    assert angle.fmt == 'Q3.13'
+    expected = np.arctan2(y.to_float(), x.to_float())
+    assert np.max(np.abs(angle.to_float() - expected)) <= 2 ** -12
+    zero = FixedPoint(0, 'Q2.4')
+    assert float(atan2(zero, zero)) == 0
+    assert abs(float(atan2(zero, FixedPoint(-1, 'Q2.4'))) - math.pi) < 2 ** -4
+    with raises(ValueError):
+        atan2(y, x[:3])
+
+
+def test_sqrt():
+    """Test square root is truncated toward zero"""
+    x = FixedPointArray(np.linspace(0, 7.9, 777), 'Q4.20')
+    root = sqrt(x)
+    assert root.fmt == 'Q3.20'
+    assert root.raw.tolist() == [math.isqrt(int(v) << 20) for v in x.raw]
+    wide = FixedPointArray([2.0, 1e9], 'Q40.40')
+    assert sqrt(wide).raw.tolist() == [math.isqrt(int(v) << 40) for v in wide.raw]
+    assert float(sqrt(FixedPoint(2.25, 'Q4.4'), 'Q2.2')) == 1.5
+    with raises(ValueError):
+        sqrt(FixedPoint(-1, 'Q4.4'))
+
+
+def test_reciprocal():
+    """Test relative accuracy, sign and saturation"""
+    x = FixedPointArray(np.concatenate([np.linspace(-7.9, -0.01, 500),
+                                        np.linspace(0.01, 7.9, 500)]), 'Q4.12')
+    inv = reciprocal(x)
+    assert inv.fmt == 'Q14.16'
+    expected = 1 / x.to_float()
+    # rounding of the result plus interpolation error of the table
+    assert np.all(np.abs(inv.to_float() - expected) <= 2 ** -17 + np.abs(expected) * 2 ** -21)
+    assert float(reciprocal(FixedPoint(-2, 'Q4.4'))) == -0.5
+    assert float(reciprocal(FixedPoint(0.0625, 'Q2.4'), 'Q3.2')) == 3.75
+    with raises(ZeroDivisionError):
+        reciprocal(FixedPointArray([1, 0], 'Q4.4'))
+
+
+def test_reciprocal_newton():
+    """Test Newton-Raphson iterations converge to the rounded reciprocal"""
+    x = FixedPointArray(np.concatenate([np.linspace(-7.9, -0.01, 500),
+                                        np.linspace(0.01, 7.9, 500)]), 'Q4.12')
+    exact = [Fraction(1 << 28, int(v)) for v in x.raw]
+    inv = reciprocal(x, method='newton')
+    assert inv.fmt == 'Q14.16'
+    assert max(abs(int(v) - e) for v, e in zip(inv.raw, exact)) <= 0.5
+    # the seed table alone has about table_bits + 1 correct bits
+    seed = reciprocal(x, method='newton', iterations=0)
+    assert max(abs(int(v) - e) / abs(e) for v, e in zip(seed.raw, exact)) < 2 ** -7
+    wide = FixedPointArray([3.0, -1e-9, 12345.678], 'Q20.40')
+    assert reciprocal(wide, method='newton').raw.tolist() == \
+        [round(Fraction(1 << 100, int(v))) for v in wide.raw]
+    with raises(ValueError):
+        reciprocal(x, method='cordic')
+
+
+def test_divide():
+    """Test rounding modes of exact division and the error of newton"""
+    rng = np.random.default_rng(2)
+    a = FixedPointArray(rng.uniform(-7, 7, 500), 'Q4.12')
+    b = FixedPointArray(rng.uniform(0.1, 7, 500) * rng.choice([-1, 1], 500), 'Q4.12')
+    exact = [Fraction(int(u), int(v)) * (1 << 20) for u, v in zip(a.raw, b.raw)]
+    for rounding, func in (('floor', math.floor), ('ceil', math.ceil), ('trunc', math.trunc),
+                           ('half_even', round)):
+        q = divide(a, b, 'Q8.20', rounding, 'saturate')
+        assert q.raw.tolist() == [min(max(func(e), q.qformat.min_raw), q.qformat.max_raw)
+                                  for e in exact]
+    q = divide(a, b, 'Q8.20', 'half_even', 'saturate', method='newton')
+    assert max(abs(int(v) - e) for v, e in zip(q.raw, exact) if abs(e) < (1 << 27)) < 2
+    coarse = divide(a, b, 'Q8.20', method='newton', iterations=1)
+    assert max(abs(int(v) - e) for v, e in zip(coarse.raw, exact) if abs(e) < (1 << 27)) > 2
+    assert divide(a, FixedPoint(2, 'Q4.4')).fmt == 'Q8.16'
+    assert divide(FixedPoint(1, 'Q4.4'), FixedPoint(3, 'Q4.4'), 'Q2.8', 'half_up').value == 85
+    with raises(ValueError):
+        divide(a, b, 'Q2.4')
+    with raises(ZeroDivisionError):
+        divide(a, FixedPoint(0, 'Q4.4'), method='newton')
@@ -0,0 +1,72 @@
+"""Tests for FIRFilter"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, FIRFilter
+
+
+def reference(coeffs, x, acc_fmt, out_fmt, policy='fit'):
+    """Filter with FixedPoint scalars, products truncated and wrapped into the accumulator"""
+    out = []
+    for i in range(len(x)):
+        acc = FixedPoint(0, acc_fmt)
+        for k, c in enumerate(coeffs):
+            sample = x[i - k] if i >= k else FixedPoint(0, x[0].qformat)
+            acc = acc + (c * sample).to(acc_fmt, 'round', overflow='wrap')
+        out.append(acc.to(acc_fmt, overflow='wrap').to(out_fmt, policy))
+    return out
+
+
+def test_bit_exact():
+    """Test against FixedPoint arithmetic"""
+    rng = np.random.default_rng(0)
+    coeffs = FixedPointArray(rng.uniform(-1, 1, 7), 'Q1.15')
+    x = FixedPointArray(rng.uniform(-4, 4, 50), 'Q3.9')
+    for acc_fmt in ('Q8.12', 'Q8.20', 'Q3.15'):
+        fir = FIRFilter(coeffs, 'Q3.9', acc_fmt, 'Q4.4')
+        expected = reference(list(coeffs), list(x), acc_fmt, 'Q4.4')
+        assert fir.process(x).raw.tolist() == [y.value for y in expected]
+
+
+def test_full_precision():
+    """Test default accumulator keeps all product bits"""
+    coeffs = FixedPointArray([0.5, -0.25, 0.75], 'Q2.2')
+    fir = FIRFilter(coeffs, 'Q4.4')
+    assert fir.acc_fmt.fmt == 'Q8.4'
+    y = fir.process([1.0, 2.0, -3.0, 0.5])
+    assert y.to_float().tolist() == [0.5, 0.75, -1.25, 2.5]
+
+
+def test_chunks():
+    """Test delay line is carried over between calls and chunks"""
+    rng = np.random.default_rng(1)
+    coeffs = FixedPointArray(rng.uniform(-1, 1, 5), 'Q1.7')
+    x = FixedPointArray(rng.uniform(-1, 1, 100), 'Q1.7')
+    whole = FIRFilter(coeffs, 'Q1.7').process(x)
+    fir = FIRFilter(coeffs, 'Q1.7', chunk=7)
+    parts = [fir.process(x[i:i + 13]) for i in range(0, 100, 13)]
+    assert np.concatenate([p.raw for p in parts]).tolist() == whole.raw.tolist()
+    assert fir.state.raw.tolist() == x.raw[-4:].tolist()
+    fir.reset()
+    assert fir.process(x).raw.tolist() == whole.raw.tolist()
+
+
+def test_accumulator_wrap():
+    """Test narrow accumulator wraps like a register"""
+    coeffs = FixedPointArray([0.75, 0.75], 'Q1.2')
+    fir = FIRFilter(coeffs, 'Q1.2', 'Q1.2')
+    assert fir.process([-1, -1]).to_float().tolist() == [-0.75, 0.5]
+
+
+def test_wide():
+    """Test formats wider than 64 bits"""
+    coeffs = FixedPointArray([0.5, 1.5], 'Q2.40')
+    x = FixedPointArray([2 ** -40, -3.0, 1.0], 'Q3.40')
+    y = FIRFilter(coeffs, 'Q3.40').process(x)
+    expected = reference(list(coeffs), list(x), y.qformat, y.qformat)
+    assert y.raw.tolist() == [v.value for v in expected]
+
+
+def test_invalid():
+    """Test empty coefficients"""
+    with raises(ValueError):
+        FIRFilter(FixedPointArray([], 'Q1.7'), 'Q1.7')
@@ -1,6 +1,9 @@
 """Tests for FixedPoint class"""
+import pickle
+from fractions import Fraction
+import numpy as np
 from pytest import raises
-from fixedpoint import FixedPoint
+from fixedpoint import FixedPoint, QFormat, localcontext
 
 
 def test_instantiate_1():
@@ -40,9 +43,10 @@ def test_instantiate_6():
 
 
 def test_instantiate_7():
-    """Test for too large numbers"""
-    with raises(ValueError):
-        FixedPoint(1.5, 'Q20.204')
+    """Test wide formats"""
+    a = FixedPoint(1.5, 'Q20.204')
+    assert a.value == 3 << 203
+    assert float(a) == 1.5
 
 
 def test_instantiate_8():
@@ -156,6 +160,42 @@ def test_div():
     assert float(a / 2) == 1
 
 
+def test_div_exact():
+    """Test quotients are the exact quotient truncated toward zero"""
+    a = FixedPoint(-1, 'Q4.2')
+    b = FixedPoint(3, 'Q3.5')
+    q = a / b
+    assert q.fmt == 'Q9.5'
+    assert Fraction(q.value, q.qformat.scale) == Fraction(-10, 32)
+    assert float(FixedPoint(1, 'Q2.2') / 3) == 0.25
+    assert float(1 / FixedPoint(0.75, 'Q2.2')) == 1.25
+    # only the most negative value divided by minus one step overflows
+    with raises(ValueError):
+        _ = FixedPoint(-8, 'Q4.2') / FixedPoint(-0.25, 'Q2.2')
+    with raises(ZeroDivisionError):
+        _ = a / FixedPoint(0, 'Q2.2')
+    with localcontext(growth='keep', rounding='half_even', overflow='saturate'):
+        assert (FixedPoint(1, 'Q4.2') / FixedPoint(3, 'Q4.2')).value == 1
+        assert (FixedPoint(-8, 'Q4.2') / FixedPoint(-0.25, 'Q4.2')).value == 31
+
+
+def test_floordiv_mod():
+    """Test floor division and remainder against Fraction"""
+    values = [FixedPoint(v, 'Q4.2') for v in (-7.75, -3, -0.25, 0, 0.5, 5.25)]
+    divisors = [FixedPoint(v, 'Q3.3') for v in (-2.5, -0.125, 1, 3.375)] + [-1.5, 2, 1.25]
+    for a in values:
+        for b in divisors:
+            q, r = divmod(a, b)
+            x, y = Fraction(a.value, a.qformat.scale), Fraction(float(b))
+            assert Fraction(q.value, q.qformat.scale) == x // y
+            assert Fraction(r.value, r.qformat.scale) == x % y
+            assert q == a // b and r == a % b
+    assert (values[0] // divisors[0]).fmt == (values[0] / divisors[0]).fmt == 'Q7.5'
+    assert (values[0] % divisors[0]).fmt == 'Q3.3'
+    assert divmod(7, FixedPoint(2, 'Q4.2')) == (3, 1)
+    assert 7.5 % FixedPoint(-2, 'Q4.2') == -0.5
+
+
 def test_power():
     """Test __pow__ method"""
     a = FixedPoint(2, 'Q4.8')
@@ -172,3 +212,166 @@ def test_power_3():
     assert float(b) == 8
     assert a.n == b.n
     assert 3 * a.m == b.m
+
+
+def test_qformat():
+    """Test format given as QFormat"""
+    a = FixedPoint(1.5, QFormat(4, 2))
+    assert a.fmt == 'Q4.2'
+    assert a.qformat is QFormat(4, 2)
+    assert a.value == 6
+
+
+def test_from_raw():
+    """Test creation from scaled integer"""
+    a = FixedPoint.from_raw(24, 'Q4.4')
+    assert a.value == 24
+    assert float(a) == 1.5
+    with raises(ValueError):
+        FixedPoint.from_raw(128, 'Q4.4')
+
+
+def test_add_exact():
+    """Test addition keeps all bits"""
+    a = FixedPoint.from_raw(2 ** 15 - 1, 'Q1.15')
+    b = FixedPoint.from_raw(1, 'Q1.15')
+    c = a + b
+    assert c.fmt == 'Q2.15'
+    assert c.value == 2 ** 15
+
+
+def test_mul():
+    """Test __mul__ method truncates toward zero"""
+    a = FixedPoint(1.5, 'Q4.4')
+    b = FixedPoint(-0.75, 'Q3.2')
+    c = a * b
+    assert c.fmt == 'Q7.4'
+    assert float(c) == -1.125
+    c = FixedPoint.from_raw(-3, 'Q2.2') * FixedPoint.from_raw(1, 'Q2.2')
+    assert c.value == 0
+
+
+def test_number_operands():
+    """Test operations with numbers are exact before truncation"""
+    a = FixedPoint(1, 'Q4.0')
+    assert (a - 0.3).value == 0
+    assert (a + 0.5).value == 1
+    assert (2 - a).value == 1
+    assert (a * 0.75).value == 0
+
+
+def test_neg():
+    """Test __neg__ and __abs__ methods"""
+    a = FixedPoint(1.5, 'Q4.4')
+    assert float(-a) == -1.5
+    assert float(abs(-a)) == 1.5
+    assert float(+a) == 1.5
+    with raises(ValueError):
+        _ = -FixedPoint(-8, 'Q4.4')
+
+
+def test_compare_formats():
+    """Test comparison between different formats is exact"""
+    a = FixedPoint(1.5, 'Q4.4')
+    b = FixedPoint(1.5, 'Q8.8')
+    assert a == b
+    assert a < FixedPoint.from_raw(385, 'Q8.8')
+
+
+def test_compare_nonfinite():
+    """Test comparison with nan and inf returns a result"""
+    a = FixedPoint(1, 'Q2.0')
+    nan, inf = float('nan'), float('inf')
+    assert (a == nan) is False
+    assert (a != nan) is True
+    assert not (a < nan or a <= nan or a > nan or a >= nan)
+    assert (a == inf) is False
+    assert (a != inf) is True
+    assert a < inf
+    assert a <= inf
+    assert a > -inf
+    assert a >= -inf
+    assert not a < -inf
+    assert -inf < a < inf
+    assert a in [nan, 1.0]
+
+
+def test_numpy_values():
+    """Test construction from NumPy scalars"""
+    assert FixedPoint(np.float32(1.5), 'Q4.4').value == 24
+    assert FixedPoint(np.float16(-0.25), 'Q4.4').value == -4
+    assert FixedPoint(np.int16(3), 'Q4.4').value == 48
+    assert FixedPoint(np.float64(0.1), 'Q1.15') == FixedPoint(0.1, 'Q1.15')
+    with raises(ValueError):
+        _ = FixedPoint(np.float32('nan'), 'Q4.4')
+
+
+def test_numpy_operands():
+    """Test NumPy scalars as operands"""
+    a = FixedPoint(1.5, 'Q4.4')
+    assert a == np.float32(1.5)
+    assert a != np.float16(1)
+    assert a < np.float32(2)
+    assert a >= np.int64(1)
+    assert a != np.float32('nan')
+    assert not a > np.float32('nan')
+    assert a < np.float32('inf')
+    assert (a + np.float32(1.5)).value == 48
+    assert (a * np.float16(2)).value == 48
+    assert (a - np.int16(1)).value == 8
+
+
+def test_shift():
+    """Test shift operators scale by powers of two"""
+    a = FixedPoint(1.5, 'Q4.4')
+    assert float(a << 1) == 3
+    assert float(a >> 1) == 0.75
+
+
+def test_wide():
+    """Test wide formats keep all bits"""
+    a = FixedPoint(2 ** 40 + 0.5, 'Q64.64')
+    b = FixedPoint.from_raw(3, 'Q64.64')
+    c = a * a + b
+    assert c.fmt == 'Q129.64'
+    assert c.value == (((2 ** 41 + 1) ** 2) << 62) + 3
+
+
+def test_immutable():
+    """Test FixedPoint can not be changed"""
+    a = FixedPoint(1.5, 'Q4.4')
+    with raises(AttributeError):
+        a.value = 3
+    assert not hasattr(a, '__dict__')
+
+
+def test_pickle():
+    """Test pickling keeps value and shared format"""
+    a = FixedPoint(1.5, 'Q4.4')
+    b = pickle.loads(pickle.dumps(a))
+    assert b.value == a.value
+    assert b.qformat is a.qformat
+
+
+def test_hash():
+    """Test hash is consistent with equality across formats and numbers"""
+    a = FixedPoint(-1.25, 'Q4.4')
+    assert hash(a) == hash(FixedPoint(-1.25, 'Q8.12')) == hash(-1.25) == hash(Fraction(-5, 4))
+    assert hash(FixedPoint(3, 'Q4.0')) == hash(3)
+    assert hash(FixedPoint(-1, 'Q4.4')) == hash(-1)
+    assert hash(FixedPoint.from_raw(1, 'Q2.100')) == hash(Fraction(1, 2 ** 100))
+    assert hash(FixedPoint.from_raw(3, 'Q8.-2')) == hash(12)
+    table = {a: 'a', 0.5: 'b'}
+    assert table[FixedPoint(-1.25, 'Q3.2')] == 'a'
+    assert table[FixedPoint(0.5, 'Q1.15')] == 'b'
+    assert len({a, FixedPoint(-1.25, 'Q6.6'), -1.25}) == 1
+
+
+def test_intern():
+    """Test interned values are shared per value and format"""
+    a = FixedPoint.intern(0.5, 'Q1.15')
+    assert a is FixedPoint.intern(Fraction(1, 2), QFormat(1, 15))
+    assert a == FixedPoint(0.5, 'Q1.15')
+    assert a is not FixedPoint.intern(0.5, 'Q2.15')
+    with raises(ValueError):
+        _ = FixedPoint.intern(4, 'Q2.2')
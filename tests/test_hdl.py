@@ -0,0 +1,134 @@
+"""Tests for HDL test vectors and simulation output"""
+import io
+import numpy as np
+from pytest import raises
+from fixedpoint import Comparator, FixedPointArray, compare_vectors, iter_vectors, read_vectors
+from fixedpoint import write_vectors
+
+
+def test_readmem(tmp_path):
+    """Test hex and binary digits of the format width"""
+    x = FixedPointArray([0.5, -1.0, -0.125], 'Q2.6')
+    assert write_vectors(tmp_path / 'x.hex', x) == 3
+    assert (tmp_path / 'x.hex').read_text() == '20\nc0\nf8\n'
+    f = io.StringIO()
+    write_vectors(f, x, FixedPointArray([1, -1, 0], 'Q3.0'), radix='bin', names=['x', 'y'])
+    assert f.getvalue() == '// x:Q2.6 y:Q3.0\n00100000 001\n11000000 111\n11111000 000\n'
+
+
+def test_csv():
+    """Test comma separated columns of 2-D arrays"""
+    iq = FixedPointArray([[0.5, -0.5], [-1.0, 0.25]], 'Q1.3')
+    f = io.BytesIO()
+    write_vectors(f, iq, layout='csv', names=['i', 'q'])
+    assert f.getvalue() == b'i,q\n4,c\n8,2\n'
+
+
+def test_python_format():
+    """Test against Python string formatting for narrow, 64 bit and wide formats"""
+    rng = np.random.default_rng(0)
+    for fmt, bits in (('Q-2.7', 5), ('Q40.24', 64), ('Q70.30', 100)):
+        raw = [int(v) << (bits - 63) if bits > 63 else int(v) >> (63 - bits)
+               for v in rng.integers(-2 ** 62, 2 ** 62, 1000)]
+        x = FixedPointArray.from_raw(np.array(raw, dtype=object if bits > 64 else np.int64), fmt)
+        for radix, spec, width in (('hex', 'x', (bits + 3) // 4), ('bin', 'b', bits)):
+            f = io.BytesIO()
+            assert write_vectors(f, x, radix=radix, chunk=99) == 1000
+            expected = ''.join(f'{v & ((1 << bits) - 1):0{width}{spec}}\n' for v in raw)
+            assert f.getvalue().decode() == expected
+
+
+def test_invalid():
+    """Test errors"""
+    x = FixedPointArray([0.5], 'Q2.6')
+    with raises(ValueError):
+        write_vectors(io.BytesIO(), x, radix='oct')
+    with raises(ValueError):
+        write_vectors(io.BytesIO(), x, layout='json')
+    with raises(ValueError):
+        write_vectors(io.BytesIO(), x, FixedPointArray([0.5, 0.5], 'Q2.6'))
+    with raises(ValueError):
+        write_vectors(io.BytesIO(), x, names=['a', 'b'])
+    with raises(TypeError):
+        write_vectors(io.BytesIO(), [1, 2])
+
+
+def test_roundtrip():
+    """Test parsing written vectors in blocks for all radixes and layouts"""
+    rng = np.random.default_rng(1)
+    x = FixedPointArray.from_raw(rng.integers(-2 ** 15, 2 ** 15, 5000), 'Q1.15')
+    w = FixedPointArray.from_raw(np.array([-1, 2 ** 98, -(2 ** 99)] * 100, dtype=object), 'Q70.30')
+    for radix in ('hex', 'bin'):
+        for layout in ('readmem', 'csv'):
+            f = io.BytesIO()
+            write_vectors(f, x[:300], w, radix=radix, layout=layout, names=['x', 'w'])
+            f.seek(0)
+            a, b = read_vectors(f, 'Q1.15', 'Q70.30', radix=radix, header=layout == 'csv',
+                                chunk=1000)
+            assert np.array_equal(a.raw, x.raw[:300])
+            assert b.raw.tolist() == w.raw.tolist()
+    f = io.BytesIO()
+    write_vectors(f, x)
+    f.seek(0)
+    blocks = list(iter_vectors(f, 'Q1.15', chunk=4096))
+    assert len(blocks) > 1
+    assert np.array_equal(np.concatenate([block.raw for block in blocks]), x.raw)
+
+
+def test_parse():
+    """Test sign extension, comments and errors with line numbers"""
+    text = '// dump\n1F  // first\n\n10\n1'
+    assert read_vectors(io.StringIO(text), 'Q3.2').to_float().tolist() == [-0.25, -4.0, 0.25]
+    assert read_vectors(io.StringIO('1111\n0111\n'), 'Q2.2', radix='bin').raw.tolist() == [-1, 7]
+    with raises(ValueError, match='line 3'):
+        read_vectors(io.StringIO('1f\n0\nxx\n'), 'Q3.2')
+    with raises(ValueError, match='line 2'):
+        read_vectors(io.StringIO('1f 1\n1\n'), 'Q3.2', 'Q3.2')
+    with raises(ValueError):
+        read_vectors(io.StringIO('3f\n'), 'Q3.2')
+    with raises(ValueError):
+        read_vectors(io.StringIO('2\n'), 'Q3.2', radix='bin')
+
+
+def test_comparator():
+    """Test mismatches, first index and error histogram of pieces in different formats"""
+    expected = FixedPointArray(np.linspace(-1, 1, 1000, endpoint=False), 'Q1.15')
+    actual = expected.to('Q1.12', rounding='half_even')
+    actual[10] = 0.5
+    comparator = Comparator(tolerance=4, span=8)
+    for start in range(0, 1000, 300):
+        comparator.update(actual[start:start + 300], expected[start:start + 300])
+    assert comparator.count == 1000
+    assert comparator.mismatches == 1
+    assert comparator.first == 10
+    assert comparator.lsb == 2 ** -15
+    errors, counts = comparator.histogram()
+    assert errors[0] == -9 and errors[-1] == 9
+    assert counts.sum() == 1000
+    assert counts[-1] == 1
+    assert np.array_equal(np.flatnonzero(counts[:-1]), np.arange(5, 14))
+    assert 'first mismatch 10' in comparator.report()
+    with raises(ValueError):
+        comparator.update(actual, expected[:10])
+
+
+def test_compare_vectors():
+    """Test comparing a dump in another format with the model"""
+    expected = FixedPointArray(np.linspace(-1, 1, 1000, endpoint=False), 'Q1.15')
+    f = io.BytesIO()
+    write_vectors(f, expected.to('Q1.10', 'round'), expected)
+    f.seek(0)
+    low, full = compare_vectors(f, expected, expected, formats=['Q1.10', 'Q1.15'], tolerance=31,
+                                chunk=500)
+    assert (low.mismatches, low.max_error, full.mismatches, full.max_error) == (0, 31, 0, 0)
+    f.seek(0)
+    low, full = compare_vectors(f, expected, expected, formats=['Q1.10', 'Q1.15'])
+    assert low.mismatches > 0
+    assert full.mismatches == 0
+    f.seek(0)
+    with raises(ValueError):
+        compare_vectors(f, expected[:10], expected[:10], formats=['Q1.10', 'Q1.15'])
+    longer = FixedPointArray.from_raw(np.concatenate([expected.raw] * 2), 'Q1.15')
+    f.seek(0)
+    with raises(ValueError):
+        compare_vectors(f, longer, longer, formats=['Q1.10', 'Q1.15'])
@@ -0,0 +1,110 @@
+"""Tests for instrumentation counters"""
+import json
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, instrument
+
+
+def recorded(func):
+    """Run func with instrumentation enabled and return the records"""
+    instrument.reset()
+    instrument.enable()
+    try:
+        func()
+    finally:
+        instrument.disable()
+    return instrument.records()
+
+
+def test_disabled():
+    """Test nothing is recorded when disabled"""
+    instrument.reset()
+    FixedPointArray([1.5, 3], 'Q4.2').to('Q2.0', 'fit')
+    assert not instrument.records()
+
+
+def test_requantize_counts():
+    """Test rounding and saturation counts of an array requantization"""
+    a = FixedPointArray([0.25, 1.5, 1.0, -3.75], 'Q4.2')
+    records = recorded(lambda: a.to('Q2.0', 'fit'))
+    assert len(records) == 1
+    rec = records[0]
+    assert rec['fmt'] == 'Q2.0'
+    assert rec['values'] == 4
+    assert rec['rounded'] == 3
+    assert rec['saturated'] == 1
+    assert rec['max_error'] == 0.75
+    assert rec['mean_error'] == (0.25 + 0.5 + 0.75) / 4
+
+
+def test_wrap_and_overflow():
+    """Test wrap and overflow counts of scalar requantization"""
+    a = FixedPoint(3, 'Q4.0')
+
+    def run():
+        a.to('Q2.0', overflow='wrap')
+        with raises(ValueError):
+            a.to('Q2.0')
+
+    records = recorded(run)
+    assert len(records) == 1
+    rec = records[0]
+    assert (rec['wrapped'], rec['overflowed'], rec['rounded']) == (1, 1, 0)
+
+
+def test_conversion():
+    """Test quantization error and overflow of conversions"""
+    def run():
+        FixedPointArray([0.3, 0.5], 'Q2.2')
+        with raises(ValueError):
+            FixedPoint(5.0, 'Q2.2')
+    records = recorded(run)
+    assert len(records) == 1
+    rec = records[0]
+    assert (rec['values'], rec['rounded'], rec['overflowed']) == (3, 1, 1)
+    assert np.isclose(rec['max_error'], 0.05)
+
+
+def test_operator_overflow():
+    """Test operator results out of range are counted as overflowed"""
+    a = FixedPoint(0.75, 'Q1.3')
+    b = FixedPointArray([0.75, 0.25], 'Q1.3')
+
+    def run():
+        with raises(ValueError):
+            _ = a * 2
+        with raises(ValueError):
+            _ = b * 2
+        _ = a * 0.5
+    records = recorded(run)
+    assert len(records) == 1
+    rec = records[0]
+    assert rec['fmt'] == 'Q1.3'
+    assert (rec['values'], rec['overflowed']) == (3, 2)
+
+
+def test_tag_and_site():
+    """Test counters are kept per tag and call site"""
+    def run():
+        with instrument.tag('stage1'):
+            FixedPoint(0.3, 'Q2.2')
+        FixedPoint(0.3, 'Q2.2')
+    instrument.reset()
+    instrument.enable(callsite=True)
+    try:
+        run()
+    finally:
+        instrument.disable()
+    records = instrument.records()
+    assert sorted(str(rec['tag']) for rec in records) == ['None', 'stage1']
+    assert all('test_instrument.py' in rec['site'] for rec in records)
+
+
+def test_export(tmp_path):
+    """Test JSON and CSV export and the text report"""
+    recorded(lambda: FixedPoint(0.3, 'Q2.2'))
+    instrument.export(str(tmp_path / 'counters.json'))
+    instrument.export(str(tmp_path / 'counters.csv'))
+    assert json.loads((tmp_path / 'counters.json').read_text())[0]['rounded'] == 1
+    assert (tmp_path / 'counters.csv').read_text().startswith(','.join(instrument.FIELDS))
+    assert 'Q2.2' in instrument.report()
@@ -0,0 +1,74 @@
+"""Tests for dot and mac"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, dot, mac
+
+
+def reference(a, b):
+    """Dot product with FixedPoint scalars"""
+    acc = a[0] * b[0]
+    for x, y in zip(list(a)[1:], list(b)[1:]):
+        acc = acc + x * y
+    return acc
+
+
+def test_dot():
+    """Test format growth and value against FixedPoint arithmetic"""
+    rng = np.random.default_rng(0)
+    a = FixedPointArray(rng.uniform(-1, 1, 100), 'Q1.15')
+    b = FixedPointArray(rng.uniform(-8, 8, 100), 'Q4.6')
+    c = dot(a, b)
+    assert isinstance(c, FixedPoint)
+    assert c.fmt == 'Q12.15'
+    assert c == reference(a, b)
+
+
+def test_full_precision():
+    """Test products keep all fractional bits"""
+    a = FixedPointArray([0.75, -0.25], 'Q2.2')
+    c = dot(a, a, full_precision=True)
+    assert c.fmt == 'Q5.4'
+    assert float(c) == 0.625
+
+
+def test_blocks():
+    """Test sums exceeding int64 are accumulated exactly in blocks"""
+    n = 5000
+    a = FixedPointArray.from_raw(np.full(n, -2 ** 31), 'Q32.0')
+    c = dot(a, a)
+    assert c.fmt == 'Q77.0'
+    assert c.value == n * 2 ** 62
+
+
+def test_wide():
+    """Test products wider than 64 bits"""
+    rng = np.random.default_rng(1)
+    a = FixedPointArray(rng.uniform(-1, 1, 20), 'Q2.40')
+    b = FixedPointArray(rng.uniform(-1, 1, 20), 'Q2.40')
+    assert dot(a, b) == reference(a, b)
+
+
+def test_axis():
+    """Test dot products of many vectors along an axis"""
+    rng = np.random.default_rng(2)
+    a = FixedPointArray(rng.uniform(-1, 1, (3, 8)), 'Q1.7')
+    b = FixedPointArray(rng.uniform(-1, 1, (3, 8)), 'Q1.7')
+    rows = dot(a, b)
+    cols = dot(a, b, axis=0)
+    assert rows.shape == (3,)
+    assert cols.shape == (8,)
+    assert rows[1] == reference(a[1], b[1])
+    assert cols[2] == reference(a[:, 2], b[:, 2])
+
+
+def test_mac():
+    """Test multiply-accumulate"""
+    a = FixedPointArray([0.5, 0.25], 'Q2.4')
+    acc = mac(FixedPoint(1, 'Q4.4'), a, a)
+    assert float(acc) == 1.3125
+
+
+def test_shape_mismatch():
+    """Test operands of different shape"""
+    with raises(ValueError):
+        dot(FixedPointArray([1, 2], 'Q4.2'), FixedPointArray([1], 'Q4.2'))
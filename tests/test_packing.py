@@ -0,0 +1,57 @@
+"""Tests for bit packing"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPointArray, pack, unpack, packed_size
+
+
+def test_pack():
+    """Test 12 bit values in both bit orders"""
+    x = FixedPointArray([0.5, -1.0, -0.001953125], 'Q3.9')
+    assert pack(x).hex() == '100e00fff0'
+    assert pack(x, bitorder='little').hex() == '0001e0ff0f'
+    assert packed_size('Q3.9', 3) == 5
+
+
+def test_roundtrip():
+    """Test unpack restores the values with sign extension"""
+    rng = np.random.default_rng(0)
+    for fmt in ('Q2.1', 'Q3.9', 'Q5.13', 'Q12.12', 'Q40.23', 'Q32.32', 'Q50.50'):
+        x = FixedPointArray(rng.uniform(-1, 0.99, 1000), fmt)
+        for bitorder in ('big', 'little'):
+            data = pack(x, bitorder=bitorder)
+            assert len(data) == packed_size(fmt, 1000)
+            y = unpack(data, fmt, 1000, bitorder=bitorder)
+            assert y.fmt == fmt
+            assert y.raw.tolist() == x.raw.tolist()
+
+
+def test_raw():
+    """Test packing of scaled integers"""
+    data = pack([-1, 0, 1, -2], 'Q2.0')
+    assert data.hex() == 'c6'
+    assert unpack(data, 'Q2.0', count=4).raw.tolist() == [-1, 0, 1, -2]
+    assert unpack(data, 'Q2.0', count=3).raw.tolist() == [-1, 0, 1]
+    with raises(ValueError):
+        pack([2], 'Q2.0')
+    with raises(ValueError):
+        pack([1])
+
+
+def test_format():
+    """Test requantization to the given format"""
+    x = FixedPointArray([0.5, -0.25], 'Q2.2')
+    assert pack(x, 'Q1.3') == pack(FixedPointArray([0.5, -0.25], 'Q1.3'))
+
+
+def test_count():
+    """Test invalid count and bit order"""
+    with raises(ValueError):
+        unpack(b'\x00', 'Q3.9', count=1)
+    with raises(ValueError):
+        unpack(pack([1, 2, 3], 'Q3.0'), 'Q3.0')
+    with raises(ValueError):
+        unpack(pack([0, -1, 0], 'Q1.0'), 'Q1.0')
+    # the padding of wider formats is shorter than a value
+    assert unpack(pack([1, 2, 3], 'Q3.6'), 'Q3.6').raw.tolist() == [1, 2, 3]
+    with raises(ValueError):
+        pack([0], 'Q3.9', bitorder='middle')
@@ -0,0 +1,93 @@
+"""Tests for ParallelExecutor"""
+import operator
+import numpy as np
+from pytest import raises
+from fixedpoint import FFT, FIRFilter, FixedPointArray, ParallelExecutor, localcontext, requantize
+
+
+def test_map():
+    """Test chunked arithmetic is bit-exact with the whole array"""
+    rng = np.random.default_rng(0)
+    a = FixedPointArray(rng.uniform(-6, 6, (1001, 3)), 'Q4.12')
+    b = FixedPointArray(rng.uniform(-2, 2, (1001, 3)), 'Q2.14')
+    with ParallelExecutor(workers=4, chunk=100) as ex:
+        for op in (operator.add, operator.sub, operator.mul):
+            result = ex.map(op, a, b)
+            expected = op(a, b)
+            assert result.qformat == expected.qformat
+            assert np.array_equal(result.raw, expected.raw)
+        # broadcast arguments are passed unchanged
+        row = FixedPointArray([0.5, -1, 2], 'Q3.4')
+        assert np.array_equal(ex.map(operator.mul, a, row).raw, (a * row).raw)
+        assert np.array_equal(ex.map(operator.add, a, 1.5).raw, (a + 1.5).raw)
+        assert len(ex.map(operator.neg, a[:0])) == 0
+
+
+def test_to():
+    """Test requantization in chunks, stochastic rounding depends only on the seed"""
+    rng = np.random.default_rng(1)
+    a = FixedPointArray(rng.uniform(-8, 8, 5000), 'Q4.20')
+    with ParallelExecutor(workers=3, chunk=512) as ex:
+        result = ex.to(a, 'Q2.6', rounding='half_even', overflow='saturate')
+        assert np.array_equal(result.raw, a.to('Q2.6', rounding='half_even',
+                                               overflow='saturate').raw)
+        raw = ex.requantize(a.raw, 'Q4.20', 'Q4.4', 'floor')
+        assert np.array_equal(raw, requantize(a.raw, 'Q4.20', 'Q4.4', 'floor'))
+        first = ex.to(a, 'Q4.4', rounding='stochastic', overflow='saturate',
+                   rng=np.random.default_rng(7))
+    with ParallelExecutor(workers=1, chunk=512) as ex:
+        second = ex.to(a, 'Q4.4', rounding='stochastic', overflow='saturate',
+                    rng=np.random.default_rng(7))
+    assert np.array_equal(first.raw, second.raw)
+    assert np.all(np.abs(first.to_float() - a.to_float()) < 1 / 16)
+
+
+def test_fir():
+    """Test the delay line across chunk boundaries and calls"""
+    rng = np.random.default_rng(2)
+    coeffs = FixedPointArray(rng.uniform(-1, 1, 9), 'Q1.15')
+    x = rng.uniform(-1, 1, 3000)
+    serial = FIRFilter(coeffs, 'Q2.14', 'Q6.20', 'Q2.14')
+    chunked = FIRFilter(coeffs, 'Q2.14', 'Q6.20', 'Q2.14')
+    with ParallelExecutor(workers=4, chunk=128) as ex:
+        for part in (x[:1000], x[1000:1005], x[1005:]):
+            assert np.array_equal(ex.fir(chunked, part).raw, serial.process(part).raw)
+            assert np.array_equal(chunked.state.raw, serial.state.raw)
+        y = FixedPointArray(x[:500], 'Q3.13')
+        assert np.array_equal(ex.fir(chunked, y).raw, serial.process(y).raw)
+
+
+def test_context():
+    """Test the arithmetic context of the caller applies in the workers"""
+    a = FixedPointArray(np.linspace(-2, 1.75, 400), 'Q2.6')
+    with ParallelExecutor(workers=4, chunk=50) as ex:
+        with localcontext(growth='keep', overflow='saturate'):
+            result = ex.map(operator.add, a, a)
+            expected = a + a
+    assert result.qformat.fmt == 'Q2.6'
+    assert np.array_equal(result.raw, expected.raw)
+
+
+def test_process():
+    """Test the process backend with formats wider than 64 bits and tuple results"""
+    a = FixedPointArray(np.linspace(-100, 100, 300), 'Q40.40')
+    with ParallelExecutor(workers=2, chunk=64, backend='process') as ex:
+        with localcontext(growth='keep', rounding='half_up', overflow='wrap'):
+            result = ex.map(operator.mul, a, a)
+            expected = a * a
+        assert result.raw.tolist() == expected.raw.tolist()
+        frames = FixedPointArray(np.random.default_rng(3).uniform(-1, 1, (20, 64)), 'Q1.15')
+        fft = FFT(64, 'Q1.15', scaling='bfp')
+        re, im, exponent = ex.map(fft.process, frames)
+        expected = fft.process(frames)
+        assert np.array_equal(re.raw, expected[0].raw)
+        assert np.array_equal(im.raw, expected[1].raw)
+        assert np.array_equal(exponent, expected[2])
+
+
+def test_invalid():
+    """Test invalid settings"""
+    with raises(ValueError):
+        ParallelExecutor(backend='gpu')
+    with raises(ValueError):
+        ParallelExecutor(chunk=0)
@@ -1,6 +1,6 @@
 """Tests for FixedPoint class"""
 from pytest import raises
-from fixedpoint.format import parse_fmt
+from fixedpoint.format import QFormat, as_qformat, parse_fmt, product_format, sum_format
 
 
 def test_format():
@@ -19,3 +19,40 @@ def test_format_2():
     """Test invalid format"""
     with raises(ValueError):
         assert parse_fmt('Q.2') == (1, 2)
+
+
+def test_qformat():
+    """Test precomputed limits"""
+    q = as_qformat('Q2.1')
+    assert (q.m, q.n, q.bits) == (2, 1, 3)
+    assert q.scale == 2
+    assert (q.min_raw, q.max_raw) == (-4, 3)
+    assert (q.minval, q.maxval, q.resolution) == (-2, 1.5, 0.5)
+    assert str(q) == 'Q2.1'
+
+
+def test_qformat_interned():
+    """Test formats are shared objects"""
+    assert as_qformat('Q6.4') is QFormat(6, 4)
+    assert as_qformat(QFormat(6, 4)) is QFormat(6, 4)
+    assert QFormat(6, 4) == QFormat(6, 4)
+    assert QFormat(6, 4) != QFormat(4, 6)
+
+
+def test_qformat_immutable():
+    """Test QFormat can not be changed"""
+    q = QFormat(6, 4)
+    with raises(AttributeError):
+        q.m = 3
+
+
+def test_qformat_invalid():
+    """Test invalid number of bits"""
+    with raises(ValueError):
+        QFormat(0, 0)
+
+
+def test_result_formats():
+    """Test format growth rules"""
+    assert sum_format(QFormat(4, 2), QFormat(3, 5)) == QFormat(5, 5)
+    assert product_format(QFormat(4, 2), QFormat(3, 5)) == QFormat(7, 5)
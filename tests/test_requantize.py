@@ -0,0 +1,91 @@
+"""Tests for requantization"""
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, requantize
+
+# raw values in Q4.2: -1.75, -1.5, -1.25, -0.5, 0.5, 1.25, 1.5, 1.75
+RAW = [-7, -6, -5, -2, 2, 5, 6, 7]
+
+
+def test_rounding():
+    """Test rounding modes when dropping fractional bits"""
+    expected = {
+        'floor': [-2, -2, -2, -1, 0, 1, 1, 1],
+        'ceil': [-1, -1, -1, 0, 1, 2, 2, 2],
+        'trunc': [-1, -1, -1, 0, 0, 1, 1, 1],
+        'half_up': [-2, -1, -1, 0, 1, 1, 2, 2],
+        'half_even': [-2, -2, -1, 0, 0, 1, 2, 2],
+    }
+    for rounding, values in expected.items():
+        assert requantize(np.array(RAW), 'Q4.2', 'Q4.0', rounding).tolist() == values
+        assert [requantize(x, 'Q4.2', 'Q4.0', rounding) for x in RAW] == values
+
+
+def test_exact():
+    """Test exact rounding raises if bits are lost"""
+    assert requantize(np.array([4, -8]), 'Q4.2', 'Q4.0', 'exact').tolist() == [1, -2]
+    with raises(ValueError):
+        requantize(np.array([4, -7]), 'Q4.2', 'Q4.0', 'exact')
+
+
+def test_stochastic():
+    """Test stochastic rounding is unbiased"""
+    raw = np.full(100000, 5)
+    result = requantize(raw, 'Q4.2', 'Q4.0', 'stochastic', rng=np.random.default_rng(1))
+    assert set(result.tolist()) == {1, 2}
+    assert abs(result.mean() - 1.25) < 0.01
+
+
+def test_overflow():
+    """Test overflow modes"""
+    raw = np.array([-8, 7, 12])
+    assert requantize(raw, 'Q5.0', 'Q4.0', overflow='saturate').tolist() == [-8, 7, 7]
+    assert requantize(raw, 'Q5.0', 'Q4.0', overflow='wrap').tolist() == [-8, 7, -4]
+    with raises(ValueError):
+        requantize(raw, 'Q5.0', 'Q4.0', overflow='error')
+    assert requantize(12, 'Q5.0', 'Q4.0', overflow='wrap') == -4
+
+
+def test_invalid_mode():
+    """Test unknown modes"""
+    with raises(ValueError):
+        requantize(np.array([1]), 'Q4.2', 'Q4.0', 'nearest')
+    with raises(ValueError):
+        requantize(1, 'Q4.2', 'Q4.4', overflow='clip')
+
+
+def test_storage():
+    """Test result uses the storage type of the target format"""
+    assert requantize(np.array([1, 2], dtype=np.int64), 'Q16.16', 'Q4.2').dtype == np.int8
+    assert requantize(np.array([1, 2], dtype=np.int8), 'Q4.4', 'Q20.20').dtype == np.int64
+
+
+def test_wide():
+    """Test formats wider than 64 bits"""
+    raw = np.array([3 * 2 ** 70 + 2 ** 69, -(2 ** 69)], dtype=object)
+    assert requantize(raw, 'Q10.70', 'Q10.0', 'half_even').tolist() == [4, 0]
+    assert requantize(raw, 'Q10.70', 'Q2.0', overflow='wrap').tolist() == [-1, 0]
+
+
+def test_to_modes():
+    """Test rounding and overflow modes of FixedPoint.to and FixedPointArray.to"""
+    assert float(FixedPoint(1.75, 'Q4.2').to('Q4.1', rounding='half_even')) == 2.0
+    assert float(FixedPoint(1.75, 'Q4.2').to('Q2.1', rounding='half_even', overflow='wrap')) == -2.0
+    a = FixedPointArray([1.75, -1.25], 'Q4.2')
+    assert a.to('Q4.0', rounding='floor').to_float().tolist() == [1.0, -2.0]
+    assert a.to('Q2.0', 'fit', rounding='ceil').to_float().tolist() == [1.0, -1.0]
+
+
+def test_out():
+    """Test requantization into a preallocated array, in place and in blocks"""
+    raw = np.random.default_rng(0).integers(-2 ** 15, 2 ** 15, (300, 1000), dtype=np.int16)
+    expected = requantize(raw, 'Q4.12', 'Q8.8', 'half_even')
+    assert requantize(raw, 'Q4.12', 'Q8.8', 'half_even', out=raw) is raw
+    assert np.array_equal(raw, expected)
+    out = np.zeros(4, dtype=np.int64)
+    requantize(np.array(RAW[:4]), 'Q4.2', 'Q4.1', 'floor', out=out)
+    assert out.tolist() == [-4, -3, -3, -1]
+    requantize(5, 'Q4.2', 'Q4.1', 'floor', out=out)
+    assert out.tolist() == [2, 2, 2, 2]
+    with raises(ValueError):
+        requantize(np.array(RAW), 'Q4.2', 'Q20.0', out=np.zeros(8, dtype=np.int16))
@@ -0,0 +1,86 @@
+"""Tests for error statistics"""
+import math
+import numpy as np
+from pytest import raises
+from fixedpoint import (ErrorStatistics, FixedPointArray, RangeAnalyzer, error_statistics,
+                        iter_chunks)
+
+SIGNAL = 0.9 * np.sin(0.01 * np.arange(100000))
+
+
+def test_chunks():
+    """Test pieces, chunks and merged statistics give the same result as one update"""
+    result = FixedPointArray(SIGNAL, 'Q1.11')
+    whole = error_statistics(result, SIGNAL)
+    reference = np.array_split(SIGNAL, [30000, 60000, 90000])
+    pieces = error_statistics(iter_chunks(result, 30000), reference, chunk=7000)
+    merged = ErrorStatistics().update(result[:500], SIGNAL[:500])
+    merged.merge(ErrorStatistics().update(result[500:], SIGNAL[500:])).merge(ErrorStatistics())
+    for stats in (pieces, merged):
+        assert stats.count == whole.count == SIGNAL.size
+        assert stats.exact == whole.exact
+        assert stats.max_error == whole.max_error
+        assert math.isclose(stats.rms_error, whole.rms_error)
+        assert math.isclose(stats.sqnr, whole.sqnr)
+        assert np.array_equal(stats.histogram()[1], whole.histogram()[1])
+
+
+def test_sqnr():
+    """Test SQNR and ENOB against the estimate of the range analysis"""
+    analyzer = RangeAnalyzer().update(SIGNAL)
+    for rounding in ('floor', 'half_even'):
+        stats = error_statistics(FixedPointArray(SIGNAL, 'Q1.15').to('Q1.11', rounding=rounding),
+                                 SIGNAL)
+        assert abs(stats.sqnr - analyzer.sqnr(11, rounding)) < 0.5
+        assert math.isclose(stats.enob, (stats.sqnr - 1.76) / 6.02)
+    assert error_statistics(FixedPointArray([0.5], 'Q1.3'), [0.5]).sqnr == math.inf
+    assert error_statistics(FixedPointArray([0.5], 'Q1.3'), [0]).sqnr == -math.inf
+
+
+def test_histogram():
+    """Test the error distribution of floor and half_even rounding"""
+    fine = FixedPointArray(SIGNAL, 'Q1.15')
+    floor = error_statistics(fine.to('Q1.11', rounding='floor'), fine, span=2)
+    edges, counts = floor.histogram()
+    assert edges.tolist() == [-math.inf, -2, -1.75, -1.5, -1.25, -1, -0.75, -0.5, -0.25,
+                              0, 0.25, 0.5, 0.75, 1, 1.25, 1.5, 1.75, 2]
+    # floor errors are in (-1, 0], exact differences of the fixed point reference
+    assert counts[edges < -1].sum() == 0 and counts[edges >= 0.25].sum() == 0
+    assert counts[edges == 0].sum() == floor.exact > 0
+    assert -0.5 < floor.mean_error < -0.4
+    nearest = error_statistics(fine.to('Q1.11', rounding='half_even'), fine, span=2)
+    assert abs(nearest.mean_error) < 0.01
+    assert nearest.max_error == 0.5
+    wide = error_statistics(FixedPointArray([3, -3, 0.25], 'Q3.2'), [0, 0, 0], span=2)
+    assert wide.histogram()[1][[0, -1]].tolist() == [1, 1]
+    assert '>= 2' in wide.report() and '< -2' in wide.report()
+
+
+def test_errors():
+    """Test invalid inputs"""
+    stats = ErrorStatistics().update(FixedPointArray([0.5], 'Q1.3'), [0.5])
+    with raises(ValueError):
+        stats.update(FixedPointArray([0.5], 'Q1.4'), [0.5])
+    with raises(ValueError):
+        stats.update(FixedPointArray([0.5, 0.5], 'Q1.3'), [0.5])
+    with raises(TypeError):
+        stats.update([0.5], [0.5])
+    with raises(ValueError):
+        stats.merge(ErrorStatistics().update(FixedPointArray([0.5], 'Q1.4'), [0.5]))
+    with raises(ValueError):
+        stats.merge(ErrorStatistics(span=4))
+    assert math.isnan(ErrorStatistics().ulp)
+    with raises(ValueError):
+        error_statistics(iter_chunks(FixedPointArray(SIGNAL, 'Q1.11'), 30000),
+                         np.array_split(SIGNAL, 3))
+
+
+def test_invalid():
+    """Test NaN and infinite references are counted and left out"""
+    result = FixedPointArray([0.5, 0.25, -0.5, 0.125], 'Q1.3')
+    stats = error_statistics(result, [0.5, math.nan, -0.5, math.inf])
+    assert (stats.count, stats.invalid, stats.exact) == (2, 2, 2)
+    assert stats.max_error == 0
+    assert stats.histogram()[1].sum() == 2
+    merged = ErrorStatistics().update(result, [0.5, 0.25, math.nan, 0.125]).merge(stats)
+    assert (merged.count, merged.invalid) == (5, 3)
@@ -0,0 +1,101 @@
+"""Tests for tracing and compiled kernels"""
+from fractions import Fraction
+import numpy as np
+from pytest import raises
+from fixedpoint import FixedPoint, FixedPointArray, QFormat, fuse, localcontext, trace
+
+COEFFS = [FixedPoint(v, 'Q1.15') for v in (0.3, -0.2, 0.1)]
+
+
+def model(x, y):
+    """Model using all traced operations"""
+    acc = x * COEFFS[0] + y * COEFFS[1] - (x >> 3) * 0.75
+    acc = acc + abs(y) * COEFFS[2] - (y << 1) + 0.125
+    out = acc.to('Q6.20', rounding='half_even', overflow='saturate').to('Q3.14', 'fit')
+    return -out, (x ** 2).to('Q2.10', rounding='floor', overflow='wrap'), 0.5 - y
+
+
+def test_bit_exact():
+    """Test the kernel against the model on FixedPoint values in several contexts"""
+    rng = np.random.default_rng(0)
+    x = FixedPointArray(rng.uniform(-1, 1, 200), 'Q1.15')
+    y = FixedPointArray(rng.uniform(-1, 1, 200), 'Q2.10')
+    for kwargs in ({}, {'rounding': 'half_up', 'overflow': 'saturate'},
+                   {'growth': 'keep', 'rounding': 'floor', 'overflow': 'wrap'},
+                   {'growth': 'Q8.24', 'rounding': 'half_even', 'overflow': 'saturate'}):
+        with localcontext(**kwargs):
+            results = trace(model, 'Q1.15', 'Q2.10').compile()(x, y)
+            for i, (a, b) in enumerate(zip(x, y)):
+                expected = model(a, b)
+                for result, value in zip(results, expected):
+                    assert result.qformat == value.qformat
+                    assert result.raw[i] == value.value
+
+
+def test_fuse():
+    """Test scalar and batch calls of a fused model"""
+    @fuse('Q1.15', 'Q1.15')
+    def mix(x, y):
+        return (x * FixedPoint(0.75, 'Q1.15') + y * 0.25).to('Q1.15', 'fit')
+
+    assert mix(FixedPoint(0.5, 'Q1.15'), FixedPoint(-0.5, 'Q1.15')) == FixedPoint(0.25, 'Q1.15')
+    result = mix(FixedPointArray([0.5, 0.5], 'Q1.15'), [-0.5, 0.5])
+    assert result.qformat.fmt == 'Q1.15'
+    assert result.to_float().tolist() == [0.25, 0.5]
+    # scalars broadcast, other formats are converted
+    assert mix([[0.5], [1 - 2 ** -15]], FixedPoint(-1, 'Q2.2')).shape == (2, 1)
+    assert mix.__name__ == 'mix'
+    with localcontext(rounding='half_up', overflow='saturate'):
+        mix([0.5], [0.5])
+    assert len(mix._kernels) == 2  # pylint: disable=protected-access
+
+
+def test_merge():
+    """Test requantizations are merged only if the result is the same"""
+    kernel = trace(lambda x: (x >> 1 >> 2).to('Q4.8', rounding='floor'), 'Q4.12').compile()
+    assert kernel.merged == 2
+    assert len(kernel.steps) == 1
+    x = FixedPointArray(np.linspace(-8, 7.9, 101), 'Q4.12')
+    assert np.array_equal(kernel(x).raw, ((x >> 3).to('Q4.8', rounding='floor')).raw)
+    # a wider format in between does not change the value
+    kernel = trace(lambda x: x.to('Q8.16').to('Q2.6', 'fit'), 'Q4.12').compile()
+    assert kernel.merged == 1
+    # rounding to nearest twice is not rounding once
+    kernel = trace(lambda x: x.to('Q4.8', rounding='half_even').to('Q4.4', rounding='half_even'),
+                   'Q4.12').compile()
+    assert kernel.merged == 0
+    assert np.array_equal(kernel(x).raw, x.to('Q4.8', rounding='half_even')
+                          .to('Q4.4', rounding='half_even').raw)
+    assert 'requant' in kernel.report()
+
+
+def test_errors():
+    """Test errors of the model are kept and unsupported code is rejected"""
+    def unused(x):
+        _ = -x
+        return x + x
+
+    kernel = trace(unused, 'Q1.7').compile()
+    assert kernel([0.5]).to_float().tolist() == [1.0]
+    with raises(ValueError):
+        kernel([-1.0])
+    with raises(ValueError):
+        unused(FixedPoint(-1.0, 'Q1.7'))
+    with raises(TypeError):
+        trace(lambda x: x if x > 0 else -x, 'Q1.7')
+    with raises(TypeError):
+        trace(lambda x: x if x else -x, 'Q1.7')
+    with raises(ValueError):
+        trace(lambda x: x * Fraction(1, 3), 'Q1.7')
+    with raises(TypeError):
+        trace(lambda x: 1.0, 'Q1.7')
+    assert trace(lambda x: FixedPoint(1, 'Q2.2'), 'Q1.7').compile()([0, 0]).raw.tolist() == [4, 4]
+
+
+def test_wide():
+    """Test formats wider than 64 bits"""
+    kernel = trace(lambda x, y: (x * y + x).to('Q40.40', 'fit'), 'Q40.40', 'Q8.8').compile()
+    x = FixedPointArray([1e9, -3.5, 2 ** -40], 'Q40.40')
+    y = FixedPointArray([100, 0.5, -1], 'Q8.8')
+    assert kernel(x, y).raw.tolist() == (x * y + x).to('Q40.40', 'fit').raw.tolist()
+    assert kernel.outputs == [QFormat(40, 40)]
@@ -0,0 +1,140 @@
+"""Tests for FFT"""
+import math
+import numpy as np
+from pytest import raises
+from fixedpoint import FFT, FixedPointArray, QFormat, fft, ifft
+from fixedpoint.requantize import requantize_int
+
+
+def shift(value, bits, rounding):
+    """Scalar reference of the shifts with a rounding mode"""
+    if bits <= 0:
+        return value << -bits
+    return requantize_int(value, QFormat(200, bits), QFormat(200 - bits, 0), rounding, rng=None)
+
+
+def rotate(value, k, fft_):
+    """Scalar reference of the product with the quantized twiddle factor W^k"""
+    tw = fft_.twiddle_fmt
+    angle = k * ((1 if fft_.inverse else -1) * 2 * math.pi / fft_.size)
+    wr = min(max(round(math.cos(angle) * tw.scale), tw.min_raw), tw.max_raw)
+    wi = min(max(round(math.sin(angle) * tw.scale), tw.min_raw), tw.max_raw)
+    br, bi = value
+    return (shift(br * wr - bi * wi, tw.n, fft_.rounding),
+            shift(br * wi + bi * wr, tw.n, fft_.rounding))
+
+
+def butterfly(terms, q, inverse):
+    """Output q of the DFT over the rotated terms of one butterfly"""
+    sr = si = 0
+    for r, (tr, ti) in enumerate(terms):
+        # multiply by exp(-+2j * pi * r * q / radix), a power of j
+        for _ in range(((1 if inverse else -1) * r * q * 4 // len(terms)) % 4):
+            tr, ti = -ti, tr
+        sr, si = sr + tr, si + ti
+    return sr, si
+
+
+def reference(x, fft_, stage):
+    """Mixed radix decimation in time FFT on Python integers, x is a list of (re, im)"""
+    if stage < 0:
+        return x
+    radix = fft_.radices[stage]
+    subs = [reference(x[r::radix], fft_, stage - 1) for r in range(radix)]
+    length = len(subs[0])
+    fmt = fft_.stage_formats[stage]
+    y = [(0, 0)] * (radix * length)
+    for k in range(length):
+        # W_(radix*length)^(r*k) as power of W_size
+        terms = [subs[0][k]] + [rotate(subs[r][k], r * k * fft_.size // (radix * length), fft_)
+                                for r in range(1, radix)]
+        for q in range(radix):
+            y[q * length + k] = tuple(min(max(shift(v, fft_.shifts[stage], fft_.rounding),
+                                              fmt.min_raw), fmt.max_raw)
+                                      for v in butterfly(terms, q, fft_.inverse))
+    return y
+
+
+def test_reference():
+    """Test bit-exact results against the scalar reference"""
+    rng = np.random.default_rng(0)
+    for size, radix, scaling, rounding in ((16, 2, 'shift', 'trunc'), (32, 4, 'shift', 'half_even'),
+                                           (16, 4, 'none', 'floor'), (8, 2, [0, 1, 2], 'half_up'),
+                                           (64, 4, 'shift', 'trunc')):
+        for inverse in (False, True):
+            fft_ = FFT(size, 'Q2.10', 'Q2.12', scaling=scaling, radix=radix, inverse=inverse,
+                       rounding=rounding)
+            re = FixedPointArray(rng.uniform(-2, 1.99, size), 'Q2.10')
+            im = FixedPointArray(rng.uniform(-2, 1.99, size), 'Q2.10')
+            yr, yi, exponent = fft_.process(re, im)
+            expected = reference(list(zip(re.raw.tolist(), im.raw.tolist())), fft_,
+                                 len(fft_.radices) - 1)
+            assert list(zip(yr.raw.tolist(), yi.raw.tolist())) == expected
+            assert exponent == sum(fft_.shifts)
+
+
+def test_accuracy():
+    """Test against numpy for all scaling schedules"""
+    rng = np.random.default_rng(1)
+    x = FixedPointArray(rng.uniform(-1, 0.99, (4, 256)), 'Q1.15')
+    expected = np.fft.fft(x.to_float())
+    for radix in (2, 4):
+        for scaling in ('shift', 'none', 'bfp'):
+            re, im, exponent = fft(x, scaling=scaling, radix=radix)
+            result = (re.to_float() + 1j * im.to_float()) * 2.0 ** exponent[:, None]
+            # rounding errors of the 8 stages in units of the output resolution
+            bound = 32 * 2.0 ** (exponent.max() - 15)
+            assert np.max(np.abs(result - expected)) < bound
+
+
+def test_inverse():
+    """Test the inverse transform restores the signal"""
+    rng = np.random.default_rng(2)
+    x = FixedPointArray(rng.uniform(-1, 0.99, 64), 'Q1.15')
+    re, im, exponent = fft(x, radix=4, scaling='none')
+    re, im, back = ifft(re, im, twiddle_fmt='Q2.20', scaling='shift')
+    assert exponent + back == 6
+    assert np.max(np.abs(re.to_float() - x.to_float())) < 2 ** -12
+    assert np.max(np.abs(im.to_float())) < 2 ** -12
+
+
+def test_block_floating_point():
+    """Test frames are scaled by their own exponent"""
+    x = np.zeros((2, 64))
+    x[0, 0] = 0.9
+    x[1] = 0.9
+    fft_ = FFT(64, 'Q1.15', scaling='bfp')
+    re, _, exponent = fft_.process(x)
+    assert exponent.tolist() == [0, 5]
+    assert re.to_float()[0].tolist() == [0.899993896484375] * 64
+    assert float(re[1, 0]) * 2 ** 5 == 57.599609375
+    assert fft_.shifts is None
+    assert {str(f) for f in fft_.stage_formats} == {'Q3.15'}
+
+
+def test_batch():
+    """Test frames along leading axes are independent"""
+    rng = np.random.default_rng(3)
+    x = FixedPointArray(rng.uniform(-1, 0.99, (3, 2, 32)), 'Q1.15')
+    fft_ = FFT(32, 'Q1.15', scaling='bfp', radix=4)
+    re, im, exponent = fft_.process(x)
+    assert re.shape == (3, 2, 32)
+    assert exponent.shape == (3, 2)
+    one_re, one_im, one_exponent = fft_.process(x[2, 1])
+    assert one_re.raw.tolist() == re.raw[2, 1].tolist()
+    assert one_im.raw.tolist() == im.raw[2, 1].tolist()
+    assert one_exponent == exponent[2, 1]
+
+
+def test_formats():
+    """Test stage formats and report"""
+    fft_ = FFT(512, 'Q1.15', radix=4, scaling='none')
+    assert fft_.radices == [2, 4, 4, 4, 4]
+    assert [str(f) for f in fft_.stage_formats] == ['Q3.15', 'Q5.15', 'Q7.15', 'Q9.15', 'Q11.15']
+    assert fft_.report().splitlines()[1].split() == ['0', '2', '0', 'Q3.15']
+    with raises(ValueError):
+        FFT(12, 'Q1.15')
+    with raises(ValueError):
+        FFT(16, 'Q1.15', scaling=[1, 1])
+    with raises(ValueError):
+        FFT(16, 'Q1.15', radix=8)